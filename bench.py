@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+# Benchmark offline dos caminhos reais do bot (modal de inscrição, banco,
+# /estatisticas, /lista, /exportar, /atualizar) com objetos falsos do Discord.
+# Cada tamanho roda num processo próprio para o pico de memória ser só dele.
+#
+#   python bench.py                       # 1k, 10k e 100k, compara com a base
+#   python bench.py --sizes 1000 10000    # só alguns tamanhos
+#   python bench.py --save-baseline       # grava o resultado como nova base
+
+SIZES = (1000, 10000, 100000)
+# Inscrições feitas pelo modal em cada tamanho, com o banco já cheio até ali
+SIGNUPS = 2000
+BASELINE_FILE = 'bench_baseline.json'
+# Variação tolerada antes de marcar regressão (20%)
+TOLERANCE = 0.2
+
+FIRST_NAMES = (
+    'Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Felipe', 'Gabriela', 'Hugo', 'Isabela', 'João',
+    'Karina', 'Lucas', 'Mariana', 'Nicolas', 'Olivia', 'Pedro', 'Rafaela', 'Samuel', 'Tatiana',
+    'Vitor', 'Yasmin', 'Beatriz', 'Caio', 'Daniela', 'Enzo', 'Fernanda', 'Gustavo', 'Helena'
+)
+# Sobrenomes sintéticos: consoante + vogal + final opcional (ex: "Tarbeni")
+SYLLABLES = tuple(
+    onset + vowel + coda
+    for onset in ('b', 'c', 'd', 'f', 'g', 'j', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'z', 'ch', 'lh', 'nh')
+    for vowel in 'aeiou'
+    for coda in ('', '', 'n', 'r', 's', 'l')
+)
+HASHTAG = '#Bench'
+SERVER_TAG = 'TROPA'
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(latencies: List[float], elapsed: float, items: Optional[int] = None) -> Dict:
+    """items: unidades processadas (ex: participantes) quando não é uma por chamada"""
+    count = items if items is not None else len(latencies)
+    return {
+        'calls': len(latencies),
+        'seconds': round(elapsed, 4),
+        'throughput': round(count / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(max(latencies, default=0.0) * 1000, 3)
+    }
+
+
+def random_name(rng: random.Random):
+    last = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+    return rng.choice(FIRST_NAMES), last.capitalize()
+
+
+async def _timed_calls(factories, concurrency: int) -> (List[float], float):
+    """Roda as chamadas em ondas de `concurrency`; devolve latências e tempo total"""
+    latencies = []
+
+    async def one(factory):
+        started = time.perf_counter()
+        await factory()
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for start in range(0, len(factories), concurrency):
+        await asyncio.gather(*(one(factory) for factory in factories[start:start + concurrency]))
+    return latencies, time.perf_counter() - started
+
+
+async def _repeat(factory, times: int) -> (List[float], float):
+    return await _timed_calls([factory] * times, 1)
+
+
+async def run_size(size: int, signups: int, concurrency: int, seed: int, repeat: int) -> Dict:
+    # Importados aqui: DB_DIR e DB_STORAGE já vêm do ambiente do processo filho
+    import bot
+    from fakes import FakeDiscord, FakeGuild, FakeInteraction
+    from scheduler import TokenBucket
+
+    # Sem limites de taxa: mede o bot, não o Discord (ver loadsim.py)
+    bot.sender._global = TokenBucket(10 ** 9, 1.0)
+    bot.sender.channel_rate = (10 ** 9, 1.0)
+
+    rng = random.Random(seed)
+    api = FakeDiscord()
+    guild = FakeGuild(api, api.snowflake())
+    channel = guild.add_channel()
+    roles = [guild.add_role(name) for name in ('Booster', 'VIP', 'Veterano')]
+    admin = guild.add_member('admin')
+    names = {}
+    signups = min(signups, size)
+    for _ in range(size):
+        first, last = random_name(rng)
+        member_roles = [role for role in roles if rng.random() < 0.3]
+        display = f'{first} [{SERVER_TAG}]' if rng.random() < 0.1 else first
+        member = guild.add_member(f'{first}{last}'.lower(), member_roles, display)
+        names[member.id] = (first, last)
+
+    db = bot.databases.get(guild.id)
+    db.set_hashtag(HASHTAG)
+    db.set_inscricao_channel(str(channel.id))
+    for quantity, role in enumerate(roles, 1):
+        db.add_bonus_role(str(role.id), role.name, quantity, role.name[:3].upper())
+    db.set_tag_enabled(True, SERVER_TAG, 1)
+
+    results = {}
+
+    members = [member for member in guild.members.values() if member.id in names]
+    split = len(members) - signups
+    prefilled, submitting = members[:split], members[split:]
+
+    # Database.add_participant direto para os primeiros inscritos
+    policy = db.ticket_policy()
+    latencies = []
+    started = time.perf_counter()
+    for member in prefilled:
+        call_started = time.perf_counter()
+        first, last = names[member.id]
+        db.add_participant(
+            str(member.id), first, last, f'{first} {last}', None, policy.calculate(member),
+            '2025-01-01T00:00:00'
+        )
+        latencies.append(time.perf_counter() - call_started)
+    await db.flush()
+    results['add_participant'] = summarize(latencies, time.perf_counter() - started)
+
+    # Modal de inscrição para os últimos, com o banco já cheio:
+    # um on_submit por membro, `concurrency` ao mesmo tempo
+    async def submit(member):
+        modal = bot.InscricaoModal()
+        modal.nome._value, modal.sobrenome._value = names[member.id]
+        modal.hashtag._value = HASHTAG
+        await modal.on_submit(FakeInteraction(api, member))
+
+    latencies, elapsed = await _timed_calls(
+        [lambda member=member: submit(member) for member in submitting], concurrency
+    )
+    await bot.announcer.flush()
+    await db.flush()
+    results['inscricao'] = summarize(latencies, elapsed)
+
+    # Gravação completa do banco com todos os inscritos
+    async def save():
+        db.save()
+    results['save'] = summarize(*await _repeat(save, repeat))
+
+    async def statistics():
+        db.get_statistics()
+    results['estatisticas'] = summarize(*await _repeat(statistics, 1000))
+
+    registered = db.get_statistics()['total_participants']
+    results['registered'] = registered
+
+    async def lista():
+        await bot.lista.callback(FakeInteraction(api, admin), 'detalhada', 'arquivo')
+    latencies, elapsed = await _repeat(lista, repeat)
+    results['lista'] = summarize(latencies, elapsed, registered * repeat)
+
+    async def exportar():
+        await bot.exportar.callback(FakeInteraction(api, admin), 'csv', False)
+    latencies, elapsed = await _repeat(exportar, repeat)
+    results['exportar'] = summarize(latencies, elapsed, registered * repeat)
+
+    # /atualizar depois de 10% dos membros trocarem de cargo (TicketPolicy em lote)
+    for member in rng.sample(members, max(1, len(members) // 10)):
+        member.roles = [role for role in roles if rng.random() < 0.5]
+
+    async def atualizar():
+        await bot.atualizar.callback(FakeInteraction(api, admin))
+    latencies, elapsed = await _repeat(atualizar, repeat)
+    results['atualizar'] = summarize(latencies, elapsed, registered * repeat)
+
+    bot.workers.shutdown()
+    await bot.databases.flush()
+    bot.databases.close()
+
+    # ru_maxrss vem em KB no Linux e em bytes no macOS (só o processo do bot,
+    # sem os processos do WorkerPool)
+    scale = 1 if sys.platform == 'darwin' else 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    results['memory'] = {'peak_rss_mb': round(peak / 2 ** 20, 1)}
+    results['api_calls'] = sum(api.calls.values())
+    return results
+
+
+def _run_child(size: int, args) -> Dict:
+    with tempfile.TemporaryDirectory(prefix='tropadovth-bench-') as directory:
+        env = dict(
+            os.environ, DB_DIR=directory, DB_STORAGE=args.storage,
+            DB_WRITE_BEHIND='1' if args.write_behind else '0', DB_LEGACY_GUILD_ID=''
+        )
+        command = [
+            sys.executable, os.path.abspath(__file__), '--child', str(size),
+            '--signups', str(args.signups), '--concurrency', str(args.concurrency),
+            '--seed', str(args.seed), '--repeat', str(args.repeat)
+        ]
+        proc = subprocess.run(command, env=env, cwd=directory, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-4000:])
+        raise SystemExit(f'Benchmark de {size} participantes falhou (código {proc.returncode})')
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float = TOLERANCE) -> Dict:
+    """Razões atual/base por cenário; regressões são as que passam da tolerância"""
+    comparison = {'regressions': []}
+    for size, scenarios in results.items():
+        base_scenarios = baseline.get('results', {}).get(size)
+        if not base_scenarios:
+            continue
+        for name, current in scenarios.items():
+            base = base_scenarios.get(name)
+            if not isinstance(current, dict) or not isinstance(base, dict):
+                continue
+            ratios = {}
+            for key in ('throughput', 'p99_ms', 'peak_rss_mb'):
+                if current.get(key) is not None and base.get(key):
+                    ratios[key] = round(current[key] / base[key], 3)
+            if not ratios:
+                continue
+            comparison.setdefault(size, {})[name] = ratios
+            if ratios.get('throughput', 1) < 1 - tolerance:
+                comparison['regressions'].append(f'{size}/{name}: throughput x{ratios["throughput"]}')
+            for key in ('p99_ms', 'peak_rss_mb'):
+                if ratios.get(key, 1) > 1 + tolerance:
+                    comparison['regressions'].append(f'{size}/{name}: {key} x{ratios[key]}')
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offline do bot')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--storage', choices=('json', 'journal', 'sqlite'), default='journal',
+                        help="'json' regrava o arquivo a cada inscrição: quadrático em 100k")
+    parser.add_argument('--write-behind', action='store_true')
+    parser.add_argument('--signups', type=int, default=SIGNUPS,
+                        help='inscrições pelo modal; o resto entra direto no banco antes')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3, help='repetições dos comandos de admin')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--check', action='store_true', help='sair com erro se houver regressão')
+    parser.add_argument('--output', help='gravar o JSON também neste arquivo')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_size(args.child, args.signups, args.concurrency, args.seed, args.repeat))))
+        return
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'storage': args.storage,
+            'write_behind': args.write_behind,
+            'signups': args.signups,
+            'concurrency': args.concurrency,
+            'repeat': args.repeat,
+            'seed': args.seed
+        },
+        'results': {}
+    }
+    for size in args.sizes:
+        print(f'{size} participantes...', file=sys.stderr)
+        report['results'][str(size)] = _run_child(size, args)
+
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['comparison'] = compare(report['results'], baseline, args.tolerance)
+        if baseline.get('meta', {}).get('platform') != report['meta']['platform']:
+            report['comparison']['warning'] = 'base gravada em outra máquina'
+
+    encoded = json.dumps(report, indent=2, ensure_ascii=False)
+    print(encoded)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(encoded + '\n')
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(encoded + '\n')
+        print(f'Base gravada em {args.baseline}', file=sys.stderr)
+    if args.check and report.get('comparison', {}).get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
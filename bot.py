@@ -1,19 +1,38 @@
 import discord
 from discord import app_commands
 from discord.ui import Modal, TextInput, Button, View
+import asyncio
+import io
 import os
+import signal
+import time
 from dotenv import load_dotenv
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional
-from database import db
-from utils import calculate_tickets
+from aiohttp import web
+from command_sync import sync_commands, sync_on_ready
+from database import databases
+from draw import draw_participants
+from export import DEFAULT_PART_LIMIT, PartWriter, group_parts, render_rows
+from health import LoopLagMonitor, health_problems, latency_ms
+from metrics import DB_LAST_WRITE_SECONDS, DictGauges, ErrorCountingHandler, instrumented, registry
+from scheduler import SendScheduler
+from signups import AdmissionControl, AdmissionRejected, SignupAnnouncer
+from pagination import (
+    ATTACHMENT_LINES, ListFile, PaginatedView, list_lines, paginate, render_list, sort_by_name
+)
+from progress import ProgressMessage
+from utils import format_blacklist_csv, parse_blacklist_csv
+from workers import CPU, INLINE, Job, JobCancelled, WorkerPool, chunk_count, chunked, iter_chunks
 
 # Configuração de logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
+# logging.error dentro de um comando conta como erro dele em /metrics
+logging.getLogger().addHandler(ErrorCountingHandler())
 
 # Carrega variáveis de ambiente
 load_dotenv()
@@ -24,8 +43,45 @@ intents.message_content = True
 intents.members = True
 intents.guilds = True
 
-client = discord.Client(intents=intents)
+# Shards automáticos (SHARD_COUNT fixa o número, senão o Discord recomenda)
+SHARD_COUNT = os.getenv('SHARD_COUNT')
+client = discord.AutoShardedClient(intents=intents, shard_count=int(SHARD_COUNT) if SHARD_COUNT else None)
 tree = app_commands.CommandTree(client)
+# Todos os envios passam pelo agendador (rate limit por canal + prioridade)
+sender = SendScheduler()
+# Posts de inscrição agrupados (SIGNUP_BATCH_SECONDS > 0)
+announcer = SignupAnnouncer(
+    sender, lambda channel, message_ids: databases.get(channel.guild.id).set_message_ids(message_ids)
+)
+# Processos/threads para os comandos que percorrem todos os inscritos
+workers = WorkerPool()
+# Uma inscrição por usuário por vez e limite global com fila
+admission = AdmissionControl()
+
+# Atraso do event loop (trava por I/O síncrono ou CPU no loop)
+loop_lag = LoopLagMonitor()
+_started_at = time.monotonic()
+
+# Gauges de /metrics lidos dos componentes a cada coleta
+registry.register(DictGauges('tropadovth_sender', 'Agendador de envios', sender.metrics))
+registry.register(DictGauges('tropadovth_admission', 'Controle de admissão das inscrições', admission.metrics))
+registry.register(DictGauges(
+    'tropadovth_announcer', 'Posts de inscrição agrupados',
+    lambda: {'batches': announcer.batches, 'entries': announcer.entries}
+))
+registry.register(DictGauges(
+    'tropadovth_databases', 'Bancos por servidor',
+    lambda: {'loaded': len(databases.loaded()), 'loads': databases.loads, 'evictions': databases.evictions}
+))
+registry.register(DictGauges('tropadovth_workers', 'Trabalhos longos', lambda: {'jobs': len(workers.jobs)}))
+registry.register(DictGauges('tropadovth_loop_lag', 'Atraso do event loop', loop_lag.snapshot))
+
+async def respond(interaction: discord.Interaction, text: str):
+    # Resposta efêmera, ou followup se a interação já foi respondida
+    if interaction.response.is_done():
+        await sender.reply(interaction, text, ephemeral=True)
+    else:
+        await interaction.response.send_message(text, ephemeral=True)
 
 # Modal de inscrição
 class InscricaoModal(Modal, title='Inscrição no Sorteio'):
@@ -50,65 +106,82 @@ class InscricaoModal(Modal, title='Inscrição no Sorteio'):
         max_length=100
     )
     
+    @instrumented('inscricao')
     async def on_submit(self, interaction: discord.Interaction):
+        user_id = str(interaction.user.id)
+
+        async def queued():
+            # Fila cheia de inscrições: responde já para não estourar os 3 s
+            await interaction.response.defer(ephemeral=True)
+            await sender.reply(interaction, '⏳ Muitas inscrições agora, a sua está na fila...', ephemeral=True)
+
+        try:
+            async with admission.admit(f'{interaction.guild_id}:{user_id}', queued):
+                await self._process(interaction, user_id)
+        except AdmissionRejected as e:
+            if e.reason == 'duplicate':
+                await respond(interaction, '⏳ Sua inscrição já está sendo processada.')
+            else:
+                await respond(interaction, '⚠️ Sistema ocupado, tente novamente em instantes.')
+
+    async def _process(self, interaction: discord.Interaction, user_id: str):
+        db = await databases.ready(interaction.guild_id)
         try:
-            user_id = str(interaction.user.id)
             nome = self.nome.value.strip()
             sobrenome = self.sobrenome.value.strip()
             hashtag = self.hashtag.value.strip()
 
             # Validações básicas
             if db.is_blacklisted(user_id):
-                await interaction.response.send_message(
-                    '🚫 Você está banido e não pode participar.',
-                    ephemeral=True
-                )
+                await respond(interaction, '🚫 Você está banido e não pode participar.')
                 return
 
             if db.is_registered(user_id):
-                await interaction.response.send_message(
-                    '⚠️ Você já está inscrito no sorteio.',
-                    ephemeral=True
-                )
+                await respond(interaction, '⚠️ Você já está inscrito no sorteio.')
                 return
             
             # Validação da hashtag
-            if not db.data['config']['hashtag']:
-                await interaction.response.send_message(
-                    '⚠️ Hashtag não configurada.',
-                    ephemeral=True
-                )
+            if not db.get_config()['hashtag']:
+                await respond(interaction, '⚠️ Hashtag não configurada.')
                 return
 
-            if hashtag.lower() != db.data['config']['hashtag'].lower():
-                await interaction.response.send_message(
-                    f'❌ Hashtag incorreta!\nCorreta: {db.data["config"]["hashtag"]}',
-                    ephemeral=True
-                )
+            if hashtag.lower() != db.get_config()['hashtag'].lower():
+                await respond(interaction, f'❌ Hashtag incorreta!\nCorreta: {db.get_config()["hashtag"]}')
+                return
+
+            # Nome repetido (ignorando acentos, caixa e espaços)
+            if db.is_name_taken(nome, sobrenome):
+                await respond(interaction, '⚠️ Já existe uma inscrição com esse nome.')
                 return
 
+            # Nomes muito parecidos podem ser contas alternativas
+            similar = db.find_similar_names(nome, sobrenome)
+            if similar:
+                logging.warning(
+                    f'Inscrição de {user_id} ({nome} {sobrenome}) parecida com: '
+                    + ', '.join(f'{name} ({uid})' for uid, name, _ in similar)
+                )
+
             # Processa a inscrição
-            await interaction.response.defer(ephemeral=True)
+            if not interaction.response.is_done():
+                await interaction.response.defer(ephemeral=True)
             
             channel_id = db.get_inscricao_channel()
             if not channel_id:
-                await interaction.followup.send('❌ Canal de inscrições não configurado.', ephemeral=True)
+                await sender.reply(interaction, '❌ Canal de inscrições não configurado.', ephemeral=True)
                 return
 
             channel = interaction.guild.get_channel(int(channel_id))
-            msg = await channel.send(
-                f"{interaction.user.mention}\n{nome} {sobrenome}\n{hashtag}"
-            )
+            announcement = f"{interaction.user.mention}\n{nome} {sobrenome}\n{hashtag}"
+            message_id = None
+            if not announcer.enabled:
+                # Inscrições que esperam o limite do canal saem juntas numa mensagem
+                msg = await sender.post(channel, announcement, coalesce='inscricao', separator='\n\n')
+                message_id = str(msg.id)
             
             # Calcula fichas
             member = interaction.guild.get_member(int(user_id))
-            tickets = calculate_tickets(
-                member,
-                db.data['config'].get('bonus_roles', {}),
-                db.data['config'].get('tag_enabled', False),
-                db.data['config'].get('server_tag', ''),
-                db.data['config']['tag_quantity']
-            )
+            tickets = member_tickets(member)
 
             # Registra participante
             db.add_participant(
@@ -116,16 +189,20 @@ class InscricaoModal(Modal, title='Inscrição no Sorteio'):
                 nome,
                 sobrenome,
                 f"{nome} {sobrenome}",
-                str(msg.id),
+                message_id,
                 tickets,
                 datetime.now().isoformat()
             )
 
-            await interaction.followup.send('✅ Inscrição realizada com sucesso!', ephemeral=True)
+            # Modo em lote: confirma já e anuncia junto com os próximos inscritos
+            if announcer.enabled:
+                announcer.add(channel, user_id, announcement)
+
+            await sender.reply(interaction, '✅ Inscrição realizada com sucesso!', ephemeral=True)
 
         except Exception as e:
             logging.error(f'Erro na inscrição: {e}')
-            await interaction.followup.send('❌ Erro ao processar inscrição.', ephemeral=True)
+            await respond(interaction, '❌ Erro ao processar inscrição.')
 
 # Classe do botão de inscrição
 class InscreverButton(discord.ui.Button):
@@ -151,6 +228,7 @@ class InscreverButton(discord.ui.Button):
     midia='Foto ou vídeo para anexar (opcional)'
 )
 @app_commands.default_permissions(administrator=True)
+@instrumented('setup_inscricao')
 async def setup_inscricao(
     interaction: discord.Interaction,
     canal_botao: discord.TextChannel,
@@ -158,12 +236,13 @@ async def setup_inscricao(
     mensagem: Optional[str] = None,
     midia: Optional[discord.Attachment] = None
 ):
+    db = await databases.ready(interaction.guild_id)
     try:
         await interaction.response.defer(ephemeral=True)
         
         # Configura canal de inscrições
-        db.data['config']['inscricao_channel'] = str(canal_inscricoes.id)
-        db.save()
+        db.set_inscricao_channel(str(canal_inscricoes.id))
+        await db.flush()
 
         # Cria view com botão
         view = discord.ui.View(timeout=None)
@@ -175,9 +254,9 @@ async def setup_inscricao(
         # Envia mensagem com mídia se fornecida
         if midia:
             file = await midia.to_file()
-            message = await canal_botao.send(content, file=file, view=view)
+            message = await sender.post(canal_botao, content, file=file, view=view)
         else:
-            message = await canal_botao.send(content, view=view)
+            message = await sender.post(canal_botao, content, view=view)
 
         # Registra view para persistência
         try:
@@ -185,7 +264,8 @@ async def setup_inscricao(
         except Exception as e:
             logging.error(f'Erro ao registrar view: {e}')
 
-        await interaction.followup.send(
+        await sender.reply(
+            interaction,
             f"✅ Configuração concluída!\n\n"
             f"• Botão criado em: {canal_botao.mention}\n"
             f"• Inscrições aparecem em: {canal_inscricoes.mention}",
@@ -194,30 +274,100 @@ async def setup_inscricao(
 
     except Exception as e:
         logging.error(f'Erro no setup_inscricao: {e}', exc_info=True)
-        await interaction.followup.send(
+        await sender.reply(
+            interaction,
             "❌ Erro ao configurar inscrição. Verifique os logs.",
             ephemeral=True
         )
 
+# Erro que impede o bot de atender (ex: banco legado sem dono); sai com falha
+_startup_error = None
+_warm_task = None
+
 @client.event
 async def on_ready():
+    global _startup_error, _warm_task
+    try:
+        databases.claim_legacy([guild.id for guild in client.guilds])
+    except RuntimeError as e:
+        # Melhor não subir do que atender um servidor com o banco errado (ou vazio)
+        logging.error(str(e))
+        _startup_error = e
+        await client.close()
+        return
     try:
-        await tree.sync()
+        # on_ready roda a cada reconexão: só envia a árvore se ela mudou
+        await sync_on_ready(tree, client.application_id)
         logging.info(f'Bot {client.user.name} online!')
     except Exception as e:
         logging.error(f'Erro ao sincronizar comandos: {e}')
+    # Retoma limpezas de mensagens interrompidas por um reinício (só lê o
+    # índice de limpezas pendentes, sem carregar o banco de cada servidor)
+    for guild_id in databases.pending_deletes.guilds():
+        if guild_id not in _cleanups and client.get_guild(guild_id) is not None:
+            logging.info(f'Retomando limpeza de mensagens em {guild_id}')
+            _start_cleanup(guild_id)
+    # Participantes do legado lidos numa thread, para o primeiro comando não
+    # ler o arquivo inteiro no loop; nos outros servidores, databases.ready()
+    _warm_task = asyncio.create_task(databases.warm())
+
+def member_tickets(member: discord.Member) -> dict:
+    return databases.get(member.guild.id).ticket_policy().calculate(member)
+
+# Mudanças de cargo/apelido de inscritos, recalculadas e gravadas em lote
+TICKET_UPDATE_WINDOW = float(os.getenv('TICKET_UPDATE_WINDOW', '2'))
+_pending_members = {}
+_pending_members_task = None
+
+async def _apply_member_updates():
+    await asyncio.sleep(TICKET_UPDATE_WINDOW)
+    _flush_member_updates()
+
+def _flush_member_updates():
+    global _pending_members
+    pending, _pending_members = _pending_members, {}
+    changed = 0
+    for guild_id, members in pending.items():
+        db = databases.get(guild_id)
+        user_ids = list(members)
+        with db.batch():
+            for user_id, new_tickets in zip(user_ids, db.ticket_policy().calculate_many(members.values())):
+                participant = db.get_participant(user_id)
+                if participant and new_tickets != participant['tickets']:
+                    db.update_tickets(user_id, new_tickets)
+                    changed += 1
+    if changed:
+        logging.info(f'Fichas recalculadas automaticamente: {changed} participantes')
+
+@client.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    global _pending_members_task
+    if before.roles == after.roles and before.display_name == after.display_name and before.name == after.name:
+        return
+    user_id = str(after.id)
+    # Só servidores que já têm banco; não cria arquivos nem adia o descarte
+    db = databases.peek(after.guild.id)
+    if db is None:
+        return
+    await db.warm()
+    if not db.is_registered(user_id):
+        return
+    _pending_members.setdefault(after.guild.id, {})[user_id] = after
+    if _pending_members_task is None or _pending_members_task.done():
+        _pending_members_task = asyncio.create_task(_apply_member_updates())
 
 # Comando de sincronização forçada
 @tree.command(name='sync', description='[ADMIN] Forçar sincronização de comandos')
 @app_commands.default_permissions(administrator=True)
-async def sync_commands(interaction: discord.Interaction, guild_id: Optional[str] = None):
+@instrumented('sync')
+async def sync_command(interaction: discord.Interaction, guild_id: Optional[str] = None):
     try:
         if guild_id:
             guild_obj = discord.Object(id=int(guild_id))
-            synced = await tree.sync(guild=guild_obj)
+            synced = await sync_commands(tree, client.application_id, guild_obj, force=True)
             await interaction.response.send_message(f'✅ Sincronizado {len(synced)} comandos no guild {guild_id}', ephemeral=True)
         else:
-            synced = await tree.sync()
+            synced = await sync_commands(tree, client.application_id, force=True)
             await interaction.response.send_message(f'✅ Sincronizado {len(synced)} comandos globais', ephemeral=True)
     except Exception as e:
         logging.error(f'Erro ao sincronizar comandos: {e}')
@@ -226,7 +376,9 @@ async def sync_commands(interaction: discord.Interaction, guild_id: Optional[str
 # Comandos Administrativos
 @tree.command(name='hashtag', description='[ADMIN] Definir a hashtag oficial do sorteio')
 @app_commands.default_permissions(administrator=True)
+@instrumented('hashtag')
 async def hashtag(interaction: discord.Interaction, hashtag: str):
+    db = await databases.ready(interaction.guild_id)
     try:
         db.set_hashtag(hashtag)
         await interaction.response.send_message(f'✅ Hashtag definida: {hashtag}', ephemeral=True)
@@ -236,7 +388,9 @@ async def hashtag(interaction: discord.Interaction, hashtag: str):
 
 @tree.command(name='tag', description='[ADMIN] Configurar verificação de tag do servidor')
 @app_commands.default_permissions(administrator=True)
+@instrumented('tag')
 async def tag(interaction: discord.Interaction, tag: str, quantidade: int = 1):
+    db = await databases.ready(interaction.guild_id)
     try:
         db.set_tag_enabled(True, tag, quantidade)
         await interaction.response.send_message(
@@ -249,7 +403,9 @@ async def tag(interaction: discord.Interaction, tag: str, quantidade: int = 1):
 
 @tree.command(name='fichas', description='[ADMIN] Adicionar fichas extras para cargos')
 @app_commands.default_permissions(administrator=True)
+@instrumented('fichas')
 async def fichas(interaction: discord.Interaction, cargo: discord.Role, quantidade: int, abreviacao: str):
+    db = await databases.ready(interaction.guild_id)
     try:
         db.add_bonus_role(str(cargo.id), cargo.name, quantidade, abreviacao)
         await interaction.response.send_message(
@@ -262,7 +418,9 @@ async def fichas(interaction: discord.Interaction, cargo: discord.Role, quantida
 
 @tree.command(name='tirar', description='[ADMIN] Remover fichas extras de cargos')
 @app_commands.default_permissions(administrator=True)
+@instrumented('tirar')
 async def tirar(interaction: discord.Interaction, cargo: discord.Role):
+    db = await databases.ready(interaction.guild_id)
     try:
         db.remove_bonus_role(str(cargo.id))
         await interaction.response.send_message(
@@ -273,32 +431,60 @@ async def tirar(interaction: discord.Interaction, cargo: discord.Role):
         logging.error(f'Erro ao remover fichas: {e}')
         await interaction.response.send_message('❌ Erro ao remover fichas.', ephemeral=True)
 
+def _recalculate_chunk(chunk, guild: discord.Guild, policy) -> list:
+    found = []
+    for user_id, participant in chunk:
+        member = guild.get_member(int(user_id))
+        if member:
+            found.append((user_id, participant, member))
+    tickets = policy.calculate_many(member for _, _, member in found)
+    return [(user_id, participant, t) for (user_id, participant, _), t in zip(found, tickets)]
+
 @tree.command(name='atualizar', description='[ADMIN] Atualizar fichas dos participantes')
 @app_commands.default_permissions(administrator=True)
+@instrumented('atualizar')
 async def atualizar(interaction: discord.Interaction):
+    # Fixado até o fim: descartado no meio, a gravação iria para um banco fechado
+    db = databases.pin(interaction.guild_id)
     try:
+        await db.warm()
         await interaction.response.defer(ephemeral=True)
-        count = 0
-        for user_id, participant in db.get_all_participants().items():
-            member = interaction.guild.get_member(int(user_id))
-            if member:
-                new_tickets = calculate_tickets(
-                    member,
-                    db.data['config'].get('bonus_roles', {}),
-                    db.data['config'].get('tag_enabled', False),
-                    db.data['config'].get('server_tag', ''),
-                    db.data['config'].get('tag_quantity', 0)
-                )
-                db.update_tickets(user_id, new_tickets)
-                count += 1
-        
-        await interaction.followup.send(f'✅ Atualizadas fichas de {count} participantes.', ephemeral=True)
+        job = Job('atualizar', owner=interaction.guild_id)
+        progress = ProgressMessage(sender, interaction, '🔄 Verificando fichas')
+        await progress.start(job)
+        # Membros do discord.py só podem ser lidos no loop: pedaços entre awaits
+        results = await workers.map_chunks(
+            job, _recalculate_chunk, chunked(list(db.get_all_participants().items())),
+            interaction.guild, db.ticket_policy(), kind=INLINE
+        )
+        checked = changed = 0
+        # Reconciliação em lote: só grava quem mudou, numa única escrita
+        with db.batch():
+            for chunk in results:
+                checked += len(chunk)
+                for user_id, participant, tickets in chunk:
+                    if tickets == participant['tickets']:
+                        continue
+                    # Só grava se a inscrição não mudou enquanto os pedaços rodavam
+                    # (comparação por valor: o SQLite devolve um dict novo a cada leitura)
+                    current = db.get_participant(user_id)
+                    if current is not None and current['tickets'] == participant['tickets']:
+                        db.update_tickets(user_id, tickets)
+                        changed += 1
+        await db.flush()
+        await progress.finish(f'✅ Fichas verificadas de {checked} participantes, {changed} alteradas.')
+    except JobCancelled:
+        await progress.finish('⏹️ Atualização cancelada, nada foi alterado.')
     except Exception as e:
-        logging.error(f'Erro ao atualizar fichas: {e}')
-        await interaction.followup.send('❌ Erro ao atualizar fichas.', ephemeral=True)
+        logging.error(f'Erro em /atualizar: {e}', exc_info=True)
+        await sender.reply(interaction, '❌ Erro ao atualizar fichas.', ephemeral=True)
+    finally:
+        databases.unpin(interaction.guild_id)
 
 @tree.command(name='estatisticas', description='Ver estatísticas do sorteio')
+@instrumented('estatisticas')
 async def estatisticas(interaction: discord.Interaction):
+    db = await databases.ready(interaction.guild_id)
     try:
         stats = db.get_statistics()
         text = (
@@ -320,21 +506,47 @@ async def estatisticas(interaction: discord.Interaction):
         await interaction.response.send_message('❌ Erro ao carregar estatísticas.', ephemeral=True)
 
 @tree.command(name='blacklist', description='[ADMIN] Gerenciar lista de bloqueios')
+@app_commands.describe(
+    acao='add, remove, importar (CSV com user_id,motivo) ou exportar',
+    usuario='Usuário para add/remove',
+    arquivo='CSV para importar (user_id, motivo, username)'
+)
 @app_commands.default_permissions(administrator=True)
+@instrumented('blacklist')
 async def blacklist(
     interaction: discord.Interaction, 
     acao: str,
-    usuario: discord.Member,
-    motivo: str = "Sem motivo especificado"
+    usuario: Optional[discord.Member] = None,
+    motivo: str = "Sem motivo especificado",
+    arquivo: Optional[discord.Attachment] = None
 ):
+    db = await databases.ready(interaction.guild_id)
     try:
-        if acao.lower() == "add":
+        acao = acao.lower()
+        if acao == "importar":
+            if not arquivo:
+                await interaction.response.send_message('❌ Anexe o CSV para importar.', ephemeral=True)
+                return
+            await interaction.response.defer(ephemeral=True)
+            text = (await arquivo.read()).decode('utf-8-sig')
+            count = db.add_many_to_blacklist(parse_blacklist_csv(text, motivo))
+            await db.flush()
+            await sender.reply(interaction, f'✅ {count} usuários adicionados à blacklist.', ephemeral=True)
+        elif acao == "exportar":
+            data = format_blacklist_csv(db.get_blacklist()).encode('utf-8')
+            await interaction.response.send_message(
+                file=discord.File(fp=io.BytesIO(data), filename='blacklist.csv'),
+                ephemeral=True
+            )
+        elif acao in ("add", "remove") and not usuario:
+            await interaction.response.send_message('❌ Informe o usuário.', ephemeral=True)
+        elif acao == "add":
             db.add_to_blacklist(str(usuario.id), usuario.name, motivo)
             await interaction.response.send_message(
                 f'✅ {usuario.mention} foi banido do sorteio.\nMotivo: {motivo}',
                 ephemeral=True
             )
-        elif acao.lower() == "remove":
+        elif acao == "remove":
             db.remove_from_blacklist(str(usuario.id))
             await interaction.response.send_message(
                 f'✅ {usuario.mention} foi desbanido do sorteio.',
@@ -342,16 +554,21 @@ async def blacklist(
             )
         else:
             await interaction.response.send_message(
-                '❌ Ação inválida. Use "add" ou "remove".',
+                '❌ Ação inválida. Use "add", "remove", "importar" ou "exportar".',
                 ephemeral=True
             )
     except Exception as e:
         logging.error(f'Erro no blacklist: {e}')
-        await interaction.response.send_message('❌ Erro ao gerenciar blacklist.', ephemeral=True)
+        if interaction.response.is_done():
+            await sender.reply(interaction, '❌ Erro ao gerenciar blacklist.', ephemeral=True)
+        else:
+            await interaction.response.send_message('❌ Erro ao gerenciar blacklist.', ephemeral=True)
 
 @tree.command(name='chat', description='[ADMIN] Controlar quem pode escrever no canal (mensagem de inscrição via botão)')
 @app_commands.default_permissions(administrator=True)
+@instrumented('chat')
 async def chat(interaction: discord.Interaction, canal: discord.TextChannel, estado: bool):
+    db = await databases.ready(interaction.guild_id)
     try:
         db.set_chat_lock(estado, str(canal.id))
         await interaction.response.send_message(
@@ -364,7 +581,9 @@ async def chat(interaction: discord.Interaction, canal: discord.TextChannel, est
 
 # Público: verificar inscrição
 @tree.command(name='verificar', description='Verificar seu status de inscrição')
+@instrumented('verificar')
 async def verificar(interaction: discord.Interaction):
+    db = await databases.ready(interaction.guild_id)
     try:
         user_id = str(interaction.user.id)
         if not db.is_registered(user_id):
@@ -381,6 +600,7 @@ async def verificar(interaction: discord.Interaction):
 
 # /ajuda - mostra lista de comandos
 @tree.command(name='ajuda', description='Mostrar comandos disponíveis')
+@instrumented('ajuda')
 async def ajuda(interaction: discord.Interaction):
     text = (
         "**Comandos Públicos:**\n"
@@ -396,7 +616,9 @@ async def ajuda(interaction: discord.Interaction):
         "/exportar - Exportar lista de participantes\n"
         "/atualizar - Atualizar fichas dos participantes\n"
         "/estatisticas - Ver estatísticas do sorteio\n"
+        "/sortear - Sortear vencedores ponderando pelas fichas\n"
         "/limpar - Limpar inscrições e mensagens\n"
+        "/cancelar - Cancelar listas, exportações, atualizações e limpezas em andamento\n"
         "/blacklist - Gerenciar lista de bloqueios\n"
         "/chat - Controlar quem pode escrever no canal\n"
         "/anunciar - Enviar anúncio (mensagem/foto/video/embed/titulo)\n"
@@ -405,118 +627,308 @@ async def ajuda(interaction: discord.Interaction):
 
 # /lista - listar participantes (admin)
 @tree.command(name='lista', description='[ADMIN] Listar todos os participantes')
-@app_commands.describe(tipo='Tipo de lista')
+@app_commands.describe(tipo='Tipo de lista', formato='Como enviar a lista')
 @app_commands.choices(tipo=[
     app_commands.Choice(name='Sem fichas', value='simples'),
     app_commands.Choice(name='Com fichas', value='detalhada')
+], formato=[
+    app_commands.Choice(name='Automático', value='auto'),
+    app_commands.Choice(name='Páginas', value='paginas'),
+    app_commands.Choice(name='Arquivo .txt', value='arquivo')
 ])
 @app_commands.default_permissions(administrator=True)
-async def lista(interaction: discord.Interaction, tipo: str = 'simples'):
-    participants = db.get_all_participants()
-    
-    if not participants:
-        await interaction.response.send_message('Nenhum participante inscrito ainda.', ephemeral=True)
-        return
-    
-    participants = sorted(participants.values(), key=lambda p: p['full_name'])
-    
-    response = ''
-    
-    if tipo == 'detalhada':
-        for p in participants:
-            # Nome base com primeira ficha (participação)
-            first_name = p['first_name']
-            last_name_abbrev = p['last_name'][:2] + '.'
-            base_name = f"{first_name} {last_name_abbrev}"
-            response += f"{base_name}\n"
-            
-            # Fichas por cargos (usando abreviações)
-            for role_name, role_data in p['tickets'].get('roles', {}).items():
-                for _ in range(role_data['quantity']):
-                    response += f"{base_name} {role_data['abbreviation']}\n"
-            
-            # Fichas por tag (usando 'TAG')
-            if p['tickets'].get('tag'):
-                for _ in range(p['tickets']['tag']):
-                    response += f"{base_name} TAG\n"
-            
-            response += "\n"  # Linha extra entre participantes
-    else:
-        # Lista simples só com nomes completos
-        for p in participants:
-            response += f"{p['full_name']}\n"
-    
-    if len(response) > 2000:
-        chunks = [response[i:i+1900] for i in range(0, len(response), 1900)]
-        await interaction.response.send_message(chunks[0], ephemeral=True)
-        for chunk in chunks[1:]:
-            await interaction.followup.send(chunk, ephemeral=True)
-    else:
-        await interaction.response.send_message(response or 'Lista vazia', ephemeral=True)
+@instrumented('lista')
+async def lista(interaction: discord.Interaction, tipo: str = 'simples', formato: str = 'auto'):
+    # Fixado até o fim: a ordenação e os pedaços leem o banco entre awaits
+    db = databases.pin(interaction.guild_id)
+    try:
+        await db.warm()
+        stats = db.get_statistics()
+        if not stats['total_participants']:
+            await interaction.response.send_message('Nenhum participante inscrito ainda.', ephemeral=True)
+            return
+        
+        if formato == 'auto':
+            # Estimativa O(1) do tamanho: uma linha por ficha (+ separador) no modo detalhado
+            estimated_lines = stats['total_participants']
+            if tipo == 'detalhada':
+                estimated_lines += stats['total_tickets']
+            formato = 'arquivo' if estimated_lines > ATTACHMENT_LINES else 'paginas'
+        
+        await interaction.response.defer(ephemeral=True)
+        ordered = await workers.run(sort_by_name, db.iter_participants())
+
+        if formato == 'arquivo':
+            job = Job('lista', owner=interaction.guild_id)
+            progress = ProgressMessage(sender, interaction, '📝 Gerando lista')
+            await progress.start(job)
+            out = ListFile(f'participantes_{tipo}.txt')
+            try:
+                # Cada bloco vai para o arquivo assim que fica pronto, em ordem
+                await workers.map_chunks(
+                    job, render_list, chunked(ordered), tipo, kind=CPU,
+                    consume=lambda block: workers.run(out.write, block)
+                )
+            except JobCancelled:
+                await progress.finish('⏹️ Lista cancelada.')
+                return
+            await progress.finish('✅ Lista gerada.')
+            await sender.reply(interaction, file=out.file(), ephemeral=True)
+            return
+        
+        view = PaginatedView(paginate(list_lines(ordered, tipo)), f'Participantes ({len(ordered)})')
+        if view.next_page.disabled and view.index == 0:
+            # Cabe numa página só: mensagem simples
+            await sender.reply(interaction, view.embed().description, ephemeral=True)
+            return
+        await sender.reply(interaction, embed=view.embed(), view=view, ephemeral=True)
+    finally:
+        databases.unpin(interaction.guild_id)
 
-# /exportar - exporta CSV com participantes (admin)
-@tree.command(name='exportar', description='[ADMIN] Exportar lista de participantes (CSV)')
+# /exportar - exporta participantes em CSV ou JSONL (admin)
+@tree.command(name='exportar', description='[ADMIN] Exportar lista de participantes (CSV/JSONL)')
+@app_commands.describe(formato='Formato do arquivo', compactar='Compactar com gzip')
+@app_commands.choices(formato=[
+    app_commands.Choice(name='CSV', value='csv'),
+    app_commands.Choice(name='JSON Lines', value='jsonl')
+])
 @app_commands.default_permissions(administrator=True)
-async def exportar(interaction: discord.Interaction):
+@instrumented('exportar')
+async def exportar(interaction: discord.Interaction, formato: str = 'csv', compactar: bool = False):
+    db = databases.pin(interaction.guild_id)
     try:
-        parts = db.get_all_participants()
-        if not parts:
+        await db.warm()
+        total = db.get_statistics()['total_participants']
+        if not total:
             await interaction.response.send_message('Nenhum participante para exportar.', ephemeral=True)
             return
-        bio = io.StringIO()
-        writer = csv.writer(bio)
-        writer.writerow(['user_id', 'first_name', 'last_name', 'full_name', 'tickets', 'registered_at'])
-        for p in parts.values():
-            writer.writerow([p.get('user_id'), p.get('first_name'), p.get('last_name'), p.get('full_name'), p.get('tickets'), p.get('registered_at')])
-        bio.seek(0)
-        await interaction.response.send_message(file=File(fp=bio, filename='participantes.csv'), ephemeral=True)
+        await interaction.response.defer(ephemeral=True)
+        role_names = [role['name'] for role in db.get_config().get('bonus_roles', {}).values()]
+        part_limit = interaction.guild.filesize_limit if interaction.guild else DEFAULT_PART_LIMIT
+        job = Job('exportar', owner=interaction.guild_id)
+        progress = ProgressMessage(sender, interaction, '📤 Exportando participantes')
+        await progress.start(job)
+        # Participantes lidos sob demanda e serializados em processos; cada
+        # pedaço vai para a parte atual (thread de I/O) assim que fica pronto
+        writer = PartWriter(role_names, formato, compactar, part_limit)
+        await workers.map_chunks(
+            job, render_rows, iter_chunks(db.iter_participants()), role_names, formato,
+            kind=CPU, total=chunk_count(total), consume=lambda rows: workers.run(writer.write, rows)
+        )
+        parts = await workers.run(writer.finish)
+        await progress.finish(f'✅ Exportação pronta ({len(parts)} arquivo(s)).')
+        # Cada mensagem leva só as partes cuja soma cabe no limite de upload
+        for group in group_parts(parts, part_limit):
+            files = [discord.File(fp=fp, filename=filename) for filename, fp in group]
+            await sender.reply(interaction, files=files, ephemeral=True)
+    except JobCancelled:
+        await progress.finish('⏹️ Exportação cancelada.')
     except Exception as e:
         logging.error(f'Erro em /exportar: {e}', exc_info=True)
-        await interaction.response.send_message('❌ Erro ao exportar participantes.', ephemeral=True)
+        await sender.reply(interaction, '❌ Erro ao exportar participantes.', ephemeral=True)
+    finally:
+        databases.unpin(interaction.guild_id)
 
-# /limpar - limpa DB e opcionalmente mensagens do canal de inscrições
+# /sortear - sorteio ponderado pelas fichas (admin)
+@tree.command(name='sortear', description='[ADMIN] Sortear vencedores ponderando pelas fichas')
+@app_commands.describe(
+    quantidade='Número de vencedores distintos',
+    semente='Semente para repetir um sorteio (opcional)',
+    recalcular='Recalcular as fichas pelos cargos atuais antes de sortear'
+)
+@app_commands.default_permissions(administrator=True)
+@instrumented('sortear')
+async def sortear(
+    interaction: discord.Interaction,
+    quantidade: int = 1,
+    semente: Optional[str] = None,
+    recalcular: bool = False
+):
+    if semente and not semente.isdigit():
+        await interaction.response.send_message('❌ Semente inválida (use um número inteiro).', ephemeral=True)
+        return
+    db = databases.pin(interaction.guild_id)
+    try:
+        await db.warm()
+        await interaction.response.defer(ephemeral=True)
+        if not db.get_statistics()['total_participants']:
+            await sender.reply(interaction, 'Nenhum participante inscrito ainda.', ephemeral=True)
+            return
+        seed = int(semente) if semente else None
+        participants = db.iter_participants()
+        if recalcular:
+            # Membros do discord.py só podem ser lidos no loop: pedaços entre
+            # awaits, sem gravar; quem saiu do servidor fica de fora
+            job = Job('sortear', owner=interaction.guild_id)
+            results = await workers.map_chunks(
+                job, _recalculate_chunk, chunked(list(db.get_all_participants().items())),
+                interaction.guild, db.ticket_policy(), kind=INLINE
+            )
+            participants = [{**p, 'tickets': tickets} for chunk in results for _, p, tickets in chunk]
+        # Snapshot dos pesos, sorteio e registro numa thread de trabalho
+        result, participants = await workers.run(
+            draw_participants, participants, max(quantidade, 1), seed
+        )
+        lines = []
+        for position, user_id in enumerate(result['winners'], 1):
+            p = participants.get(user_id) or {}
+            lines.append(f"{position}. <@{user_id}> - {p.get('full_name', '?')}")
+        await sender.reply(
+            interaction,
+            "🎉 **Vencedores**\n" + '\n'.join(lines) +
+            f"\n\nParticipantes: {result['total_participants']} | Fichas: {result['total_tickets']}"
+            f"\nSemente: `{result['seed']}`\nPesos (sha256): `{result['weights_sha256'][:16]}`",
+            ephemeral=True
+        )
+    except JobCancelled:
+        await sender.reply(interaction, '⏹️ Sorteio cancelado.', ephemeral=True)
+    except Exception as e:
+        logging.error(f'Erro em /sortear: {e}', exc_info=True)
+        await sender.reply(interaction, '❌ Erro ao realizar sorteio.', ephemeral=True)
+    finally:
+        databases.unpin(interaction.guild_id)
+
+# Mensagens com mais de 14 dias não entram no bulk delete (margem de 1 minuto)
+BULK_DELETE_MAX_AGE = timedelta(days=14, minutes=-1)
+BULK_DELETE_SIZE = 100
+# Limpezas de mensagens em segundo plano, por servidor
+_cleanups = {}
+
+def _message_ids(participants) -> list:
+    # Inscrições anunciadas em lote dividem a mesma mensagem
+    return list(dict.fromkeys(p['message_id'] for p in participants if p.get('message_id')))
+
+async def _delete_chunk(chunk, channel: discord.TextChannel) -> int:
+    """Apaga até 100 mensagens numa chamada; as antigas, uma a uma"""
+    offset, message_ids = chunk
+    cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+    recent = [m for m in message_ids if discord.utils.snowflake_time(int(m)) > cutoff]
+    single = [m for m in message_ids if discord.utils.snowflake_time(int(m)) <= cutoff]
+    key = ('delete', channel.id)
+    if len(recent) > 1:
+        messages = [channel.get_partial_message(int(m)) for m in recent]
+        try:
+            await sender.call(key, lambda: channel.delete_messages(messages))
+        except discord.NotFound:
+            single += recent  # alguma já tinha sido apagada à mão
+    else:
+        single += recent
+    for message_id in single:
+        message = channel.get_partial_message(int(message_id))
+        try:
+            await sender.call(key, message.delete)
+        except discord.NotFound:
+            pass
+    # Progresso gravado a cada lote: um reinício retoma daqui
+    databases.pending_deletes.advance(channel.guild.id, offset + len(message_ids))
+    return len(message_ids)
+
+async def _run_cleanup(guild_id: int, interaction: Optional[discord.Interaction] = None):
+    """Apagar as mensagens pendentes de /limpar; sem interação, só registra no log"""
+    channel_id, done, message_ids = databases.pending_deletes.load(guild_id)
+    channel = client.get_channel(int(channel_id))
+    if channel is None:
+        # Canal apagado: não sobrou mensagem para apagar
+        logging.warning(f'Canal {channel_id} não encontrado; limpeza de mensagens em {guild_id} descartada')
+        databases.pending_deletes.clear(guild_id)
+        _cleanups.pop(guild_id, None)
+        if interaction is not None:
+            await sender.reply(interaction, '❌ Canal das inscrições não encontrado.', ephemeral=True)
+        return
+    progress = None
+    # Só erros que tentar de novo não resolve descartam a limpeza pendente
+    finished = True
+    try:
+        job = Job('limpar', owner=guild_id)
+        chunks = [
+            (start, message_ids[start:start + BULK_DELETE_SIZE])
+            for start in range(done, len(message_ids), BULK_DELETE_SIZE)
+        ]
+        if interaction is not None:
+            progress = ProgressMessage(sender, interaction, f'🗑️ Apagando {len(message_ids)} mensagens')
+            await progress.start(job)
+        await workers.map_chunks(job, _delete_chunk, chunks, channel, kind=INLINE)
+        text = f'✅ Mensagens de inscrição deletadas: {len(message_ids)}'
+    except JobCancelled:
+        if workers.closing:
+            return  # desligando: retomada no próximo on_ready
+        text = '⏹️ Limpeza de mensagens cancelada.'
+    except (discord.NotFound, discord.Forbidden) as e:
+        logging.warning(f'Sem acesso ao canal {channel_id} para apagar mensagens em {guild_id}: {e}')
+        text = '❌ Canal das inscrições apagado ou sem permissão para apagar mensagens.'
+    except Exception as e:
+        if workers.closing:
+            return
+        logging.error(f'Erro ao apagar mensagens de inscrição em {guild_id}: {e}', exc_info=True)
+        finished = False
+        text = '❌ Erro ao apagar as mensagens das inscrições. Use /limpar de novo para retomar.'
+    finally:
+        _cleanups.pop(guild_id, None)
+    if finished:
+        databases.pending_deletes.clear(guild_id)
+    logging.info(f'Limpeza de mensagens em {guild_id}: {text}')
+    if progress is not None:
+        try:
+            await progress.finish(text)
+        except Exception as e:
+            logging.warning(f'Erro ao atualizar progresso de limpar: {e}')
+
+def _start_cleanup(guild_id: int, interaction: Optional[discord.Interaction] = None):
+    _cleanups[guild_id] = asyncio.create_task(_run_cleanup(guild_id, interaction))
+
+# /limpar - limpa DB e opcionalmente as mensagens das inscrições no canal
 @tree.command(name='limpar', description='[ADMIN] Limpar inscrições e mensagens')
 @app_commands.default_permissions(administrator=True)
+@instrumented('limpar')
 async def limpar(interaction: discord.Interaction, canal_limpar: Optional[discord.TextChannel] = None):
+    db = await databases.ready(interaction.guild_id)
+    if interaction.guild_id in _cleanups:
+        await interaction.response.send_message(
+            '❌ Já há uma limpeza de mensagens em andamento. Use /cancelar para interrompê-la.', ephemeral=True
+        )
+        return
+    if interaction.guild_id in databases.pending_deletes.guilds():
+        # Limpeza que parou num erro: retoma de onde parou, sem mexer nas inscrições
+        await interaction.response.send_message(
+            '🔄 Retomando a limpeza de mensagens interrompida. Use /limpar de novo quando ela terminar.',
+            ephemeral=True
+        )
+        _start_cleanup(interaction.guild_id, interaction)
+        return
     try:
         await interaction.response.defer(ephemeral=True)
-        db.clear_participants()
-        deleted = 0
+        message_ids = []
         if canal_limpar:
-            # deleta mensagens do bot no canal (limite 500)
-            deleted = await canal_limpar.purge(limit=500, check=lambda m: m.author == client.user)
-        await interaction.followup.send(f'✅ Inscrições limpas. Mensagens deletadas: {deleted}', ephemeral=True)
+            # IDs guardados nas inscrições: sem varrer o histórico do canal
+            message_ids = await workers.run(_message_ids, db.iter_participants())
+        db.clear_participants()
+        await db.flush()
+        if message_ids:
+            # Gravado depois da limpeza: um crash no meio deixa mensagens
+            # sobrando, nunca apaga o anúncio de quem ainda está inscrito
+            await workers.run(databases.pending_deletes.save, interaction.guild_id, canal_limpar.id, message_ids)
+        await sender.reply(interaction, '✅ Inscrições limpas.', ephemeral=True)
+        if message_ids:
+            _start_cleanup(interaction.guild_id, interaction)
     except Exception as e:
         logging.error(f'Erro em /limpar: {e}', exc_info=True)
-        await interaction.followup.send('❌ Erro ao limpar inscrições.', ephemeral=True)
+        await sender.reply(interaction, '❌ Erro ao limpar inscrições.', ephemeral=True)
 
-# /exportar e /atualizar já implementados anteriormente; aqui está /atualizar concretizado
-@tree.command(name='atualizar', description='[ADMIN] Atualizar fichas dos participantes')
+# /cancelar - interrompe listas, exportações, atualizações e limpezas em andamento (admin)
+@tree.command(name='cancelar', description='[ADMIN] Cancelar operações longas em andamento')
 @app_commands.default_permissions(administrator=True)
-async def atualizar(interaction: discord.Interaction):
-    try:
-        await interaction.response.defer(ephemeral=True)
-        count = 0
-        for user_id, participant in db.get_all_participants().items():
-            member = interaction.guild.get_member(int(user_id))
-            if member:
-                new_tickets = calculate_tickets(
-                    member,
-                    db.data['config'].get('bonus_roles', {}),
-                    db.data['config'].get('tag_enabled', False),
-                    db.data['config'].get('server_tag', ''),
-                    db.data['config'].get('tag_quantity', 0)
-                )
-                db.update_tickets(user_id, new_tickets)
-                count += 1
-        await interaction.followup.send(f'✅ Atualizadas fichas de {count} participantes.', ephemeral=True)
-    except Exception as e:
-        logging.error(f'Erro em /atualizar: {e}', exc_info=True)
-        await interaction.followup.send('❌ Erro ao atualizar fichas.', ephemeral=True)
+@instrumented('cancelar')
+async def cancelar(interaction: discord.Interaction):
+    count = workers.cancel_owned(interaction.guild_id)
+    if count:
+        await interaction.response.send_message(f'⏹️ {count} operação(ões) cancelada(s).', ephemeral=True)
+    else:
+        await interaction.response.send_message('Nenhuma operação em andamento.', ephemeral=True)
 
 # /anunciar - enviar anúncio com texto, título, embed e/ou mídia (admin)
 @tree.command(name='anunciar', description='[ADMIN] Enviar anúncio (mensagem/foto/video/embed/titulo)')
 @app_commands.default_permissions(administrator=True)
+@instrumented('anunciar')
 async def anunciar(
     interaction: discord.Interaction,
     canal: discord.TextChannel,
@@ -531,48 +943,133 @@ async def anunciar(
             embed = discord.Embed(title=titulo or discord.Embed.Empty, description=mensagem or discord.Embed.Empty)
             if anexar:
                 file = await anexar.to_file()
-                await canal.send(embed=embed, file=file)
+                await sender.post(canal, embed=embed, file=file)
             else:
-                await canal.send(embed=embed)
+                await sender.post(canal, embed=embed)
         else:
             if anexar:
                 file = await anexar.to_file()
                 content = (f"**{titulo}**\n\n{mensagem}") if titulo or mensagem else None
-                await canal.send(content or None, file=file)
+                await sender.post(canal, content or None, file=file)
             else:
                 content = (f"**{titulo}**\n\n{mensagem}") if titulo or mensagem else ""
-                await canal.send(content)
-        await interaction.followup.send('✅ Anúncio enviado.', ephemeral=True)
+                await sender.post(canal, content)
+        await sender.reply(interaction, '✅ Anúncio enviado.', ephemeral=True)
     except Exception as e:
         logging.error(f'Erro em /anunciar: {e}', exc_info=True)
-        await interaction.followup.send('❌ Erro ao enviar anúncio.', ephemeral=True)
+        await sender.reply(interaction, '❌ Erro ao enviar anúncio.', ephemeral=True)
+
+# Estado é por servidor: nenhum comando funciona em DM
+for _command in tree.get_commands():
+    _command.guild_only = True
+
+# Descarrega periodicamente os bancos de servidores ociosos
+_eviction_task = None
+
+async def _evict_idle_databases():
+    while True:
+        await asyncio.sleep(max(databases.idle_seconds / 4, 1))
+        try:
+            evicted = await databases.evict_idle()
+            if evicted:
+                logging.info(f'{evicted} bancos ociosos descarregados, {len(databases.loaded())} em memória')
+        except Exception as e:
+            logging.error(f'Erro ao descarregar bancos ociosos: {e}')
 
 # Inicia um HTTP server mínimo para atender healthchecks em Render (opcional,
 # apenas se você NÃO puder usar Background Worker)
-import asyncio
-import os
-from aiohttp import web
-
 async def _health(request):
     return web.Response(text="ok")
 
-async def _start_web():
+def _health_status() -> dict:
+    last_writes = DB_LAST_WRITE_SECONDS.values.values()
+    return {
+        # Shard fechado = gateway caiu e não reconectou
+        'ready': client.is_ready() and not any(shard.is_closed() for shard in client.shards.values()),
+        'gateway_latency_ms': latency_ms(client.latency),
+        'loop_lag': loop_lag.snapshot(),
+        'last_save_ms': round(max(last_writes) * 1000, 1) if last_writes else None,
+        'pending_writes': databases.pending_writes()
+    }
+
+async def _healthz(request):
+    status = _health_status()
+    status['problems'] = health_problems(status, time.monotonic() - _started_at)
+    return web.json_response(status, status=503 if status['problems'] else 200)
+
+async def _metrics(request):
+    return web.Response(
+        text=registry.render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    )
+
+async def _start_web() -> Optional[web.AppRunner]:
     app = web.Application()
     app.router.add_get("/", _health)
+    app.router.add_get("/healthz", _healthz)
+    app.router.add_get("/metrics", _metrics)
     runner = web.AppRunner(app)
     await runner.setup()
     port = int(os.environ.get("PORT", 10000))
     site = web.TCPSite(runner, "0.0.0.0", port)
-    await site.start()
+    try:
+        await site.start()
+    except OSError as e:
+        # Sem healthcheck o bot continua funcionando
+        logging.error(f"Erro ao iniciar HTTP server na porta {port}: {e}")
+        await runner.cleanup()
+        return None
     logging.info(f"HTTP server running on port {port}")
+    return runner
 
-# Inicializa web server em background e roda o bot
+async def _shutdown(runner: Optional[web.AppRunner]):
+    logging.info("Encerrando...")
+    # Lotes pendentes precisam da conexão com o Discord, então vêm antes do close
+    if _pending_members_task is not None and not _pending_members_task.done():
+        _pending_members_task.cancel()
+    _flush_member_updates()
+    try:
+        await announcer.flush()
+    except Exception as e:
+        logging.error(f"Erro ao publicar inscrições pendentes: {e}")
+    workers.shutdown()
+    if not client.is_closed():
+        await client.close()
+    if runner is not None:
+        await runner.cleanup()
+    if _eviction_task is not None:
+        _eviction_task.cancel()
+    loop_lag.stop()
+    # grava mutações ainda pendentes no write-behind
+    await databases.flush()
+    databases.close()
+
+# Bot e web server no mesmo event loop: sem threads disputando o db
 async def _main():
-    # start web server
-    asyncio.create_task(_start_web())
-    # run discord client (blocking)
-    client_task = asyncio.get_event_loop().run_in_executor(None, client.run, os.getenv("BOT_TOKEN"))
-    await client_task
+    global _eviction_task
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: KeyboardInterrupt cancela _main
+    loop_lag.start()
+    runner = await _start_web()
+    _eviction_task = asyncio.create_task(_evict_idle_databases())
+    client_task = asyncio.create_task(client.start(os.getenv("BOT_TOKEN")))
+    stop_task = asyncio.create_task(stop.wait())
+    try:
+        await asyncio.wait({client_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stop_task.cancel()
+        await _shutdown(runner)
+        if not client_task.done():
+            await asyncio.wait({client_task}, timeout=10)
+    # Propaga erro de login/conexão para o processo sair com falha
+    if client_task.done() and not client_task.cancelled():
+        client_task.result()
+    if _startup_error is not None:
+        raise _startup_error
 
 if __name__ == "__main__":
     try:
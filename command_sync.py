@@ -0,0 +1,67 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+import discord
+from discord import app_commands
+
+from storage import atomic_write_json
+
+# Hash do último payload enviado ao Discord, por escopo (global ou guild)
+SYNC_CACHE_FILE = os.getenv('COMMAND_SYNC_CACHE', '.command_sync.json')
+# Com DEV_GUILD_ID os comandos vão só para esse servidor (aparecem na hora)
+DEV_GUILD_ID = os.getenv('DEV_GUILD_ID')
+
+
+def payload_hash(tree: app_commands.CommandTree, guild: Optional[discord.abc.Snowflake] = None) -> str:
+    # Mesmo payload que o tree.sync envia
+    payload = [command.to_dict() for command in tree.get_commands(guild=guild)]
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _load_cache(path: str) -> Dict[str, str]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f'Cache de sincronização ilegível, ignorando: {e}')
+        return {}
+
+
+def _cache_key(application_id: Optional[int], guild: Optional[discord.abc.Snowflake]) -> str:
+    scope = f'guild:{guild.id}' if guild is not None else 'global'
+    return f'{application_id}:{scope}'
+
+
+async def sync_commands(tree: app_commands.CommandTree, application_id: Optional[int],
+                        guild: Optional[discord.abc.Snowflake] = None, force: bool = False,
+                        cache_file: str = SYNC_CACHE_FILE) -> Optional[List[app_commands.AppCommand]]:
+    """Sincronizar a árvore só se o payload mudou; devolve None quando pulou"""
+    digest = payload_hash(tree, guild)
+    key = _cache_key(application_id, guild)
+    cache = _load_cache(cache_file)
+    if not force and cache.get(key) == digest:
+        logging.info(f'Comandos sem mudanças ({key}), sincronização ignorada')
+        return None
+    synced = await tree.sync(guild=guild)
+    cache[key] = digest
+    try:
+        atomic_write_json(cache_file, cache)
+    except OSError as e:
+        logging.warning(f'Não foi possível gravar o cache de sincronização: {e}')
+    logging.info(f'{len(synced)} comandos sincronizados ({key})')
+    return synced
+
+
+async def sync_on_ready(tree: app_commands.CommandTree, application_id: Optional[int]):
+    if DEV_GUILD_ID:
+        guild = discord.Object(id=int(DEV_GUILD_ID))
+        tree.copy_global_to(guild=guild)
+        await sync_commands(tree, application_id, guild)
+    else:
+        await sync_commands(tree, application_id)
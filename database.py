@@ -1,204 +1,670 @@
-import json
+import asyncio
 import os
-from typing import Dict, List, Optional
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
 from datetime import datetime
 import logging
+from indexes import NameIndex, StatsCounter
+from metrics import DB_WRITE_BYTES, timed
+from records import RecordCodec
+from utils import TicketPolicy
+from storage import (
+    FORMAT_VERSION, JournalStore, PendingDeletes, data_version, empty_data, normalize_data, read_database_file,
+    read_header, snapshot_data, write_database_file
+)
 
 DB_FILE = 'database.json'
+# 'json' reescreve o arquivo inteiro a cada mudança; 'journal' anexa cada
+# mutação num journal e compacta em snapshot em segundo plano
+# 'sqlite' usa o backend SQLite (database_sqlite.py) no lugar do JSON
+DB_STORAGE = os.getenv('DB_STORAGE', 'json')
+# Write-behind: acumula mutações e grava num worker thread a cada
+# DB_FLUSH_INTERVAL_MS ou a cada DB_FLUSH_MAX_CHANGES mudanças
+DB_WRITE_BEHIND = os.getenv('DB_WRITE_BEHIND', '0') == '1'
+DB_FLUSH_INTERVAL_MS = int(os.getenv('DB_FLUSH_INTERVAL_MS', '1000'))
+DB_FLUSH_MAX_CHANGES = int(os.getenv('DB_FLUSH_MAX_CHANGES', '500'))
 
 class Database:
-    def __init__(self):
-        self.db_file = DB_FILE
-        self.data = {
-            'participants': {},  # Dicionário vazio
-            'blacklist': [],
-            'config': {
-                'hashtag': None,
-                'hashtag_locked': False,
-                'bonus_roles': {},
-                'tag_enabled': False,
-                'server_tag': None,
-                'tag_quantity': 1,
-                'chat_lock_enabled': False,
-                'chat_lock_channel': None,
-                'inscricao_channel': None
-            }
-        }
+    def __init__(self, db_file: str = DB_FILE, storage: str = DB_STORAGE,
+                 write_behind: bool = DB_WRITE_BEHIND,
+                 flush_interval_ms: int = DB_FLUSH_INTERVAL_MS,
+                 flush_max_changes: int = DB_FLUSH_MAX_CHANGES):
+        self.db_file = db_file
+        self.storage = storage
+        self.journal = JournalStore(db_file) if storage == 'journal' else None
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_max_changes = flush_max_changes
+        self._pending_ops = []
+        self._dirty = False
+        self._flush_timer = None
+        self._flush_task = None
+        self._flush_lock = None
+        self._batch = None
+        # Leitura dos participantes numa thread (warm), esperada pelos comandos
+        self._warm_task = None
+        self.data = empty_data()
+        # Índice de nomes montado na primeira busca por nome
+        self._names: Optional[NameIndex] = None
+        self.stats = StatsCounter()
+        self._policy = None
+        self.codec = RecordCodec(self.data['roles'], self.data['config']['bonus_roles'])
+        # False enquanto só o cabeçalho foi lido (participantes sob demanda)
+        self._loaded = True
         self.load()
     
     def load(self):
         try:
-            if os.path.exists(DB_FILE):
-                with open(DB_FILE, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
+            self._loaded = True
+            if self._load_header():
+                return
+            version = FORMAT_VERSION
+            if self.journal:
+                data = self.journal.load()
+                if data is not None:
+                    self.data = data
+                    version = data_version(data)
+            elif os.path.exists(self.db_file):
+                self.data = read_database_file(self.db_file)
+                version = data_version(self.data)
+            normalize_data(self.data)
+            self.data.pop('header', None)
+            self._policy = None
+            self.codec = RecordCodec(self.data['roles'], self.data['config']['bonus_roles'])
+            self.codec.load(self.data['participants'])
+            self._rebuild_indexes()
+            if version < FORMAT_VERSION:
+                # Migração automática: regrava já no formato atual
+                logging.info(f'Migrando {self.db_file} do formato {version} para {FORMAT_VERSION}')
+                self._rewrite()
         except Exception as e:
             print(f'Erro ao carregar database: {e}')
     
+    def _load_header(self) -> bool:
+        # Partida rápida: config, cargos, blacklist e estatísticas vêm da primeira
+        # linha do arquivo; os participantes só são lidos quando alguém precisar
+        if self.journal and self.journal.has_pending():
+            return False
+        if not os.path.exists(self.db_file):
+            return False
+        head = read_header(self.db_file)
+        if head is None or 'stats' not in head['header']:
+            return False
+        self.stats.load(head.pop('header')['stats'])
+        self.data = normalize_data(head)
+        del self.data['participants']
+        self._loaded = False
+        self._policy = None
+        self.codec = RecordCodec(self.data['roles'], self.data['config']['bonus_roles'])
+        self._names = None
+        return True
+    
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        started = time.perf_counter()
+        self._set_participants(self._read_participants(), started)
+    
+    def _read_participants(self) -> Dict:
+        # Também roda numa thread (warm): só lê o arquivo, sem mexer no banco
+        participants = normalize_data(read_database_file(self.db_file))['participants']
+        self.codec.load(participants)
+        return participants
+    
+    def _set_participants(self, participants: Dict, started: float):
+        self.data['participants'] = participants
+        self._loaded = True
+        # As estatísticas do cabeçalho já valem; o índice de nomes fica para depois
+        self._names = None
+        logging.info(
+            f'{len(participants)} participantes carregados em '
+            f'{(time.perf_counter() - started) * 1000:.0f} ms'
+        )
+    
+    async def warm(self):
+        """Carregar os participantes numa thread; quem usa o banco no loop
+        espera isto em vez de ler o arquivo inteiro no primeiro acesso"""
+        if self._loaded:
+            return
+        if self._warm_task is None:
+            self._warm_task = asyncio.ensure_future(self._warm())
+        await asyncio.shield(self._warm_task)
+    
+    async def _warm(self):
+        started = time.perf_counter()
+        try:
+            participants = await asyncio.get_running_loop().run_in_executor(None, self._read_participants)
+        except Exception as e:
+            # O primeiro acesso tenta de novo, de forma síncrona
+            logging.error(f'Erro ao carregar participantes: {e}')
+            return
+        finally:
+            self._warm_task = None
+        # Um acesso síncrono pode ter carregado (e mudado) os participantes antes
+        if not self._loaded:
+            self._set_participants(participants, started)
+    
+    @property
+    def participants(self) -> Dict:
+        self._ensure_loaded()
+        return self.data['participants']
+    
+    def _rebuild_indexes(self):
+        self._names = None
+        self.stats.clear()
+        for p in self.participants.values():
+            self.stats.add(p['tickets'])
+    
+    @property
+    def names(self) -> NameIndex:
+        if self._names is None:
+            names = NameIndex()
+            for user_id, p in self.participants.items():
+                names.add(user_id, p['first_name'], p['last_name'])
+            self._names = names
+        return self._names
+    
+    def _commit(self, *ops):
+        # Registros nunca são alterados no lugar: cada mudança substitui o
+        # registro inteiro, o que permite snapshots baratos do estado
+        if self._batch is not None:
+            self._batch.extend(ops)
+            return
+        if self.write_behind:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                self._mark_dirty(loop, list(ops))
+                return
+        if self.journal:
+            try:
+                if self.journal.write([list(ops)]):
+                    self._compact()
+            except Exception as e:
+                logging.error(f'Erro ao gravar journal: {str(e)}')
+        else:
+            self.save()
+    
+    @contextmanager
+    def batch(self):
+        # Agrupa várias mutações numa única gravação
+        if self._batch is not None:
+            yield
+            return
+        self._batch = []
+        try:
+            yield
+        finally:
+            ops, self._batch = self._batch, None
+            if ops:
+                self._commit(*ops)
+    
+    def _mark_dirty(self, loop, ops):
+        self._pending_ops.append(ops)
+        self._dirty = True
+        if len(self._pending_ops) >= self.flush_max_changes:
+            self._start_flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(self.flush_interval, self._start_flush)
+    
+    def _start_flush(self):
+        self._flush_timer = None
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self.flush())
+    
+    @property
+    def pending_writes(self) -> int:
+        """Mutações do write-behind ainda não gravadas"""
+        return len(self._pending_ops)
+
+    async def flush(self):
+        """Grava imediatamente as mudanças pendentes do write-behind"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        try:
+            await self._flush_pending()
+        finally:
+            # Mudanças que chegaram durante a gravação (o timer delas achou a
+            # gravação em andamento) ou que falharam voltam para o timer
+            if self._dirty and self._flush_timer is None:
+                self._flush_timer = asyncio.get_running_loop().call_later(
+                    self.flush_interval, self._start_flush
+                )
+
+    async def _flush_pending(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batches, self._pending_ops = self._pending_ops, []
+            self._dirty = False
+            loop = asyncio.get_running_loop()
+            try:
+                if self.journal:
+                    if await loop.run_in_executor(None, self.journal.write, batches):
+                        self._compact()
+                else:
+                    # O snapshot é tirado no event loop; serializar e gravar
+                    # acontecem no worker thread
+                    self._ensure_loaded()
+                    snapshot = snapshot_data(self.data)
+                    await loop.run_in_executor(None, self._write_file, snapshot, self.stats.snapshot())
+            except Exception as e:
+                logging.error(f'Erro ao gravar banco de dados: {str(e)}')
+                self._pending_ops = batches + self._pending_ops
+                self._dirty = True
+    
+    def close(self):
+        # Grava de forma síncrona o que ficou pendente (ex: loop já encerrado)
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._dirty:
+            batches, self._pending_ops = self._pending_ops, []
+            self._dirty = False
+            if self.journal:
+                self.journal.write(batches)
+            else:
+                self.save()
+        if self.journal:
+            if self._loaded and self.journal.has_pending():
+                # Na próxima partida basta ler o cabeçalho
+                self._compact(wait=True)
+            self.journal.close()
+    
+    def _compact(self, wait: bool = False):
+        self._ensure_loaded()
+        self.journal.compact(self.data, wait=wait, stats=self.stats.snapshot())
+    
+    def _write_file(self, data: Dict, stats: Optional[Dict] = None):
+        with timed('save'):
+            write_database_file(self.db_file, data, stats)
+        DB_WRITE_BYTES.inc('save', amount=os.path.getsize(self.db_file))
+        logging.debug('Banco de dados salvo com sucesso')
+    
+    def _rewrite(self):
+        if self.journal:
+            self._compact(wait=True)
+        else:
+            self._write_file(snapshot_data(self.data), self.stats.snapshot())
+    
     def save(self):
+        if self.journal:
+            self._compact(wait=True)
+            return
         try:
-            with open(self.db_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-            logging.info('Banco de dados salvo com sucesso')
+            self._ensure_loaded()
+            self._write_file(self.data, self.stats.snapshot())
         except Exception as e:
             logging.error(f'Erro ao salvar banco de dados: {str(e)}')
     
+    def _set_config(self, **values):
+        self._policy = None
+        for key, value in values.items():
+            self.data['config'][key] = value
+        self._commit(*(['set', ['config', key], value] for key, value in values.items()))
+    
+    def _role_ops(self, new_roles: List) -> List:
+        return [['set', ['roles', key], entry] for key, entry in new_roles]
+    
     def add_participant(self, user_id: str, first_name: str, last_name: str, 
                    full_name: str, message_id: str, tickets: dict, registered_at: str):
-        self.data['participants'][user_id] = {
-            'user_id': user_id,
-            'first_name': first_name,
-            'last_name': last_name,
-            'full_name': full_name,
-            'message_id': message_id,
-            'tickets': tickets,
-            'registered_at': registered_at
-        }
-        self.save()
+        new_roles = []
+        participant = self.codec.make(
+            user_id, first_name, last_name, full_name, message_id, tickets, registered_at, new_roles
+        )
+        tickets = participant.tickets
+        previous = self.participants.get(user_id)
+        if previous:
+            self.stats.remove(previous['tickets'])
+        self.participants[user_id] = participant
+        if self._names is not None:
+            self._names.add(user_id, first_name, last_name)
+        self.stats.add(tickets)
+        self._commit(*self._role_ops(new_roles), ['set', ['participants', user_id], participant.to_row()])
     
     def remove_participant(self, user_id: str):
-        if user_id in self.data['participants']:
-            del self.data['participants'][user_id]
-            self.save()
+        participant = self.participants.pop(user_id, None)
+        if participant is not None:
+            if self._names is not None:
+                self._names.remove(user_id)
+            self.stats.remove(participant['tickets'])
+            self._commit(['del', ['participants', user_id]])
+    
+    def set_message_ids(self, message_ids: Dict[str, str]):
+        # Inscrições anunciadas em lote apontam para a mensagem do lote
+        with self.batch():
+            for user_id, message_id in message_ids.items():
+                participant = self.participants.get(user_id)
+                if participant:
+                    participant = participant.replace(message_id=message_id)
+                    self.participants[user_id] = participant
+                    self._commit(['set', ['participants', user_id], participant.to_row()])
     
     def get_participant(self, user_id: str) -> Optional[Dict]:
-        return self.data['participants'].get(user_id)
+        return self.participants.get(user_id)
     
     def is_registered(self, user_id: str) -> bool:
         try:
             # Garante que user_id é string
             user_id = str(user_id)
-            # Log mais detalhado
-            logging.info(f'Verificando registro do usuário {user_id}')
-            logging.info(f'Database atual: {self.data}')
-            return user_id in self.data['participants']
+            logging.debug('Verificando registro do usuário %s', user_id)
+            return user_id in self.participants
         except Exception as e:
             logging.error(f'Erro ao verificar registro: {e}')
             return False
     
     def is_name_taken(self, first_name: str, last_name: str) -> bool:
-        full_name = f"{first_name} {last_name}"
-        return any(p['full_name'] == full_name for p in self.data['participants'])
+        # Compara o nome normalizado (sem acentos, caixa ou espaços extras)
+        return bool(self.names.lookup(first_name, last_name))
+    
+    def find_similar_names(self, first_name: str, last_name: str, max_distance: int = 2) -> List:
+        return self.names.similar(first_name, last_name, max_distance)
     
     def get_all_participants(self) -> Dict:
         # Retorna o dicionário diretamente
-        return self.data['participants']
+        return self.participants
+    
+    def iter_participants(self) -> Iterator[Dict]:
+        # Lista de referências tirada agora: pode ser consumida em outra thread
+        # porque os registros nunca são alterados no lugar
+        return iter(list(self.participants.values()))
     
     def update_tickets(self, user_id: str, tickets: Dict):
         participant = self.get_participant(user_id)
         if participant:
-            participant['tickets'] = tickets
-            self.save()
+            new_roles = []
+            tickets, role_refs = self.codec.tickets(tickets, new_roles)
+            self.stats.remove(participant['tickets'])
+            self.stats.add(tickets)
+            participant = participant.replace(tickets=tickets, role_refs=role_refs)
+            self.participants[user_id] = participant
+            self._commit(*self._role_ops(new_roles), ['set', ['participants', user_id], participant.to_row()])
     
     def add_to_blacklist(self, user_id: str, username: str, reason: str):
-        self.data['blacklist'].append({
+        entry = {
             'user_id': user_id,
             'username': username,
             'reason': reason,
             'added_at': datetime.now().isoformat()
-        })
-        self.save()
+        }
+        self.data['blacklist'][user_id] = entry
+        self._commit(['set', ['blacklist', user_id], entry])
+    
+    def add_many_to_blacklist(self, entries: Iterable[Dict]) -> int:
+        # Importação em massa: uma única gravação para todos os banimentos
+        count = 0
+        with self.batch():
+            for entry in entries:
+                self.add_to_blacklist(
+                    str(entry['user_id']), entry.get('username'), entry.get('reason')
+                )
+                count += 1
+        return count
     
     def remove_from_blacklist(self, user_id: str):
-        self.data['blacklist'] = [u for u in self.data['blacklist'] if u['user_id'] != user_id]
-        self.save()
+        if self.data['blacklist'].pop(user_id, None) is not None:
+            self._commit(['del', ['blacklist', user_id]])
     
     def is_blacklisted(self, user_id: str) -> bool:
-        return any(u['user_id'] == user_id for u in self.data['blacklist'])
+        return str(user_id) in self.data['blacklist']
     
     def get_blacklist(self) -> List[Dict]:
-        return self.data['blacklist']
+        return list(self.data['blacklist'].values())
     
     def set_hashtag(self, hashtag: str):
-        self.data['config']['hashtag'] = hashtag
-        self.save()
+        self._set_config(hashtag=hashtag)
     
     def lock_hashtag(self):
-        self.data['config']['hashtag_locked'] = True
-        self.save()
+        self._set_config(hashtag_locked=True)
     
     def add_bonus_role(self, role_id: str, role_name: str, quantity: int, abbreviation: str):
-        self.data['config']['bonus_roles'][role_id] = {
+        role = {
             'name': role_name,
             'quantity': quantity,
             'abbreviation': abbreviation
         }
-        self.save()
+        self.data['config']['bonus_roles'][role_id] = role
+        self._policy = None
+        self._commit(['set', ['config', 'bonus_roles', role_id], role])
     
     def remove_bonus_role(self, role_id: str):
         if role_id in self.data['config']['bonus_roles']:
             del self.data['config']['bonus_roles'][role_id]
-            self.save()
+            self._policy = None
+            self._commit(['del', ['config', 'bonus_roles', role_id]])
     
     def set_tag_enabled(self, enabled: bool, tag: Optional[str] = None, quantity: Optional[int] = None):
-        self.data['config']['tag_enabled'] = enabled
-        self.data['config']['server_tag'] = tag
+        values = {'tag_enabled': enabled, 'server_tag': tag}
         if quantity is not None:
-            self.data['config']['tag_quantity'] = quantity
-        self.save()
+            values['tag_quantity'] = quantity
+        self._set_config(**values)
     
     def clear_participants(self):
         # Muda de lista para dicionário vazio
         self.data['participants'] = {}
+        self._loaded = True
         self.data['config']['hashtag_locked'] = False
-        self.save()
+        self._names = None
+        self.stats.clear()
+        self._commit(
+            ['set', ['participants'], {}],
+            ['set', ['config', 'hashtag_locked'], False]
+        )
     
     def set_chat_lock(self, enabled: bool, channel_id: Optional[str] = None):
-        self.data['config']['chat_lock_enabled'] = enabled
+        values = {'chat_lock_enabled': enabled}
         if channel_id is not None:
-            self.data['config']['chat_lock_channel'] = channel_id
-        self.save()
+            values['chat_lock_channel'] = channel_id
+        self._set_config(**values)
     
     def clear_all(self):
-        self.data = {  # Reset completo
-            'participants': {},  # Dicionário vazio
-            'blacklist': [],
-            'config': {
-                'hashtag': None,
-                'hashtag_locked': False,
-                'bonus_roles': {},
-                'tag_enabled': False,
-                'server_tag': None,
-                'tag_quantity': 1,
-                'chat_lock_enabled': False,
-                'chat_lock_channel': None,
-                'inscricao_channel': None
-            }
-        }
-        self.save()
+        self.data = empty_data()  # Reset completo
+        self._loaded = True
+        self._policy = None
+        self.codec = RecordCodec(self.data['roles'], self.data['config']['bonus_roles'])
+        self._names = None
+        self.stats.clear()
+        self._commit(['set', [], self.data])
     
     def get_statistics(self) -> Dict:
-        total_tickets = 0
-        tickets_by_role = {}
-        tickets_by_tag = 0
-        
-        # Corrige iteração sobre dicionário
-        for user_id, p in self.data['participants'].items():
-            tickets = p['tickets']
-            total_tickets += 1
-            
-            for role_name, role_data in tickets.get('roles', {}).items():
-                total_tickets += role_data['quantity']
-                tickets_by_role[role_name] = tickets_by_role.get(role_name, 0) + 1
-            
-            if tickets.get('tag'):
-                total_tickets += tickets['tag']
-                tickets_by_tag += 1
-        
-        return {
-            'total_participants': len(self.data['participants']),
-            'total_tickets': total_tickets,
-            'tickets_by_role': tickets_by_role,
-            'tickets_by_tag': tickets_by_tag
-        }
+        # Contadores mantidos a cada mudança: O(1)
+        return self.stats.snapshot()
+    
+    def check_statistics(self) -> Dict:
+        # Recalcula tudo do zero e devolve (e corrige) qualquer divergência
+        return self.stats.check(self.participants.values())
     
     def set_inscricao_channel(self, channel_id: str):
-        self.data['config']['inscricao_channel'] = str(channel_id)
         try:
-            self.save()
+            self._set_config(inscricao_channel=str(channel_id))
         except Exception:
             pass
 
     def get_inscricao_channel(self) -> Optional[str]:
         return self.data['config'].get('inscricao_channel')
 
-db = Database()
+    def get_config(self) -> Dict:
+        return self.data['config']
+
+    def ticket_policy(self) -> TicketPolicy:
+        # Recompilada só quando a configuração muda
+        if self._policy is None:
+            self._policy = TicketPolicy.from_config(self.data['config'])
+        return self._policy
+
+def open_database(storage: str = DB_STORAGE, db_file: str = DB_FILE,
+                  sqlite_file: Optional[str] = None):
+    if storage == 'sqlite':
+        from database_sqlite import SQLITE_FILE, SqliteDatabase
+        return SqliteDatabase(sqlite_file or SQLITE_FILE, json_file=db_file)
+    return Database(db_file, storage=storage)
+
+# Um arquivo (ou banco SQLite) por servidor em DB_DIR
+DB_DIR = os.getenv('DB_DIR', 'guilds')
+# Servidor que continua usando database.json / database.sqlite3 da raiz,
+# para instalações que rodavam com um servidor só
+DB_LEGACY_GUILD_ID = os.getenv('DB_LEGACY_GUILD_ID')
+# Bancos sem uso há mais que isso são gravados e descarregados da memória
+DB_IDLE_SECONDS = float(os.getenv('DB_IDLE_SECONDS', '900'))
+
+class GuildDatabases:
+    """Estado particionado por servidor, carregado sob demanda."""
+
+    def __init__(self, storage: str = DB_STORAGE, directory: str = DB_DIR,
+                 legacy_guild_id: Optional[str] = DB_LEGACY_GUILD_ID,
+                 idle_seconds: float = DB_IDLE_SECONDS):
+        self.storage = storage
+        self.directory = directory
+        self.legacy_guild_id = legacy_guild_id
+        self.idle_seconds = idle_seconds
+        self._open: Dict[str, object] = {}
+        self._last_used: Dict[str, float] = {}
+        # Bancos em uso por trabalhos longos: não são descarregados
+        self._pins: Dict[str, int] = {}
+        # Limpezas de mensagens do /limpar, retomadas sem carregar os bancos
+        self.pending_deletes = PendingDeletes(os.path.join(directory, 'pending_deletes'))
+        self.loads = 0
+        self.evictions = 0
+
+    def paths(self, guild_id: str):
+        """(arquivo JSON, arquivo SQLite) do servidor"""
+        if guild_id == self.legacy_guild_id:
+            return DB_FILE, None
+        base = os.path.join(self.directory, guild_id)
+        return f'{base}.json', f'{base}.sqlite3'
+
+    def get(self, guild_id) -> 'Database':
+        if guild_id is None:
+            raise ValueError('Comando usado fora de um servidor')
+        guild_id = str(guild_id)
+        self._last_used[guild_id] = time.monotonic()
+        database = self._open.get(guild_id)
+        if database is None:
+            os.makedirs(self.directory, exist_ok=True)
+            database = self._load(guild_id)
+        return database
+
+    def peek(self, guild_id) -> Optional['Database']:
+        """Banco já aberto ou já existente em disco, sem criar arquivos nem contar como uso"""
+        guild_id = str(guild_id)
+        database = self._open.get(guild_id)
+        if database is None and self._exists(guild_id):
+            # Recém-aberto: precisa de um horário de uso para poder ser descarregado
+            self._last_used[guild_id] = time.monotonic()
+            database = self._load(guild_id)
+        return database
+
+    def _exists(self, guild_id: str) -> bool:
+        db_file, sqlite_file = self.paths(guild_id)
+        if sqlite_file is None:
+            from database_sqlite import SQLITE_FILE
+            sqlite_file = SQLITE_FILE
+        return any(os.path.exists(path) for path in (db_file, f'{db_file}.journal', sqlite_file))
+
+    def _load(self, guild_id: str) -> 'Database':
+        db_file, sqlite_file = self.paths(guild_id)
+        database = self._open[guild_id] = open_database(self.storage, db_file, sqlite_file)
+        self.loads += 1
+        logging.info(f'Banco do servidor {guild_id} carregado')
+        return database
+
+    async def ready(self, guild_id) -> 'Database':
+        """get() com os participantes já carregados fora do event loop"""
+        database = self.get(guild_id)
+        await database.warm()
+        return database
+
+    async def warm(self):
+        """Carregar numa thread os participantes dos bancos abertos e do legado"""
+        guild_ids = set(self._open)
+        if self.legacy_guild_id:
+            guild_ids.add(self.legacy_guild_id)
+        for guild_id in guild_ids:
+            database = self.peek(guild_id)
+            if database is not None:
+                await database.warm()
+
+    def pin(self, guild_id) -> 'Database':
+        """get() que impede o descarte até o unpin (use com try/finally)"""
+        database = self.get(guild_id)
+        guild_id = str(guild_id)
+        self._pins[guild_id] = self._pins.get(guild_id, 0) + 1
+        return database
+
+    def unpin(self, guild_id):
+        guild_id = str(guild_id)
+        count = self._pins.get(guild_id, 0) - 1
+        if count > 0:
+            self._pins[guild_id] = count
+        else:
+            self._pins.pop(guild_id, None)
+        # O tempo ocioso conta a partir do fim do trabalho
+        self._last_used[guild_id] = time.monotonic()
+
+    def loaded(self) -> List[str]:
+        return list(self._open)
+
+    def claim_legacy(self, guild_ids: List) -> Optional[str]:
+        """Decidir o dono do banco da raiz quando DB_LEGACY_GUILD_ID não está definido
+
+        Com um servidor só (e sem banco próprio em DB_DIR) o banco da raiz passa a
+        ser dele; senão não há como saber o dono e RuntimeError interrompe a partida.
+        """
+        if self.legacy_guild_id:
+            return self.legacy_guild_id
+        from database_sqlite import SQLITE_FILE
+        found = [path for path in (DB_FILE, SQLITE_FILE) if os.path.exists(path)]
+        if not found:
+            return None
+        if len(guild_ids) == 1 and not self._exists(str(guild_ids[0])):
+            self.legacy_guild_id = str(guild_ids[0])
+            logging.warning(
+                f'DB_LEGACY_GUILD_ID não definido: {", ".join(found)} atribuído ao único '
+                f'servidor do bot; defina DB_LEGACY_GUILD_ID={self.legacy_guild_id} para '
+                f'continuar assim quando o bot entrar em outros servidores'
+            )
+            return self.legacy_guild_id
+        raise RuntimeError(
+            f'{", ".join(found)} existe mas DB_LEGACY_GUILD_ID não está definido e o bot está em '
+            f'{len(guild_ids)} servidores. Defina DB_LEGACY_GUILD_ID com o ID do servidor dono '
+            f'ou mova o arquivo para fora da pasta do bot.'
+        )
+
+    async def evict_idle(self) -> int:
+        """Gravar e descarregar os bancos ociosos; devolve quantos saíram"""
+        now = time.monotonic()
+        evicted = 0
+        for guild_id, last_used in list(self._last_used.items()):
+            if (now - last_used < self.idle_seconds or guild_id not in self._open
+                    or guild_id in self._pins):
+                continue
+            await self._open[guild_id].flush()
+            # Alguém pode ter usado o banco enquanto gravava
+            if self._last_used.get(guild_id) != last_used:
+                continue
+            self._open.pop(guild_id).close()
+            del self._last_used[guild_id]
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def pending_writes(self) -> int:
+        return sum(database.pending_writes for database in self._open.values())
+
+    async def flush(self):
+        for database in list(self._open.values()):
+            await database.flush()
+
+    def close(self):
+        for database in self._open.values():
+            database.close()
+        self._open.clear()
+        self._last_used.clear()
+
+databases = GuildDatabases()
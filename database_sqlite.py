@@ -0,0 +1,479 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from indexes import NameIndex, StatsCounter
+from metrics import timed
+from records import RecordCodec
+from storage import empty_data, normalize_data
+from utils import TicketPolicy, normalize_name
+
+SQLITE_FILE = os.getenv('DB_SQLITE_FILE', 'database.sqlite3')
+JSON_FILE = 'database.json'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS participants (
+    user_id TEXT PRIMARY KEY,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    normalized_name TEXT NOT NULL,
+    message_id TEXT,
+    base_tickets INTEGER NOT NULL DEFAULT 1,
+    tag_tickets INTEGER NOT NULL DEFAULT 0,
+    registered_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_participants_normalized_name
+    ON participants (normalized_name);
+CREATE TABLE IF NOT EXISTS participant_roles (
+    user_id TEXT NOT NULL REFERENCES participants (user_id) ON DELETE CASCADE,
+    role_name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    abbreviation TEXT,
+    PRIMARY KEY (user_id, role_name)
+);
+CREATE TABLE IF NOT EXISTS blacklist (
+    user_id TEXT PRIMARY KEY,
+    username TEXT,
+    reason TEXT,
+    added_at TEXT
+);
+CREATE TABLE IF NOT EXISTS config (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+PARTICIPANT_COLUMNS = (
+    'user_id, first_name, last_name, full_name, message_id, '
+    'base_tickets, tag_tickets, registered_at'
+)
+
+
+class SqliteDatabase:
+    """Mesma API do Database, com os dados em SQLite (modo WAL)."""
+
+    def __init__(self, db_file: str = SQLITE_FILE, json_file: Optional[str] = JSON_FILE):
+        is_new = not os.path.exists(db_file)
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA foreign_keys=ON')
+        self.conn.executescript(SCHEMA)
+        self._in_batch = False
+        self._policy: Optional[TicketPolicy] = None
+        # Índice de trigramas para busca aproximada, montado sob demanda
+        self._names: Optional[NameIndex] = None
+        # Na primeira execução importa o database.json existente
+        if is_new and json_file and os.path.exists(json_file):
+            migrate_json(json_file, self.conn)
+        # A configuração é pequena e lida o tempo todo: fica em memória
+        self.config = empty_data()['config']
+        for row in self.conn.execute('SELECT key, value FROM config'):
+            self.config[row['key']] = json.loads(row['value'])
+        # Contadores de /estatisticas: uma agregação na abertura, depois O(1)
+        self.stats = StatsCounter()
+        self.stats.load(self._compute_statistics())
+
+    def _transaction(self):
+        # Dentro de batch() tudo vai para a mesma transação
+        return nullcontext() if self._in_batch else self._timed_transaction()
+
+    @contextmanager
+    def _timed_transaction(self):
+        with timed('sqlite'), self.conn:
+            yield
+
+    @contextmanager
+    def batch(self):
+        if self._in_batch:
+            yield
+            return
+        self._in_batch = True
+        try:
+            with self._timed_transaction():
+                yield
+        finally:
+            self._in_batch = False
+
+    def save(self):
+        # Cada mutação já é gravada na sua própria transação
+        pass
+
+    @property
+    def pending_writes(self) -> int:
+        return 0
+
+    async def flush(self):
+        pass
+
+    async def warm(self):
+        # Consultas sob demanda: não há arquivo para ler de uma vez
+        pass
+
+    def close(self):
+        self.conn.close()
+
+    def _participant_from_row(self, row, roles: Dict) -> Dict:
+        return {
+            'user_id': row['user_id'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'full_name': row['full_name'],
+            'message_id': row['message_id'],
+            'tickets': {
+                'base': row['base_tickets'],
+                'roles': roles,
+                'tag': row['tag_tickets']
+            },
+            'registered_at': row['registered_at']
+        }
+
+    def _set_config(self, **values):
+        self._policy = None
+        self.config.update(values)
+        with self._transaction():
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)',
+                [(key, json.dumps(value, ensure_ascii=False)) for key, value in values.items()]
+            )
+
+    def add_participant(self, user_id: str, first_name: str, last_name: str,
+                        full_name: str, message_id: str, tickets: dict, registered_at: str):
+        previous = self.get_participant(user_id)
+        with self._transaction():
+            _upsert_participant(self.conn, {
+                'user_id': user_id,
+                'first_name': first_name,
+                'last_name': last_name,
+                'full_name': full_name,
+                'message_id': message_id,
+                'tickets': tickets,
+                'registered_at': registered_at
+            })
+        if previous:
+            self.stats.remove(previous['tickets'])
+        self.stats.add(tickets)
+        if self._names is not None:
+            self._names.add(user_id, first_name, last_name)
+
+    def remove_participant(self, user_id: str):
+        previous = self.get_participant(user_id)
+        if previous is None:
+            return
+        with self._transaction():
+            self.conn.execute('DELETE FROM participants WHERE user_id = ?', (user_id,))
+        self.stats.remove(previous['tickets'])
+        if self._names is not None:
+            self._names.remove(user_id)
+
+    def set_message_ids(self, message_ids: Dict[str, str]):
+        with self._transaction():
+            self.conn.executemany(
+                'UPDATE participants SET message_id = ? WHERE user_id = ?',
+                [(message_id, user_id) for user_id, message_id in message_ids.items()]
+            )
+
+    def get_participant(self, user_id: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            f'SELECT {PARTICIPANT_COLUMNS} FROM participants WHERE user_id = ?', (str(user_id),)
+        ).fetchone()
+        if row is None:
+            return None
+        roles = {
+            r['role_name']: {'quantity': r['quantity'], 'abbreviation': r['abbreviation']}
+            for r in self.conn.execute(
+                'SELECT role_name, quantity, abbreviation FROM participant_roles WHERE user_id = ?',
+                (row['user_id'],)
+            )
+        }
+        return self._participant_from_row(row, roles)
+
+    def is_registered(self, user_id: str) -> bool:
+        try:
+            row = self.conn.execute(
+                'SELECT 1 FROM participants WHERE user_id = ?', (str(user_id),)
+            ).fetchone()
+            return row is not None
+        except Exception as e:
+            logging.error(f'Erro ao verificar registro: {e}')
+            return False
+
+    def is_name_taken(self, first_name: str, last_name: str) -> bool:
+        row = self.conn.execute(
+            'SELECT 1 FROM participants WHERE normalized_name = ? LIMIT 1',
+            (normalize_name(f"{first_name} {last_name}"),)
+        ).fetchone()
+        return row is not None
+
+    def find_similar_names(self, first_name: str, last_name: str, max_distance: int = 2) -> List:
+        if self._names is None:
+            self._names = NameIndex()
+            for row in self.conn.execute('SELECT user_id, first_name, last_name FROM participants'):
+                self._names.add(row['user_id'], row['first_name'], row['last_name'])
+        return self._names.similar(first_name, last_name, max_distance)
+
+    def get_all_participants(self) -> Dict:
+        roles_by_user: Dict[str, Dict] = {}
+        for r in self.conn.execute(
+            'SELECT user_id, role_name, quantity, abbreviation FROM participant_roles'
+        ):
+            roles_by_user.setdefault(r['user_id'], {})[r['role_name']] = {
+                'quantity': r['quantity'],
+                'abbreviation': r['abbreviation']
+            }
+        return {
+            row['user_id']: self._participant_from_row(row, roles_by_user.get(row['user_id'], {}))
+            for row in self.conn.execute(f'SELECT {PARTICIPANT_COLUMNS} FROM participants')
+        }
+
+    def iter_participants(self) -> Iterator[Dict]:
+        """Percorrer os participantes sem carregar todos na memória"""
+        # Conexão própria: pode rodar numa thread enquanto o bot grava (WAL)
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute('BEGIN')
+            roles = conn.execute(
+                'SELECT user_id, role_name, quantity, abbreviation FROM participant_roles '
+                'ORDER BY user_id'
+            )
+            pending = roles.fetchone()
+            for row in conn.execute(
+                f'SELECT {PARTICIPANT_COLUMNS} FROM participants ORDER BY user_id'
+            ):
+                user_roles = {}
+                # As duas consultas vêm ordenadas por user_id: junta em uma passada
+                while pending is not None and pending['user_id'] <= row['user_id']:
+                    if pending['user_id'] == row['user_id']:
+                        user_roles[pending['role_name']] = {
+                            'quantity': pending['quantity'],
+                            'abbreviation': pending['abbreviation']
+                        }
+                    pending = roles.fetchone()
+                yield self._participant_from_row(row, user_roles)
+        finally:
+            conn.close()
+
+    def update_tickets(self, user_id: str, tickets: Dict):
+        previous = self.get_participant(user_id)
+        if previous is None:
+            return
+        with self._transaction():
+            self.conn.execute(
+                'UPDATE participants SET base_tickets = ?, tag_tickets = ? WHERE user_id = ?',
+                (tickets.get('base', 1), tickets.get('tag') or 0, user_id)
+            )
+            _replace_roles(self.conn, user_id, tickets)
+        self.stats.remove(previous['tickets'])
+        self.stats.add(tickets)
+
+    def add_to_blacklist(self, user_id: str, username: str, reason: str):
+        with self._transaction():
+            self.conn.execute(
+                'INSERT OR REPLACE INTO blacklist (user_id, username, reason, added_at) '
+                'VALUES (?, ?, ?, ?)',
+                (user_id, username, reason, datetime.now().isoformat())
+            )
+
+    def add_many_to_blacklist(self, entries: Iterable[Dict]) -> int:
+        added_at = datetime.now().isoformat()
+        rows = [
+            (str(entry['user_id']), entry.get('username'), entry.get('reason'), added_at)
+            for entry in entries
+        ]
+        with self._transaction():
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO blacklist (user_id, username, reason, added_at) '
+                'VALUES (?, ?, ?, ?)',
+                rows
+            )
+        return len(rows)
+
+    def remove_from_blacklist(self, user_id: str):
+        with self._transaction():
+            self.conn.execute('DELETE FROM blacklist WHERE user_id = ?', (user_id,))
+
+    def is_blacklisted(self, user_id: str) -> bool:
+        row = self.conn.execute(
+            'SELECT 1 FROM blacklist WHERE user_id = ?', (str(user_id),)
+        ).fetchone()
+        return row is not None
+
+    def get_blacklist(self) -> List[Dict]:
+        return [
+            dict(row) for row in self.conn.execute(
+                'SELECT user_id, username, reason, added_at FROM blacklist ORDER BY added_at'
+            )
+        ]
+
+    def set_hashtag(self, hashtag: str):
+        self._set_config(hashtag=hashtag)
+
+    def lock_hashtag(self):
+        self._set_config(hashtag_locked=True)
+
+    def add_bonus_role(self, role_id: str, role_name: str, quantity: int, abbreviation: str):
+        bonus_roles = dict(self.config['bonus_roles'])
+        bonus_roles[role_id] = {
+            'name': role_name,
+            'quantity': quantity,
+            'abbreviation': abbreviation
+        }
+        self._set_config(bonus_roles=bonus_roles)
+
+    def remove_bonus_role(self, role_id: str):
+        if role_id in self.config['bonus_roles']:
+            bonus_roles = dict(self.config['bonus_roles'])
+            del bonus_roles[role_id]
+            self._set_config(bonus_roles=bonus_roles)
+
+    def set_tag_enabled(self, enabled: bool, tag: Optional[str] = None, quantity: Optional[int] = None):
+        values = {'tag_enabled': enabled, 'server_tag': tag}
+        if quantity is not None:
+            values['tag_quantity'] = quantity
+        self._set_config(**values)
+
+    def clear_participants(self):
+        with self._transaction():
+            self.conn.execute('DELETE FROM participant_roles')
+            self.conn.execute('DELETE FROM participants')
+        self._names = None
+        self.stats.clear()
+        self._set_config(hashtag_locked=False)
+
+    def set_chat_lock(self, enabled: bool, channel_id: Optional[str] = None):
+        values = {'chat_lock_enabled': enabled}
+        if channel_id is not None:
+            values['chat_lock_channel'] = channel_id
+        self._set_config(**values)
+
+    def clear_all(self):
+        with self._transaction():
+            self.conn.execute('DELETE FROM participant_roles')
+            self.conn.execute('DELETE FROM participants')
+            self.conn.execute('DELETE FROM blacklist')
+            self.conn.execute('DELETE FROM config')
+        self._names = None
+        self.stats.clear()
+        self.config = empty_data()['config']
+        self._policy = None
+
+    def get_statistics(self) -> Dict:
+        return self.stats.snapshot()
+
+    def check_statistics(self) -> Dict:
+        return self.stats.reconcile(self._compute_statistics())
+
+    def _compute_statistics(self) -> Dict:
+        total_participants, base_and_tag, tickets_by_tag = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(1 + tag_tickets), 0), '
+            'COALESCE(SUM(tag_tickets > 0), 0) FROM participants'
+        ).fetchone()
+        tickets_by_role = {}
+        role_tickets = 0
+        for row in self.conn.execute(
+            'SELECT role_name, COUNT(*) AS holders, SUM(quantity) AS tickets '
+            'FROM participant_roles GROUP BY role_name'
+        ):
+            tickets_by_role[row['role_name']] = row['holders']
+            role_tickets += row['tickets']
+        return {
+            'total_participants': total_participants,
+            'total_tickets': base_and_tag + role_tickets,
+            'tickets_by_role': tickets_by_role,
+            'tickets_by_tag': tickets_by_tag
+        }
+
+    def set_inscricao_channel(self, channel_id: str):
+        try:
+            self._set_config(inscricao_channel=str(channel_id))
+        except Exception:
+            pass
+
+    def get_inscricao_channel(self) -> Optional[str]:
+        return self.config.get('inscricao_channel')
+
+    def get_config(self) -> Dict:
+        return self.config
+
+    def ticket_policy(self) -> TicketPolicy:
+        if self._policy is None:
+            self._policy = TicketPolicy.from_config(self.config)
+        return self._policy
+
+
+def _replace_roles(conn: sqlite3.Connection, user_id: str, tickets: Dict):
+    conn.execute('DELETE FROM participant_roles WHERE user_id = ?', (user_id,))
+    conn.executemany(
+        'INSERT INTO participant_roles (user_id, role_name, quantity, abbreviation) '
+        'VALUES (?, ?, ?, ?)',
+        [
+            (user_id, role_name, role_data['quantity'], role_data.get('abbreviation'))
+            for role_name, role_data in tickets.get('roles', {}).items()
+        ]
+    )
+
+
+def _upsert_participant(conn: sqlite3.Connection, p: Dict):
+    tickets = p.get('tickets') or {}
+    user_id = str(p['user_id'])
+    full_name = p.get('full_name') or f"{p['first_name']} {p['last_name']}"
+    conn.execute(
+        'INSERT INTO participants (user_id, first_name, last_name, full_name, normalized_name, '
+        'message_id, base_tickets, tag_tickets, registered_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+        'ON CONFLICT (user_id) DO UPDATE SET first_name = excluded.first_name, '
+        'last_name = excluded.last_name, full_name = excluded.full_name, '
+        'normalized_name = excluded.normalized_name, message_id = excluded.message_id, '
+        'base_tickets = excluded.base_tickets, tag_tickets = excluded.tag_tickets, '
+        'registered_at = excluded.registered_at',
+        (
+            user_id, p['first_name'], p['last_name'], full_name, normalize_name(full_name),
+            p.get('message_id'), tickets.get('base', 1), tickets.get('tag') or 0,
+            p.get('registered_at')
+        )
+    )
+    _replace_roles(conn, user_id, tickets)
+
+
+def migrate_json(json_file: str, conn: sqlite3.Connection) -> int:
+    """Importar um database.json (inclusive o formato antigo em lista)"""
+    with open(json_file, 'r', encoding='utf-8') as f:
+        data = normalize_data(json.load(f))
+    # Linhas compactas e dicts antigos viram registros com a mesma interface
+    RecordCodec(data['roles'], data['config']['bonus_roles']).load(data['participants'])
+    with conn:
+        for p in data['participants'].values():
+            _upsert_participant(conn, p)
+        conn.executemany(
+            'INSERT OR REPLACE INTO blacklist (user_id, username, reason, added_at) '
+            'VALUES (?, ?, ?, ?)',
+            [
+                (str(u['user_id']), u.get('username'), u.get('reason'), u.get('added_at'))
+                for u in data['blacklist'].values()
+            ]
+        )
+        conn.executemany(
+            'INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)',
+            [(key, json.dumps(value, ensure_ascii=False)) for key, value in data['config'].items()]
+        )
+    logging.info(f'{len(data["participants"])} participantes migrados de {json_file}')
+    return len(data['participants'])
+
+
+if __name__ == '__main__':
+    # Uso: python database_sqlite.py [database.json] [database.sqlite3]
+    source = sys.argv[1] if len(sys.argv) > 1 else JSON_FILE
+    target = sys.argv[2] if len(sys.argv) > 2 else SQLITE_FILE
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    target_db = SqliteDatabase(target, json_file=None)
+    print(f'✅ {migrate_json(source, target_db.conn)} participantes migrados para {target}')
+    target_db.close()
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import secrets
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from utils import get_total_tickets
+
+DRAWS_DIR = os.getenv('DRAWS_DIR', 'sorteios')
+
+
+class WeightedDraw:
+    """Sorteio ponderado sem reposição sobre uma Fenwick tree de fichas.
+
+    Montar a árvore é O(n); cada sorteio é uma busca O(log n) na soma
+    acumulada seguida de zerar o peso do vencedor, também O(log n).
+    Nenhuma lista de fichas é materializada.
+    """
+
+    def __init__(self, weights: Sequence[int]):
+        self.size = len(weights)
+        self.weights = list(weights)
+        tree = [0] + self.weights
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.total = sum(self.weights)
+        self._top_bit = 1 << (self.size.bit_length() - 1) if self.size else 0
+
+    def _find(self, target: int) -> int:
+        # Menor índice cuja soma acumulada passa de target (0 <= target < total)
+        position = 0
+        step = self._top_bit
+        while step:
+            following = position + step
+            if following <= self.size and self.tree[following] <= target:
+                position = following
+                target -= self.tree[following]
+            step >>= 1
+        return position
+
+    def _remove(self, index: int):
+        weight = self.weights[index]
+        self.weights[index] = 0
+        self.total -= weight
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] -= weight
+            i += i & -i
+
+    def draw(self, k: int, rng: random.Random) -> List[int]:
+        winners = []
+        while len(winners) < k and self.total > 0:
+            index = self._find(rng.randrange(self.total))
+            winners.append(index)
+            self._remove(index)
+        return winners
+
+
+def weights_snapshot(participants: Dict) -> List[Tuple[str, int]]:
+    # Ordem fixa por user_id para que a mesma semente repita o resultado
+    return sorted(
+        ((user_id, get_total_tickets(p['tickets'])) for user_id, p in participants.items()),
+        key=lambda item: item[0]
+    )
+
+
+def run_draw(snapshot: List[Tuple[str, int]], k: int, seed: Optional[int] = None,
+             save_dir: Optional[str] = DRAWS_DIR) -> Dict:
+    """Sortear k vencedores distintos, registrando semente e pesos usados"""
+    if seed is None:
+        seed = secrets.randbits(64)
+    payload = json.dumps(snapshot, separators=(',', ':')).encode('utf-8')
+    digest = hashlib.sha256(payload).hexdigest()
+
+    engine = WeightedDraw([weight for _, weight in snapshot])
+    total_tickets = engine.total
+    winners = [snapshot[i][0] for i in engine.draw(k, random.Random(seed))]
+
+    result = {
+        'seed': seed,
+        'k': k,
+        'winners': winners,
+        'total_participants': len(snapshot),
+        'total_tickets': total_tickets,
+        'weights_sha256': digest,
+        'drawn_at': datetime.now().isoformat(),
+        'snapshot_file': None
+    }
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+        path = os.path.join(save_dir, f"sorteio_{datetime.now():%Y%m%d_%H%M%S}_{seed}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({**result, 'weights': snapshot}, f, separators=(',', ':'))
+        result['snapshot_file'] = path
+    logging.info(
+        f'Sorteio: semente={seed} pesos_sha256={digest} participantes={len(snapshot)} '
+        f'fichas={total_tickets} vencedores={winners}'
+    )
+    return result
+
+
+def draw_participants(participants: Iterable[Dict], k: int,
+                      seed: Optional[int] = None) -> Tuple[Dict, Dict]:
+    """Snapshot dos pesos e sorteio a partir dos participantes (já com as
+    fichas recalculadas, se for o caso). Roda numa thread de trabalho e não
+    toca em objetos do discord.py. Devolve (resultado, participantes usados).
+    """
+    by_user = {p['user_id']: p for p in participants}
+    return run_draw(weights_snapshot(by_user), k, seed), by_user
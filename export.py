@@ -0,0 +1,146 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+from typing import Dict, Iterable, List, Tuple
+
+from utils import get_total_tickets
+
+# Limite padrão de anexos do Discord (servidores com boost aceitam mais)
+DEFAULT_PART_LIMIT = 25 * 1024 * 1024
+# Margem para o buffer interno do gzip e o overhead do upload
+PART_MARGIN = 0.95
+# Máximo de anexos por mensagem do Discord
+MAX_FILES_PER_MESSAGE = 10
+
+
+def export_columns(role_names: List[str]) -> List[str]:
+    return (
+        ['user_id', 'first_name', 'last_name', 'full_name', 'registered_at', 'fichas_base']
+        + [f'fichas_{name}' for name in role_names]
+        + ['fichas_tag', 'fichas_outros', 'fichas_total']
+    )
+
+
+def flatten_participant(p: Dict, role_names: List[str]) -> List:
+    tickets = p.get('tickets') or {}
+    roles = tickets.get('roles', {})
+    known = [roles[name]['quantity'] if name in roles else 0 for name in role_names]
+    # Cargos que não estão mais na configuração
+    others = sum(data['quantity'] for name, data in roles.items() if name not in role_names)
+    return (
+        [p.get('user_id'), p.get('first_name'), p.get('last_name'), p.get('full_name'),
+         p.get('registered_at'), tickets.get('base', 1)]
+        + known
+        + [tickets.get('tag') or 0, others, get_total_tickets(tickets)]
+    )
+
+
+class _Part:
+    """Um arquivo de saída: temporário (memória/disco), opcionalmente gzip"""
+
+    def __init__(self, compress: bool):
+        self.raw = tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024, mode='w+b')
+        self.gzip = gzip.GzipFile(fileobj=self.raw, mode='wb') if compress else None
+        self.text = io.TextIOWrapper(self.gzip or self.raw, encoding='utf-8', newline='')
+        self.rows = 0
+        # Bytes ainda no buffer do TextIOWrapper (antes do gzip, então é uma cota superior)
+        self.buffered = 0
+
+    def size(self) -> int:
+        return self.raw.tell() + self.buffered
+
+    def write(self, text: str):
+        self.text.write(text)
+        self.buffered += len(text.encode('utf-8'))
+
+    def finish(self):
+        self.text.flush()
+        self.text.detach()
+        if self.gzip:
+            self.gzip.close()
+        self.raw.seek(0)
+        return self.raw
+
+
+def render_rows(participants: Iterable[Dict], role_names: List[str], fmt: str = 'csv') -> List[str]:
+    """Linhas já serializadas (com quebra de linha); roda nos processos de trabalho"""
+    columns = export_columns(role_names)
+    rows = []
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for p in participants:
+            writer.writerow(flatten_participant(p, role_names))
+            rows.append(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+    else:
+        for p in participants:
+            row = flatten_participant(p, role_names)
+            rows.append(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n')
+    return rows
+
+
+class PartWriter:
+    """Grava as linhas pedaço a pedaço em partes que caibam no limite de anexos"""
+
+    def __init__(self, role_names: List[str], fmt: str = 'csv', compress: bool = False,
+                 part_limit: int = DEFAULT_PART_LIMIT):
+        self.fmt = fmt
+        self.compress = compress
+        self.header = None
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(export_columns(role_names))
+            self.header = buffer.getvalue()
+        self.limit = int(part_limit * PART_MARGIN)
+        self.parts: List[_Part] = []
+        self.part = None
+
+    def write(self, rows: Iterable[str]):
+        for row in rows:
+            part = self.part
+            if part is None or (part.rows and part.size() >= self.limit):
+                part = self.part = _Part(self.compress)
+                self.parts.append(part)
+                if self.header:
+                    part.write(self.header)
+            part.write(row)
+            part.rows += 1
+            if part.rows % 100 == 0:
+                part.text.flush()
+                part.buffered = 0
+
+    def finish(self) -> List[Tuple[str, io.IOBase]]:
+        extension = 'csv' if self.fmt == 'csv' else 'jsonl'
+        if self.compress:
+            extension += '.gz'
+        files = []
+        for number, part in enumerate(self.parts, 1):
+            suffix = f'_parte{number}' if len(self.parts) > 1 else ''
+            files.append((f'participantes{suffix}.{extension}', part.finish()))
+        return files
+
+
+def group_parts(parts: List[Tuple[str, io.IOBase]], part_limit: int = DEFAULT_PART_LIMIT,
+                max_files: int = MAX_FILES_PER_MESSAGE) -> List[List[Tuple[str, io.IOBase]]]:
+    """Agrupa as partes em mensagens cuja soma dos tamanhos caiba no limite
+
+    O Discord limita o tamanho da requisição inteira, não de cada anexo.
+    """
+    limit = int(part_limit * PART_MARGIN)
+    groups, current, used = [], [], 0
+    for filename, fp in parts:
+        fp.seek(0, io.SEEK_END)
+        size = fp.tell()
+        fp.seek(0)
+        if current and (used + size > limit or len(current) >= max_files):
+            groups.append(current)
+            current, used = [], 0
+        current.append((filename, fp))
+        used += size
+    if current:
+        groups.append(current)
+    return groups
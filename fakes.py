@@ -0,0 +1,225 @@
+import asyncio
+import itertools
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from discord.utils import time_snowflake
+
+# Objetos mínimos no lugar dos do discord.py, para rodar os caminhos reais do
+# bot sem conexão (bench.py, loadsim.py). Cada chamada que iria para a API
+# passa por FakeDiscord.request, que por padrão só conta e retorna na hora.
+
+APPLICATION_ID = 1
+
+# transport(método, caminho com os IDs, rota sem os IDs)
+Transport = Callable[[str, str, str], Awaitable[None]]
+
+
+class FakeDiscord:
+    """Contador de chamadas à API e gerador de IDs; `transport` simula a rede"""
+
+    def __init__(self, transport: Optional[Transport] = None):
+        self.transport = transport
+        self.calls: Dict[str, int] = {}
+        self._seq = itertools.count()
+
+    def snowflake(self, when: Optional[datetime] = None) -> int:
+        return time_snowflake(when or datetime.now(timezone.utc)) + next(self._seq) % 4096
+
+    async def request(self, method: str, route: str, **params):
+        key = f'{method} {route}'
+        self.calls[key] = self.calls.get(key, 0) + 1
+        if self.transport is not None:
+            await self.transport(method, route.format(**params), route)
+
+
+class FakeRole:
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, FakeRole) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeMember:
+    def __init__(self, id: int, name: str, guild: 'FakeGuild', roles: List[FakeRole] = (),
+                 display_name: Optional[str] = None):
+        self.id = id
+        self.name = name
+        self.display_name = display_name or name
+        self.guild = guild
+        self.roles = list(roles)
+        self.bot = False
+
+    @property
+    def mention(self) -> str:
+        return f'<@{self.id}>'
+
+
+class FakeMessage:
+    def __init__(self, api: FakeDiscord, channel: 'FakeTextChannel', content: Optional[str],
+                 id: Optional[int] = None):
+        self.api = api
+        self.id = id or api.snowflake()
+        self.channel = channel
+        self.content = content
+
+    def _ids(self) -> Dict:
+        return {'channel_id': self.channel.id, 'message_id': self.id}
+
+    async def edit(self, **kwargs):
+        await self.api.request('PATCH', '/channels/{channel_id}/messages/{message_id}', **self._ids())
+        if 'content' in kwargs:
+            self.content = kwargs['content']
+        return self
+
+    async def delete(self):
+        await self.api.request('DELETE', '/channels/{channel_id}/messages/{message_id}', **self._ids())
+        self.channel.messages.pop(self.id, None)
+
+
+class FakeFollowupMessage(FakeMessage):
+    """Mensagem enviada pelo webhook da interação; edições vão pelo webhook"""
+
+    def __init__(self, interaction: 'FakeInteraction', content: Optional[str]):
+        super().__init__(interaction.api, None, content)
+        self.interaction = interaction
+
+    async def edit(self, **kwargs):
+        await self.api.request(
+            'PATCH', '/webhooks/{application_id}/{token}/messages/{message_id}',
+            application_id=APPLICATION_ID, token=self.interaction.token, message_id=self.id
+        )
+        if 'content' in kwargs:
+            self.content = kwargs['content']
+        return self
+
+
+class FakeTextChannel:
+    def __init__(self, api: FakeDiscord, id: int, guild: 'FakeGuild', name: str = 'inscricoes'):
+        self.api = api
+        self.id = id
+        self.guild = guild
+        self.name = name
+        self.messages: Dict[int, FakeMessage] = {}
+
+    @property
+    def mention(self) -> str:
+        return f'<#{self.id}>'
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        await self.api.request('POST', '/channels/{channel_id}/messages', channel_id=self.id)
+        message = FakeMessage(self.api, self, content)
+        self.messages[message.id] = message
+        return message
+
+    def get_partial_message(self, message_id: int) -> FakeMessage:
+        return self.messages.get(message_id) or FakeMessage(self.api, self, None, id=message_id)
+
+    async def delete_messages(self, messages):
+        await self.api.request('POST', '/channels/{channel_id}/messages/bulk-delete', channel_id=self.id)
+        for message in messages:
+            self.messages.pop(message.id, None)
+
+
+class FakeGuild:
+    filesize_limit = 25 * 1024 * 1024
+
+    def __init__(self, api: FakeDiscord, id: int):
+        self.api = api
+        self.id = id
+        self.members: Dict[int, FakeMember] = {}
+        self.channels: Dict[int, FakeTextChannel] = {}
+        self.roles: Dict[int, FakeRole] = {}
+
+    def get_member(self, user_id: int) -> Optional[FakeMember]:
+        return self.members.get(user_id)
+
+    def get_channel(self, channel_id: int) -> Optional[FakeTextChannel]:
+        return self.channels.get(channel_id)
+
+    def get_role(self, role_id: int) -> Optional[FakeRole]:
+        return self.roles.get(role_id)
+
+    def add_channel(self, name: str = 'inscricoes') -> FakeTextChannel:
+        channel = FakeTextChannel(self.api, self.api.snowflake(), self, name)
+        self.channels[channel.id] = channel
+        return channel
+
+    def add_role(self, name: str) -> FakeRole:
+        role = FakeRole(self.api.snowflake(), name)
+        self.roles[role.id] = role
+        return role
+
+    def add_member(self, name: str, roles: List[FakeRole] = (),
+                   display_name: Optional[str] = None) -> FakeMember:
+        member = FakeMember(self.api.snowflake(), name, self, roles, display_name)
+        self.members[member.id] = member
+        return member
+
+
+class FakeResponse:
+    def __init__(self, interaction: 'FakeInteraction'):
+        self.interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _respond(self):
+        if self._done:
+            raise RuntimeError('Interação já respondida')
+        self._done = True
+        await self.interaction.api.request(
+            'POST', '/interactions/{interaction_id}/{token}/callback',
+            interaction_id=self.interaction.id, token=self.interaction.token
+        )
+        self.interaction.responded_at = asyncio.get_running_loop().time()
+
+    async def defer(self, ephemeral: bool = False, thinking: bool = False):
+        await self._respond()
+
+    async def send_message(self, content: Optional[str] = None, **kwargs):
+        await self._respond()
+        self.interaction.replies.append(content)
+
+    async def edit_message(self, **kwargs):
+        await self._respond()
+
+    async def send_modal(self, modal):
+        await self._respond()
+
+
+class FakeFollowup:
+    def __init__(self, interaction: 'FakeInteraction'):
+        self.interaction = interaction
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        interaction = self.interaction
+        await interaction.api.request(
+            'POST', '/webhooks/{application_id}/{token}', application_id=APPLICATION_ID,
+            token=interaction.token
+        )
+        interaction.replies.append(content)
+        return FakeFollowupMessage(interaction, content)
+
+
+class FakeInteraction:
+    """Interação de um membro num servidor; registra as respostas e quando chegaram"""
+
+    def __init__(self, api: FakeDiscord, user: FakeMember):
+        self.api = api
+        self.id = api.snowflake()
+        self.token = f'token-{self.id}'
+        self.user = user
+        self.guild = user.guild
+        self.guild_id = user.guild.id
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.replies: List[Optional[str]] = []
+        self.created_at = asyncio.get_running_loop().time()
+        self.responded_at: Optional[float] = None
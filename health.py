@@ -0,0 +1,101 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence
+
+# Intervalo do amostrador de atraso do event loop
+LOOP_LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL_MS', '250')) / 1000
+# Janelas (segundos) dos percentis de atraso
+LOOP_LAG_WINDOWS = (60, 300)
+
+# Limites do /healthz: acima deles a resposta é 503 e o orquestrador reinicia
+HEALTH_MAX_LAG_MS = float(os.getenv('HEALTH_MAX_LAG_MS', '1000'))
+HEALTH_MAX_LATENCY_MS = float(os.getenv('HEALTH_MAX_LATENCY_MS', '10000'))
+HEALTH_MAX_SAVE_MS = float(os.getenv('HEALTH_MAX_SAVE_MS', '5000'))
+HEALTH_MAX_PENDING_WRITES = int(os.getenv('HEALTH_MAX_PENDING_WRITES', '10000'))
+# Tempo para conectar ao gateway antes de "não pronto" contar como falha
+HEALTH_STARTUP_GRACE_SECONDS = float(os.getenv('HEALTH_STARTUP_GRACE_SECONDS', '120'))
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class LoopLagMonitor:
+    """Mede quanto cada despertar do event loop atrasa em relação ao agendado."""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL,
+                 windows: Sequence[int] = LOOP_LAG_WINDOWS):
+        self.interval = interval
+        self.windows = tuple(windows)
+        # (instante, atraso em segundos), só o necessário para a maior janela
+        self.samples = deque(maxlen=int(max(self.windows) / interval) + 1)
+        self.max_lag = 0.0
+        self.last_tick = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.samples.append((now, lag))
+            self.max_lag = max(self.max_lag, lag)
+            self.last_tick = now
+
+    def stalled_for(self) -> float:
+        """Tempo desde o último despertar além do esperado (trava em curso)"""
+        return max(0.0, time.monotonic() - self.last_tick - self.interval)
+
+    def snapshot(self) -> Dict[str, float]:
+        now = time.monotonic()
+        result = {}
+        for window in self.windows:
+            lags = [lag for at, lag in self.samples if now - at <= window]
+            result[f'p50_{window}s_ms'] = round(percentile(lags, 0.5) * 1000, 1)
+            result[f'p99_{window}s_ms'] = round(percentile(lags, 0.99) * 1000, 1)
+        result['max_ms'] = round(self.max_lag * 1000, 1)
+        result['stalled_ms'] = round(self.stalled_for() * 1000, 1)
+        return result
+
+
+def health_problems(status: Dict, uptime: float) -> List[str]:
+    """Motivos para o /healthz falhar; vazio quando está tudo bem"""
+    problems = []
+    lag = status['loop_lag']
+    worst_lag = max(lag[f'p99_{LOOP_LAG_WINDOWS[0]}s_ms'], lag['stalled_ms'])
+    if worst_lag > HEALTH_MAX_LAG_MS:
+        problems.append(f'atraso do event loop {worst_lag:.0f} ms')
+    if not status['ready']:
+        if uptime > HEALTH_STARTUP_GRACE_SECONDS:
+            problems.append('gateway não conectado')
+    else:
+        latency = status['gateway_latency_ms']
+        if latency is None or latency > HEALTH_MAX_LATENCY_MS:
+            problems.append(f'latência do gateway {latency} ms')
+    last_save = status['last_save_ms']
+    if last_save is not None and last_save > HEALTH_MAX_SAVE_MS:
+        problems.append(f'última gravação levou {last_save:.0f} ms')
+    if status['pending_writes'] > HEALTH_MAX_PENDING_WRITES:
+        problems.append(f"{status['pending_writes']} gravações pendentes")
+    return problems
+
+
+def latency_ms(latency: float) -> Optional[float]:
+    # client.latency é inf/nan antes do primeiro heartbeat
+    return None if not math.isfinite(latency) else round(latency * 1000, 1)
@@ -0,0 +1,181 @@
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utils import normalize_name
+
+
+def trigrams(name: str) -> Set[str]:
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> Optional[int]:
+    """Distância de Levenshtein, ou None se passar de max_distance"""
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    # Só a faixa de max_distance em volta da diagonal pode ficar dentro do limite
+    too_far = max_distance + 1
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        best = current[0]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            value = previous[j - 1] + (ca != b[j - 1])
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            current[j] = value
+            if value < best:
+                best = value
+        if best > max_distance:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+class NameIndex:
+    """Índice de nomes normalizados para detectar inscrições duplicadas."""
+
+    def __init__(self):
+        self._users_by_name: Dict[str, Set[str]] = {}
+        self._name_by_user: Dict[str, str] = {}
+        self._names_by_trigram: Dict[str, Set[str]] = {}
+
+    def add(self, user_id: str, first_name: str, last_name: str):
+        self.remove(user_id)
+        name = normalize_name(f'{first_name} {last_name}')
+        self._name_by_user[user_id] = name
+        users = self._users_by_name.setdefault(name, set())
+        if not users:
+            for gram in trigrams(name):
+                self._names_by_trigram.setdefault(gram, set()).add(name)
+        users.add(user_id)
+
+    def remove(self, user_id: str):
+        name = self._name_by_user.pop(user_id, None)
+        if name is None:
+            return
+        users = self._users_by_name[name]
+        users.discard(user_id)
+        if users:
+            return
+        del self._users_by_name[name]
+        for gram in trigrams(name):
+            names = self._names_by_trigram[gram]
+            names.discard(name)
+            if not names:
+                del self._names_by_trigram[gram]
+
+    def clear(self):
+        self._users_by_name.clear()
+        self._name_by_user.clear()
+        self._names_by_trigram.clear()
+
+    def lookup(self, first_name: str, last_name: str) -> Set[str]:
+        return set(self._users_by_name.get(normalize_name(f'{first_name} {last_name}'), ()))
+
+    def similar(self, first_name: str, last_name: str, max_distance: int = 2,
+                limit: int = 5) -> List[Tuple[str, str, int]]:
+        """Nomes parecidos (user_id, nome normalizado, distância), sem o idêntico"""
+        name = normalize_name(f'{first_name} {last_name}')
+        grams = trigrams(name)
+        # Cada edição destrói no máximo 3 trigramas, então um nome a até
+        # max_distance edições compartilha ao menos len(grams) - 3 * max_distance
+        # deles: a contagem (feita em C pelo Counter) descarta o resto antes
+        # da distância de edição, mesmo com nomes de sílabas muito comuns
+        shared = len(grams) - 3 * max_distance
+        if shared > 0:
+            counts = Counter()
+            for gram in grams:
+                counts.update(self._names_by_trigram.get(gram, ()))
+            candidates = [candidate for candidate, count in counts.items() if count >= shared]
+        else:
+            # Nome curto demais para o limite garantir algo: compara com todos
+            candidates = self._users_by_name
+        matches = []
+        for candidate in candidates:
+            if candidate == name or abs(len(candidate) - len(name)) > max_distance:
+                continue
+            distance = edit_distance(name, candidate, max_distance)
+            if distance is not None:
+                matches.append((distance, candidate))
+        matches.sort()
+        return [
+            (user_id, candidate, distance)
+            for distance, candidate in matches[:limit]
+            for user_id in sorted(self._users_by_name[candidate])
+        ][:limit]
+
+
+def compute_statistics(participants: Iterable[Dict]) -> Dict:
+    """Recalcular as estatísticas do zero, percorrendo todos os participantes"""
+    stats = StatsCounter()
+    for p in participants:
+        stats.add(p['tickets'])
+    return stats.snapshot()
+
+
+class StatsCounter:
+    """Contadores de /estatisticas mantidos a cada inscrição, remoção ou atualização."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.total_participants = 0
+        self.total_tickets = 0
+        self.tickets_by_role: Dict[str, int] = {}
+        self.tickets_by_tag = 0
+
+    def _apply(self, tickets: Dict, sign: int):
+        self.total_participants += sign
+        self.total_tickets += sign  # ficha base
+        for role_name, role_data in tickets.get('roles', {}).items():
+            self.total_tickets += sign * role_data['quantity']
+            count = self.tickets_by_role.get(role_name, 0) + sign
+            if count:
+                self.tickets_by_role[role_name] = count
+            else:
+                self.tickets_by_role.pop(role_name, None)
+        if tickets.get('tag'):
+            self.total_tickets += sign * tickets['tag']
+            self.tickets_by_tag += sign
+
+    def add(self, tickets: Dict):
+        self._apply(tickets, 1)
+
+    def remove(self, tickets: Dict):
+        self._apply(tickets, -1)
+
+    def snapshot(self) -> Dict:
+        return {
+            'total_participants': self.total_participants,
+            'total_tickets': self.total_tickets,
+            'tickets_by_role': dict(self.tickets_by_role),
+            'tickets_by_tag': self.tickets_by_tag
+        }
+
+    def load(self, stats: Dict):
+        self.total_participants = stats['total_participants']
+        self.total_tickets = stats['total_tickets']
+        self.tickets_by_role = dict(stats['tickets_by_role'])
+        self.tickets_by_tag = stats['tickets_by_tag']
+
+    def reconcile(self, expected: Dict) -> Dict:
+        """Comparar com um recálculo completo; corrige e devolve as diferenças"""
+        current = self.snapshot()
+        drift = {
+            key: {'counter': current[key], 'recomputed': expected[key]}
+            for key in expected if current[key] != expected[key]
+        }
+        if drift:
+            logging.warning(f'Estatísticas divergentes, recalculadas: {drift}')
+            self.load(expected)
+        return drift
+
+    def check(self, participants: Iterable[Dict]) -> Dict:
+        return self.reconcile(compute_statistics(participants))
@@ -0,0 +1,415 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from bench import HASHTAG, SERVER_TAG, percentile, random_name
+
+# Simulador de pico de inscrições: milhares de cliques no botão, envios do
+# modal e comandos de admin ao mesmo tempo, com a API REST do Discord trocada
+# por um servidor HTTP local que simula latência e respostas 429.
+#
+#   python loadsim.py --users 5000 --rate 500
+#   SIGNUP_BATCH_SECONDS=2 python loadsim.py --users 5000 --rate 0   # todos de uma vez
+
+# Prazo do Discord para a primeira resposta a uma interação
+INTERACTION_DEADLINE = 3.0
+
+# Limites aproximados do Discord por rota (requisições, janela em segundos),
+# contados por canal ou por token de interação; callbacks de interação não têm
+# limite nem contam no global
+ROUTE_LIMITS = {
+    ('POST', '/channels/{channel_id}/messages'): (5, 5.0),
+    ('PATCH', '/channels/{channel_id}/messages/{message_id}'): (5, 5.0),
+    ('DELETE', '/channels/{channel_id}/messages/{message_id}'): (5, 1.0),
+    ('POST', '/channels/{channel_id}/messages/bulk-delete'): (1, 1.0),
+    ('POST', '/webhooks/{application_id}/{token}'): (5, 2.0),
+    ('PATCH', '/webhooks/{application_id}/{token}/messages/{message_id}'): (5, 2.0),
+}
+GLOBAL_LIMIT = (50, 1.0)
+API_PREFIX = '/api/v10'
+
+
+class FixedWindow:
+    """Janela fixa como a do Discord: `limit` requisições até o reset"""
+
+    def __init__(self, limit: int, per: float):
+        self.limit = limit
+        self.per = per
+        self.started = 0.0
+        self.count = 0
+
+    def retry_after(self, now: float) -> float:
+        if now - self.started >= self.per:
+            self.started = now
+            self.count = 0
+        if self.count >= self.limit:
+            return self.started + self.per - now
+        return 0.0
+
+    def take(self):
+        self.count += 1
+
+
+class DiscordStandIn:
+    """Servidor local no lugar da API REST do Discord"""
+
+    def __init__(self, latency_ms: float = 80.0, jitter: float = 0.5, seed: int = 1):
+        # Latência log-normal com mediana latency_ms
+        self.mu = math.log(max(latency_ms, 0.001) / 1000)
+        self.sigma = jitter
+        self.rng = random.Random(seed)
+        self._global = FixedWindow(*GLOBAL_LIMIT)
+        self._buckets: Dict[Tuple, FixedWindow] = {}
+        self._ids = itertools.count(1)
+        self.requests = 0
+        self.rate_limited: Dict[str, int] = {}
+        self.runner: Optional[web.AppRunner] = None
+        self.url = ''
+
+    def _bucket(self, method: str, route: str, path: str) -> Optional[FixedWindow]:
+        limit = ROUTE_LIMITS.get((method, route))
+        if limit is None:
+            return None
+        # Parâmetro principal: canal, ou token do webhook da interação
+        major = path.split('/')[3 if route.startswith('/webhooks') else 2]
+        key = (method, route, major)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = FixedWindow(*limit)
+        return bucket
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        method = request.method
+        route = request.headers.get('X-Route', request.path)
+        now = asyncio.get_running_loop().time()
+        exempt = route.startswith('/interactions')
+        bucket = self._bucket(method, route, request.path[len(API_PREFIX):])
+        checks = [(bucket, False)] + ([] if exempt else [(self._global, True)])
+        for window, is_global in checks:
+            if window is None:
+                continue
+            retry_after = window.retry_after(now)
+            if retry_after:
+                key = 'global' if is_global else f'{method} {route}'
+                self.rate_limited[key] = self.rate_limited.get(key, 0) + 1
+                return web.json_response(
+                    {'message': 'You are being rate limited.', 'retry_after': retry_after,
+                     'global': is_global},
+                    status=429
+                )
+        for window, _ in checks:
+            if window is not None:
+                window.take()
+        await asyncio.sleep(self.rng.lognormvariate(self.mu, self.sigma))
+        if method == 'DELETE' or route.endswith('/callback'):
+            return web.Response(status=204)
+        return web.json_response({'id': str(next(self._ids))})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://127.0.0.1:{port}{API_PREFIX}'
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+class HttpTransport:
+    """Envia as chamadas dos objetos falsos ao stand-in; 429 espera e repete (como o discord.py)"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.retries = 0
+        self.retry_seconds = 0.0
+
+    async def __call__(self, method: str, path: str, route: str):
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        while True:
+            async with self.session.request(method, self.base_url + path, headers={'X-Route': route}) as resp:
+                if resp.status != 429:
+                    resp.raise_for_status()
+                    await resp.read()
+                    return
+                retry_after = (await resp.json())['retry_after']
+            self.retries += 1
+            self.retry_seconds += retry_after
+            await asyncio.sleep(retry_after)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+def _write_counts() -> Dict[str, Dict[str, float]]:
+    from metrics import DB_WRITE_BYTES, DB_WRITE_SECONDS
+    return {
+        'writes': {labels[0]: series[-1] for labels, series in DB_WRITE_SECONDS.values.items()},
+        'bytes': {labels[0]: value for labels, value in DB_WRITE_BYTES.values.items()}
+    }
+
+
+def _logical_size(db, directory: str) -> Optional[int]:
+    """Tamanho do banco gravado do zero agora (sem journal); None no SQLite"""
+    from storage import snapshot_data, write_database_file
+    if not hasattr(db, 'data'):
+        return None
+    path = os.path.join(directory, 'logical.json')
+    db._ensure_loaded()
+    write_database_file(path, snapshot_data(db.data))
+    size = os.path.getsize(path)
+    os.remove(path)
+    return size
+
+
+def _ack(interaction) -> Optional[float]:
+    if interaction.responded_at is None:
+        return None
+    return interaction.responded_at - interaction.created_at
+
+
+def missed_deadline(interaction) -> bool:
+    ack = _ack(interaction)
+    return ack is None or ack > INTERACTION_DEADLINE
+
+
+def summarize(records: List[List]) -> Dict:
+    """records: [interação, duração total ou None se não terminou]"""
+    acks = [ack for ack in (_ack(interaction) for interaction, _ in records) if ack is not None]
+    finished = [elapsed for _, elapsed in records if elapsed is not None]
+    return {
+        'count': len(records),
+        'ack_p50_ms': round(percentile(acks, 0.5) * 1000, 1),
+        'ack_p99_ms': round(percentile(acks, 0.99) * 1000, 1),
+        'e2e_p50_ms': round(percentile(finished, 0.5) * 1000, 1),
+        'e2e_p99_ms': round(percentile(finished, 0.99) * 1000, 1),
+        'missed_deadline': sum(1 for interaction, _ in records if missed_deadline(interaction)),
+        'unfinished': len(records) - len(finished)
+    }
+
+
+async def simulate(args, directory: str) -> Dict:
+    # Importados aqui: DB_DIR, DB_STORAGE e SIGNUP_* já estão no ambiente
+    import bot
+    from fakes import FakeDiscord, FakeGuild, FakeInteraction
+    from health import LoopLagMonitor
+
+    standin = DiscordStandIn(args.latency_ms, args.jitter, args.seed)
+    await standin.start()
+    transport = HttpTransport(standin.url)
+    api = FakeDiscord(transport)
+    rng = random.Random(args.seed)
+
+    guild = FakeGuild(api, api.snowflake())
+    channel = guild.add_channel()
+    roles = [guild.add_role(name) for name in ('Booster', 'VIP', 'Veterano')]
+    admin = guild.add_member('admin')
+    names = {}
+    for _ in range(args.prefill + args.users):
+        first, last = random_name(rng)
+        member = guild.add_member(
+            f'{first}{last}'.lower(), [role for role in roles if rng.random() < 0.3],
+            f'{first} [{SERVER_TAG}]' if rng.random() < 0.1 else first
+        )
+        names[member.id] = (first, last)
+    members = list(names)
+
+    db = bot.databases.get(guild.id)
+    db.set_hashtag(HASHTAG)
+    db.set_inscricao_channel(str(channel.id))
+    for quantity, role in enumerate(roles, 1):
+        db.add_bonus_role(str(role.id), role.name, quantity, role.name[:3].upper())
+    db.set_tag_enabled(True, SERVER_TAG, 1)
+    policy = db.ticket_policy()
+    with db.batch():
+        for user_id in members[:args.prefill]:
+            first, last = names[user_id]
+            db.add_participant(
+                str(user_id), first, last, f'{first} {last}', None,
+                policy.calculate(guild.get_member(user_id)), '2025-01-01T00:00:00'
+            )
+    await db.flush()
+    logical_before = _logical_size(db, directory)
+    writes_before = _write_counts()
+
+    records: Dict[str, List[List]] = {}
+
+    async def interact(kind: str, user, handler):
+        interaction = FakeInteraction(api, user)
+        record = [interaction, None]
+        records.setdefault(kind, []).append(record)
+        try:
+            await handler(interaction)
+        except Exception as e:
+            print(f'{kind}: {e!r}', file=sys.stderr)
+        record[1] = asyncio.get_running_loop().time() - interaction.created_at
+
+    async def user_flow(user_id: int):
+        user = guild.get_member(user_id)
+        await interact('botao', user, bot.InscreverButton().callback)
+        # Tempo para preencher o modal
+        await asyncio.sleep(args.think * rng.uniform(0.5, 1.5))
+
+        async def submit(interaction):
+            modal = bot.InscricaoModal()
+            modal.nome._value, modal.sobrenome._value = names[user_id]
+            modal.hashtag._value = HASHTAG
+            await modal.on_submit(interaction)
+        await interact('inscricao', user, submit)
+        if rng.random() < args.verify_ratio:
+            await asyncio.sleep(rng.uniform(0, args.think))
+            await interact('verificar', user, bot.verificar.callback)
+
+    admin_commands = itertools.cycle((
+        ('estatisticas', bot.estatisticas.callback),
+        ('lista', lambda interaction: bot.lista.callback(interaction, 'simples', 'auto')),
+        ('exportar', lambda interaction: bot.exportar.callback(interaction, 'csv', False)),
+    ))
+
+    tasks = []
+
+    async def admin_flow(arrivals_done: asyncio.Event):
+        while not arrivals_done.is_set():
+            kind, handler = next(admin_commands)
+            tasks.append(asyncio.create_task(interact(kind, admin, handler)))
+            try:
+                await asyncio.wait_for(arrivals_done.wait(), args.admin_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    lag = LoopLagMonitor(windows=(int(args.max_duration) + 60,))
+    lag.start()
+    started = time.perf_counter()
+    arrivals_done = asyncio.Event()
+    admin_task = asyncio.create_task(admin_flow(arrivals_done))
+    for user_id in members[args.prefill:]:
+        tasks.append(asyncio.create_task(user_flow(user_id)))
+        if args.rate > 0:
+            await asyncio.sleep(rng.expovariate(args.rate))
+    arrivals_done.set()
+    await admin_task
+    # Espera o que ainda está na fila, até max_duration
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=args.max_duration)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    await bot.announcer.flush()
+    await db.flush()
+    elapsed = time.perf_counter() - started
+    lag.stop()
+
+    writes_after = _write_counts()
+    logical_after = _logical_size(db, directory)
+    signups = db.get_statistics()['total_participants'] - args.prefill
+    writes = {
+        kind: count - writes_before['writes'].get(kind, 0)
+        for kind, count in writes_after['writes'].items()
+    }
+    written = sum(writes_after['bytes'].values()) - sum(writes_before['bytes'].values())
+    added = None if logical_after is None else logical_after - logical_before
+    report = {
+        'duration_s': round(elapsed, 2),
+        'signups': signups,
+        'interactions': {kind: summarize(items) for kind, items in records.items()},
+        'missed_deadline': sum(
+            1 for items in records.values() for interaction, _ in items if missed_deadline(interaction)
+        ),
+        'api': {
+            'requests': standin.requests,
+            'rate_limited': standin.rate_limited,
+            'retries': transport.retries,
+            'retry_seconds': round(transport.retry_seconds, 2)
+        },
+        'database': {
+            'writes': writes,
+            'writes_per_signup': round(sum(writes.values()) / signups, 3) if signups else None,
+            'bytes_written': written,
+            'bytes_added': added,
+            # Bytes gravados por byte novo no banco (1 = só o necessário)
+            'write_amplification': round(written / added, 1) if added else None
+        },
+        'sender': bot.sender.metrics(),
+        'admission': bot.admission.metrics(),
+        'loop_lag': lag.snapshot()
+    }
+    bot.workers.shutdown()
+    await transport.close()
+    await standin.stop()
+    bot.databases.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulador de pico de inscrições')
+    parser.add_argument('--users', type=int, default=5000, help='usuários que se inscrevem')
+    parser.add_argument('--rate', type=float, default=500,
+                        help='chegadas por segundo (Poisson); 0 = todos de uma vez')
+    parser.add_argument('--prefill', type=int, default=0, help='inscritos já no banco antes do pico')
+    parser.add_argument('--think', type=float, default=2.0, help='segundos para preencher o modal')
+    parser.add_argument('--verify-ratio', type=float, default=0.1, help='fração que usa /verificar depois')
+    parser.add_argument('--admin-interval', type=float, default=5.0,
+                        help='segundos entre comandos de admin (/estatisticas, /lista, /exportar)')
+    parser.add_argument('--latency-ms', type=float, default=80.0, help='mediana da latência da API')
+    parser.add_argument('--jitter', type=float, default=0.5, help='sigma da latência log-normal')
+    parser.add_argument('--max-duration', type=float, default=120.0,
+                        help='espera máxima depois da última chegada')
+    parser.add_argument('--storage', choices=('json', 'journal', 'sqlite'))
+    parser.add_argument('--write-behind', action='store_true')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='gravar o JSON também neste arquivo')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='tropadovth-loadsim-') as directory:
+        # Banco descartável; o resto da configuração (SIGNUP_*, DB_*) vem do ambiente
+        os.environ['DB_DIR'] = directory
+        os.environ['DB_LEGACY_GUILD_ID'] = ''
+        os.environ['COMMAND_SYNC_CACHE'] = os.path.join(directory, 'sync.json')
+        if args.storage:
+            os.environ['DB_STORAGE'] = args.storage
+        if args.write_behind:
+            os.environ['DB_WRITE_BEHIND'] = '1'
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            report = asyncio.run(simulate(args, directory))
+        finally:
+            os.chdir(cwd)
+    report = {
+        'config': {
+            **vars(args),
+            'storage': os.environ.get('DB_STORAGE', 'json'),
+            'write_behind': os.environ.get('DB_WRITE_BEHIND', '0') == '1',
+            'signup_batch_seconds': float(os.environ.get('SIGNUP_BATCH_SECONDS', '0')),
+            'signup_max_concurrent': int(os.environ.get('SIGNUP_MAX_CONCURRENT', '25'))
+        },
+        **report
+    }
+    encoded = json.dumps(report, indent=2, ensure_ascii=False, default=str)
+    print(encoded)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(encoded + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import bisect
+import contextvars
+import functools
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Limites (segundos) dos histogramas de latência; o Discord dá 3 s para responder
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 3.0, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+# Comando em execução na tarefa atual (para atribuir erros logados a ele)
+current_command: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    'current_command', default=None
+)
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labels: Labels = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def samples(self) -> Iterable[str]:
+        return ()
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Labels = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield f'{self.name}{_format_labels(self.labels, labels)} {value}'
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, *labels: str, value: float):
+        self.values[labels] = value
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Labels = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # labels -> [contagem por faixa..., soma, total]
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, *labels: str, value: float):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 3)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self):
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket = _format_labels(self.labels, labels, 'le="%s"' % bound)
+                yield f'{self.name}_bucket{bucket} {cumulative}'
+            bucket = _format_labels(self.labels, labels, 'le="+Inf"')
+            yield f'{self.name}_bucket{bucket} {series[-1]}'
+            yield f'{self.name}_sum{_format_labels(self.labels, labels)} {series[-2]}'
+            yield f'{self.name}_count{_format_labels(self.labels, labels)} {series[-1]}'
+
+
+class DictGauges(Metric):
+    """Um gauge por chave do dict devolvido por fn (ex: SendScheduler.metrics)"""
+    kind = 'gauge'
+
+    def __init__(self, prefix: str, help: str, fn: Callable[[], Dict[str, float]]):
+        super().__init__(prefix, help)
+        self.fn = fn
+
+    def render(self) -> str:
+        try:
+            values = self.fn()
+        except Exception as e:
+            logging.warning(f'Erro ao coletar métricas de {self.name}: {e}')
+            return ''
+        lines = []
+        for key, value in values.items():
+            name = f'{self.name}_{key}'
+            lines += [f'# HELP {name} {self.help} ({key})', f'# TYPE {name} {self.kind}', f'{name} {value}']
+        return '\n'.join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Texto no formato de exposição do Prometheus (0.0.4)"""
+        return '\n'.join(filter(None, (metric.render() for metric in self.metrics))) + '\n'
+
+
+registry = Registry()
+
+COMMAND_SECONDS = registry.register(Histogram(
+    'tropadovth_command_seconds', 'Duração dos comandos e do modal de inscrição', ('command',)
+))
+COMMAND_ERRORS = registry.register(Counter(
+    'tropadovth_command_errors_total', 'Erros por comando (exceções e erros registrados no log)',
+    ('command',)
+))
+COMMANDS_IN_FLIGHT = registry.register(Gauge(
+    'tropadovth_commands_in_flight', 'Comandos em execução agora', ('command',)
+))
+DB_WRITE_SECONDS = registry.register(Histogram(
+    'tropadovth_db_write_seconds', 'Duração das gravações do banco', ('kind',)
+))
+DB_WRITE_BYTES = registry.register(Counter(
+    'tropadovth_db_write_bytes_total', 'Bytes gravados no banco', ('kind',)
+))
+DB_LAST_WRITE_SECONDS = registry.register(Gauge(
+    'tropadovth_db_last_write_seconds', 'Duração da última gravação do banco', ('kind',)
+))
+
+
+def instrumented(name: str):
+    """Latência, erros e em execução de um handler async (comando ou on_submit)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            token = current_command.set(name)
+            COMMANDS_IN_FLIGHT.inc(name)
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                COMMAND_ERRORS.inc(name)
+                raise
+            finally:
+                COMMAND_SECONDS.observe(name, value=time.perf_counter() - started)
+                COMMANDS_IN_FLIGHT.dec(name)
+                current_command.reset(token)
+        return wrapper
+    return decorator
+
+
+class timed:
+    """Context manager que mede uma gravação do banco"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        DB_WRITE_SECONDS.observe(self.kind, value=elapsed)
+        DB_LAST_WRITE_SECONDS.set(self.kind, value=elapsed)
+        return False
+
+
+class ErrorCountingHandler(logging.Handler):
+    """Conta os logging.error dos comandos, que tratam as próprias exceções"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record: logging.LogRecord):
+        command = current_command.get()
+        if command is not None:
+            COMMAND_ERRORS.inc(command)
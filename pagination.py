@@ -0,0 +1,129 @@
+import os
+import tempfile
+from typing import Dict, Iterable, Iterator, List
+
+import discord
+
+PAGE_LIMIT = 2000
+# Acima desse número de linhas a lista vai como anexo .txt
+ATTACHMENT_LINES = int(os.getenv('LISTA_ATTACHMENT_LINES', '1500'))
+
+
+def sort_by_name(participants: Iterable[Dict]) -> List[Dict]:
+    return sorted(participants, key=lambda p: p['full_name'])
+
+
+def list_lines(participants: Iterable[Dict], tipo: str) -> Iterator[str]:
+    """Gerar as linhas de /lista, uma por ficha no modo detalhado"""
+    for p in sort_by_name(participants):
+        if tipo != 'detalhada':
+            # Lista simples só com nomes completos
+            yield p['full_name']
+            continue
+        # Nome base com primeira ficha (participação)
+        base_name = f"{p['first_name']} {p['last_name'][:2]}."
+        yield base_name
+        # Fichas por cargos (usando abreviações)
+        for role_data in p['tickets'].get('roles', {}).values():
+            line = f"{base_name} {role_data['abbreviation']}"
+            for _ in range(role_data['quantity']):
+                yield line
+        # Fichas por tag (usando 'TAG')
+        line = f"{base_name} TAG"
+        for _ in range(p['tickets'].get('tag') or 0):
+            yield line
+        yield ''  # Linha extra entre participantes
+
+
+def render_list(participants: Iterable[Dict], tipo: str) -> str:
+    """Bloco de texto de um pedaço já ordenado; roda nos processos de trabalho"""
+    return '\n'.join(list_lines(participants, tipo))
+
+
+def paginate(lines: Iterable[str], limit: int = PAGE_LIMIT) -> Iterator[str]:
+    """Agrupar linhas em páginas de até `limit` caracteres sem cortar linhas"""
+    page: List[str] = []
+    size = 0
+    for line in lines:
+        if not page and not line:
+            continue  # página não começa com linha em branco
+        while len(line) > limit:
+            # Linha sozinha maior que a página: único caso em que é cortada
+            if page:
+                yield '\n'.join(page)
+                page, size = [], 0
+            yield line[:limit]
+            line = line[limit:]
+        extra = len(line) + (1 if page else 0)
+        if size + extra > limit:
+            yield '\n'.join(page)
+            page, size = [line], len(line)
+        else:
+            page.append(line)
+            size += extra
+    if page:
+        yield '\n'.join(page)
+
+
+class ListFile:
+    """Arquivo .txt da lista gravado bloco a bloco (render_list)"""
+
+    def __init__(self, filename: str = 'participantes.txt'):
+        self.filename = filename
+        # Arquivo temporário em memória até 1 MB, depois vai para o disco
+        self.fp = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode='w+b')
+
+    def write(self, block: str):
+        if block:
+            self.fp.write((block + '\n').encode('utf-8'))
+
+    def file(self) -> discord.File:
+        self.fp.seek(0)
+        return discord.File(fp=self.fp, filename=self.filename)
+
+
+class PaginatedView(discord.ui.View):
+    """Embed com botões anterior/próxima; as páginas são geradas sob demanda"""
+
+    def __init__(self, pages: Iterator[str], title: str, timeout: float = 300):
+        super().__init__(timeout=timeout)
+        self.title = title
+        self.index = 0
+        self._pages = pages
+        self._rendered: List[str] = []
+        self._exhausted = False
+        self._render_until(1)
+        self._update_buttons()
+
+    def _render_until(self, index: int):
+        while not self._exhausted and len(self._rendered) <= index:
+            try:
+                self._rendered.append(next(self._pages))
+            except StopIteration:
+                self._exhausted = True
+
+    def _update_buttons(self):
+        # Sempre há uma página de antecedência para saber se existe próxima
+        self._render_until(self.index + 1)
+        self.previous_page.disabled = self.index == 0
+        self.next_page.disabled = self.index + 1 >= len(self._rendered)
+
+    def embed(self) -> discord.Embed:
+        description = self._rendered[self.index] if self._rendered else 'Lista vazia'
+        embed = discord.Embed(title=self.title, description=description)
+        total = f' de {len(self._rendered)}' if self._exhausted else ''
+        embed.set_footer(text=f'Página {self.index + 1}{total}')
+        return embed
+
+    @discord.ui.button(label='◀ Anterior', style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.index = max(self.index - 1, 0)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label='Próxima ▶', style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.index + 1 < len(self._rendered):
+            self.index += 1
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
@@ -0,0 +1,66 @@
+import time
+
+import discord
+
+from scheduler import INTERACTIVE
+from workers import Job
+
+# Intervalo mínimo entre edições da mensagem de progresso
+PROGRESS_INTERVAL = 2.0
+
+
+def progress_bar(fraction: float, width: int = 20) -> str:
+    filled = int(fraction * width)
+    return '█' * filled + '░' * (width - filled)
+
+
+class CancelView(discord.ui.View):
+    def __init__(self, job: Job):
+        super().__init__(timeout=None)
+        self.job = job
+
+    @discord.ui.button(label='Cancelar', style=discord.ButtonStyle.danger)
+    async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.job.cancel()
+        button.disabled = True
+        await interaction.response.edit_message(content='⏹️ Cancelando...', view=self)
+
+
+class ProgressMessage:
+    """Followup efêmero editado conforme o trabalho avança, com botão de cancelar"""
+
+    def __init__(self, sender, interaction: discord.Interaction, title: str,
+                 interval: float = PROGRESS_INTERVAL):
+        self.sender = sender
+        self.interaction = interaction
+        self.title = title
+        self.interval = interval
+        self.message = None
+        self._last_edit = 0.0
+
+    def _text(self, job: Job) -> str:
+        return f'{self.title}\n`{progress_bar(job.fraction)}` {job.fraction:.0%}'
+
+    async def _edit(self, **kwargs):
+        if self.message is None:
+            return
+        await self.sender.call(
+            ('interaction', self.interaction.id), lambda: self.message.edit(**kwargs), INTERACTIVE
+        )
+
+    async def start(self, job: Job):
+        job.on_progress = self.update
+        self.message = await self.sender.reply(
+            self.interaction, self._text(job), ephemeral=True, view=CancelView(job), wait=True
+        )
+        self._last_edit = time.monotonic()
+
+    async def update(self, job: Job):
+        now = time.monotonic()
+        if job.cancelled or now - self._last_edit < self.interval:
+            return
+        self._last_edit = now
+        await self._edit(content=self._text(job))
+
+    async def finish(self, text: str):
+        await self._edit(content=text, view=None)
@@ -0,0 +1,165 @@
+import sys
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Tuple
+
+# Linha de um participante no arquivo:
+#   [first_name, last_name, message_id, registered_at, base, tag, [[role_key, quantity], ...]]
+# com full_name no fim só quando for diferente de "first_name last_name".
+# role_key aponta para data['roles'] ({role_key: [nome, abreviação]}), que usa
+# o ID do cargo em config.bonus_roles sempre que possível.
+
+
+class Participant(Mapping):
+    """Registro compacto de um inscrito; continua sendo lido como o dict de antes."""
+
+    __slots__ = ('user_id', 'first_name', 'last_name', 'message_id', 'registered_at',
+                 'tickets', 'role_refs', '_full_name')
+
+    _KEYS = ('user_id', 'first_name', 'last_name', 'full_name', 'message_id', 'tickets',
+             'registered_at')
+
+    def __init__(self, user_id: str, first_name: str, last_name: str, message_id: Optional[str],
+                 registered_at: Optional[str], tickets: Dict, role_refs: Tuple,
+                 full_name: Optional[str] = None):
+        self.user_id = user_id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.message_id = message_id
+        self.registered_at = registered_at
+        # tickets e role_refs são compartilhados entre registros iguais: nunca alterar
+        self.tickets = tickets
+        self.role_refs = role_refs
+        self._full_name = None if full_name == f'{first_name} {last_name}' else full_name
+
+    @property
+    def full_name(self) -> str:
+        return self._full_name or f'{self.first_name} {self.last_name}'
+
+    def __getitem__(self, key):
+        if key in self._KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    def __repr__(self):
+        return f'Participant({self.user_id!r}, {self.full_name!r})'
+
+    def replace(self, **changes) -> 'Participant':
+        values = {
+            'user_id': self.user_id, 'first_name': self.first_name, 'last_name': self.last_name,
+            'message_id': self.message_id, 'registered_at': self.registered_at,
+            'tickets': self.tickets, 'role_refs': self.role_refs, 'full_name': self._full_name
+        }
+        values.update(changes)
+        return Participant(**values)
+
+    def to_row(self) -> List:
+        row = [self.first_name, self.last_name, self.message_id, self.registered_at,
+               self.tickets.get('base', 1), self.tickets.get('tag') or 0,
+               [list(ref) for ref in self.role_refs]]
+        if self._full_name is not None:
+            row.append(self._full_name)
+        return row
+
+
+class RecordCodec:
+    """Cria registros compactos e converte de/para linhas e o formato dict antigo."""
+
+    def __init__(self, roles: Dict[str, List], bonus_roles: Dict[str, Dict]):
+        # Mesmos objetos de data['roles'] e config['bonus_roles']
+        self.roles = roles
+        self.bonus_roles = bonus_roles
+        self._keys_by_value = {(name, abbreviation): key for key, (name, abbreviation) in roles.items()}
+        self._refs: Dict[Tuple, Tuple] = {}
+        self._tickets: Dict[Tuple, Dict] = {}
+        self._role_entries: Dict[Tuple, Dict] = {}
+
+    def _role_key(self, name: str, abbreviation: str, new_roles: List) -> str:
+        key = self._keys_by_value.get((name, abbreviation))
+        if key is not None:
+            return key
+        key = next(
+            (role_id for role_id, role in self.bonus_roles.items()
+             if role['name'] == name and role['abbreviation'] == abbreviation),
+            None
+        )
+        if key is None or key in self.roles:
+            # Cargo fora da configuração, ou ID já usado com outro nome
+            key = f'~{len(self.roles)}'
+            while key in self.roles:
+                key += '~'
+        entry = [name, abbreviation]
+        self.roles[key] = entry
+        self._keys_by_value[(name, abbreviation)] = key
+        new_roles.append((key, entry))
+        return key
+
+    def _intern(self, base: int, tag: int, refs: Tuple) -> Tuple[Dict, Tuple]:
+        refs = self._refs.setdefault(refs, refs)
+        cache_key = (base, tag, refs)
+        tickets = self._tickets.get(cache_key)
+        if tickets is None:
+            roles = {}
+            for key, quantity in refs:
+                name, abbreviation = self.roles[key]
+                entry_key = (quantity, abbreviation)
+                entry = self._role_entries.get(entry_key)
+                if entry is None:
+                    entry = self._role_entries[entry_key] = {'quantity': quantity, 'abbreviation': abbreviation}
+                roles[name] = entry
+            tickets = self._tickets[cache_key] = {'base': base, 'roles': roles, 'tag': tag}
+        return tickets, refs
+
+    def tickets(self, tickets: Dict, new_roles: List) -> Tuple[Dict, Tuple]:
+        """Versão compartilhada de um dict de fichas e suas referências de cargo"""
+        refs = tuple(
+            (self._role_key(name, data['abbreviation'], new_roles), data['quantity'])
+            for name, data in tickets.get('roles', {}).items()
+        )
+        return self._intern(tickets.get('base', 1), tickets.get('tag') or 0, refs)
+
+    def make(self, user_id: str, first_name: str, last_name: str, full_name: Optional[str],
+             message_id: Optional[str], tickets: Dict, registered_at: Optional[str],
+             new_roles: List) -> Participant:
+        tickets, refs = self.tickets(tickets, new_roles)
+        return Participant(
+            user_id, sys.intern(first_name), sys.intern(last_name), message_id, registered_at,
+            tickets, refs, full_name
+        )
+
+    def from_row(self, user_id: str, row: List) -> Participant:
+        first_name, last_name, message_id, registered_at, base, tag, refs = row[:7]
+        tickets, refs = self._intern(base, tag, tuple((key, quantity) for key, quantity in refs))
+        return Participant(
+            user_id, sys.intern(first_name), sys.intern(last_name), message_id, registered_at,
+            tickets, refs, row[7] if len(row) > 7 else None
+        )
+
+    def load(self, participants: Dict) -> int:
+        """Converter no lugar linhas e dicts antigos em registros; devolve quantos eram dicts"""
+        new_roles = []
+        legacy = 0
+        for user_id, p in participants.items():
+            if isinstance(p, Participant):
+                continue
+            if isinstance(p, list):
+                participants[user_id] = self.from_row(user_id, p)
+            else:
+                participants[user_id] = self.make(
+                    user_id, p['first_name'], p['last_name'], p.get('full_name'),
+                    p.get('message_id'), p.get('tickets') or {}, p.get('registered_at'), new_roles
+                )
+                legacy += 1
+        return legacy
+
+
+def encode_participants(participants: Dict) -> Dict:
+    return {
+        user_id: p.to_row() if isinstance(p, Participant) else p
+        for user_id, p in participants.items()
+    }
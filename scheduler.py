@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Prioridades: menor número sai primeiro
+INTERACTIVE = 0  # respostas efêmeras a quem está esperando
+BULK = 1         # posts em canais (inscrições, anúncios)
+
+# Limites documentados do Discord: 5 mensagens / 5 s por canal, 50 req/s global
+CHANNEL_RATE = (5, 5.0)
+GLOBAL_RATE = (50, 1.0)
+MESSAGE_LIMIT = 2000
+
+
+class TokenBucket:
+    def __init__(self, capacity: int, per: float):
+        self.capacity = capacity
+        self.rate = capacity / per
+        self.tokens = float(capacity)
+        self.updated = 0.0
+
+    def delay(self, now: float) -> float:
+        """Segundos até haver uma ficha (0 se já houver)"""
+        if self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _Job:
+    __slots__ = ('priority', 'key', 'factory', 'future', 'enqueued_at', 'channel',
+                 'content', 'kwargs', 'group')
+
+    def __init__(self, priority, key, factory, future, enqueued_at,
+                 channel=None, content=None, kwargs=None, group=None):
+        self.priority = priority
+        self.key = key
+        self.factory = factory
+        self.future = future
+        self.enqueued_at = enqueued_at
+        self.channel = channel
+        self.content = content
+        self.kwargs = kwargs
+        self.group = group
+
+
+class SendScheduler:
+    """Fila única de envios com token bucket por canal e faixas de prioridade."""
+
+    def __init__(self, max_in_flight: int = 10, channel_rate=CHANNEL_RATE,
+                 global_rate=GLOBAL_RATE):
+        self.channel_rate = channel_rate
+        self._global = TokenBucket(*global_rate)
+        self._buckets: Dict[Any, TokenBucket] = {}
+        self._heap = []
+        self._seq = itertools.count()
+        # Posts em espera que ainda aceitam texto, por canal e grupo
+        self._open_posts: Dict[Any, _Job] = {}
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Métricas
+        self.sent = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.waits = deque(maxlen=1000)
+        self.max_wait = 0.0
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def _enqueue(self, job: _Job) -> Awaitable:
+        self._ensure_started()
+        heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+        self._wakeup.set()
+        return job.future
+
+    async def call(self, key, factory: Callable[[], Awaitable], priority: int = BULK):
+        """Agendar uma chamada genérica à API sob o bucket `key`"""
+        loop = asyncio.get_running_loop()
+        job = _Job(priority, key, factory, loop.create_future(), loop.time())
+        return await self._enqueue(job)
+
+    async def post(self, channel, content: Optional[str] = None, *, priority: int = BULK,
+                   coalesce: Optional[str] = None, separator: str = '\n', **kwargs):
+        """channel.send agendado; com coalesce (nome do grupo), junta textos
+        ainda na fila do mesmo canal e do mesmo grupo"""
+        key = ('channel', channel.id)
+        group = coalesce if content and not kwargs else None
+        if group is not None:
+            queued = self._open_posts.get((key, group))
+            if queued is not None and len(queued.content) + len(separator) + len(content) <= MESSAGE_LIMIT:
+                queued.content += separator + content
+                self.coalesced += 1
+                return await asyncio.shield(queued.future)
+        loop = asyncio.get_running_loop()
+        job = _Job(priority, key, None, loop.create_future(), loop.time(),
+                   channel=channel, content=content, kwargs=kwargs, group=group)
+        if group is not None:
+            self._open_posts[(key, group)] = job
+        return await self._enqueue(job)
+
+    async def reply(self, interaction, content: Optional[str] = None, **kwargs):
+        """interaction.followup.send com prioridade sobre os posts em massa"""
+        return await self.call(
+            ('interaction', interaction.id),
+            lambda: interaction.followup.send(content, **kwargs) if content is not None
+            else interaction.followup.send(**kwargs),
+            INTERACTIVE
+        )
+
+    def _bucket(self, key) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            capacity, per = self.channel_rate if key[0] == 'channel' else (5, 1.0)
+            bucket = self._buckets[key] = TokenBucket(capacity, per)
+        return bucket
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+            deferred = []
+            next_wake = None
+            while self._heap:
+                entry = heapq.heappop(self._heap)
+                job = entry[2]
+                wait = max(self._bucket(job.key).delay(now), self._global.delay(now))
+                if wait:
+                    deferred.append(entry)
+                    next_wake = wait if next_wake is None else min(next_wake, wait)
+                    continue
+                self._bucket(job.key).take()
+                self._global.take()
+                if job.group is not None and self._open_posts.get((job.key, job.group)) is job:
+                    del self._open_posts[(job.key, job.group)]
+                await self._in_flight.acquire()
+                asyncio.create_task(self._dispatch(job, now))
+            for entry in deferred:
+                heapq.heappush(self._heap, entry)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), next_wake)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch(self, job: _Job, started_at: float):
+        wait = started_at - job.enqueued_at
+        self.waits.append(wait)
+        self.max_wait = max(self.max_wait, wait)
+        try:
+            if job.factory is not None:
+                result = await job.factory()
+            else:
+                result = await job.channel.send(job.content, **job.kwargs)
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f'Erro ao enviar mensagem agendada: {e}')
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._in_flight.release()
+            self._wakeup.set()
+
+    def metrics(self) -> Dict:
+        waits = sorted(self.waits)
+        by_priority = {INTERACTIVE: 0, BULK: 0}
+        for priority, _, _ in self._heap:
+            by_priority[priority] = by_priority.get(priority, 0) + 1
+        return {
+            'queue_depth': len(self._heap),
+            'queue_depth_interactive': by_priority[INTERACTIVE],
+            'queue_depth_bulk': by_priority[BULK],
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'wait_p50': waits[len(waits) // 2] if waits else 0.0,
+            'wait_p99': waits[min(len(waits) - 1, int(len(waits) * 0.99))] if waits else 0.0,
+            'wait_max': self.max_wait
+        }
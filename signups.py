@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from scheduler import BULK, MESSAGE_LIMIT
+
+# Agrupar os posts de inscrição: 0 desliga (uma mensagem por inscrito)
+SIGNUP_BATCH_SECONDS = float(os.getenv('SIGNUP_BATCH_SECONDS', '0'))
+SIGNUP_BATCH_SIZE = int(os.getenv('SIGNUP_BATCH_SIZE', '10'))
+
+
+class SignupAnnouncer:
+    """Junta os anúncios de inscrição de um canal numa mensagem a cada poucos segundos."""
+
+    def __init__(self, sender, on_posted: Callable[[object, Dict[str, str]], None],
+                 interval: float = SIGNUP_BATCH_SECONDS, max_entries: int = SIGNUP_BATCH_SIZE):
+        self.sender = sender
+        self.on_posted = on_posted
+        self.interval = interval
+        self.max_entries = max_entries
+        self._pending: Dict[int, List[Tuple[str, str]]] = {}
+        self._channels: Dict[int, object] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._posting = set()
+        self.batches = 0
+        self.entries = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def add(self, channel, user_id: str, text: str):
+        pending = self._pending.setdefault(channel.id, [])
+        size = sum(len(t) + 2 for _, t in pending)
+        if pending and size + len(text) > MESSAGE_LIMIT:
+            self._flush(channel.id)
+            pending = self._pending.setdefault(channel.id, [])
+        self._channels[channel.id] = channel
+        pending.append((user_id, text))
+        if len(pending) >= self.max_entries:
+            self._flush(channel.id)
+        elif channel.id not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[channel.id] = loop.call_later(self.interval, self._flush, channel.id)
+
+    def _flush(self, channel_id: int):
+        timer = self._timers.pop(channel_id, None)
+        if timer is not None:
+            timer.cancel()
+        entries = self._pending.pop(channel_id, None)
+        if entries:
+            task = asyncio.create_task(self._post(self._channels[channel_id], entries))
+            self._posting.add(task)
+            task.add_done_callback(self._posting.discard)
+
+    async def _post(self, channel, entries: List[Tuple[str, str]]):
+        try:
+            msg = await self.sender.post(channel, '\n\n'.join(text for _, text in entries), priority=BULK)
+            self.batches += 1
+            self.entries += len(entries)
+            # Cada inscrito aponta para a mensagem do lote
+            self.on_posted(channel, {user_id: str(msg.id) for user_id, _ in entries})
+        except Exception as e:
+            logging.error(f'Erro ao anunciar lote de {len(entries)} inscrições: {e}')
+
+    async def flush(self):
+        """Publicar imediatamente tudo que está pendente"""
+        for channel_id in list(self._pending):
+            timer = self._timers.pop(channel_id, None)
+            if timer is not None:
+                timer.cancel()
+            entries = self._pending.pop(channel_id)
+            await self._post(self._channels[channel_id], entries)
+        # Lotes que já estavam a caminho
+        if self._posting:
+            await asyncio.gather(*self._posting)
+
+
+SIGNUP_MAX_CONCURRENT = int(os.getenv('SIGNUP_MAX_CONCURRENT', '25'))
+SIGNUP_MAX_QUEUE = int(os.getenv('SIGNUP_MAX_QUEUE', '1000'))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason  # 'duplicate' ou 'full'
+
+
+class AdmissionControl:
+    """Uma inscrição em andamento por usuário e limite global com fila limitada."""
+
+    def __init__(self, max_concurrent: int = SIGNUP_MAX_CONCURRENT,
+                 max_queue: int = SIGNUP_MAX_QUEUE):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._in_flight = set()
+        self.waiting = 0
+        self.queued_total = 0
+        self.rejected_duplicate = 0
+        self.rejected_full = 0
+
+    @property
+    def active(self) -> int:
+        return len(self._in_flight) - self.waiting
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, on_queued: Optional[Callable[[], Awaitable]] = None):
+        if user_id in self._in_flight:
+            # Clique duplo / reenvio do modal: a primeira submissão vale
+            self.rejected_duplicate += 1
+            raise AdmissionRejected('duplicate')
+        must_wait = self._semaphore.locked()
+        if must_wait and self.waiting >= self.max_queue:
+            self.rejected_full += 1
+            raise AdmissionRejected('full')
+        self._in_flight.add(user_id)
+        try:
+            if must_wait:
+                self.waiting += 1
+                self.queued_total += 1
+                try:
+                    if on_queued is not None:
+                        await on_queued()
+                    await self._semaphore.acquire()
+                finally:
+                    self.waiting -= 1
+            else:
+                await self._semaphore.acquire()
+            try:
+                yield
+            finally:
+                self._semaphore.release()
+        finally:
+            self._in_flight.discard(user_id)
+
+    def metrics(self) -> Dict:
+        return {
+            'active': self.active,
+            'waiting': self.waiting,
+            'queued_total': self.queued_total,
+            'rejected_duplicate': self.rejected_duplicate,
+            'rejected_full': self.rejected_full
+        }
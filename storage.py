@@ -0,0 +1,359 @@
+import copy
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from metrics import DB_WRITE_BYTES, timed
+from records import encode_participants
+
+# Formato do arquivo (cabeçalho 'header'):
+#   1 - participantes numa lista de dicts (sem cabeçalho)
+#   2 - participantes num dict de dicts (sem cabeçalho)
+#   3 - linhas compactas (records.py) e cabeçalho com versão e estatísticas;
+#       a primeira linha do arquivo traz cabeçalho, config, cargos e blacklist
+#       e cada participante vem numa linha própria
+FORMAT_NAME = 'tropadovth-db'
+FORMAT_VERSION = 3
+
+# Cada mutação do Database é descrita por operações genéricas sobre caminhos
+# do dicionário de dados:
+#   ['set', ['participants', '123'], {...}]  -> define o valor no caminho
+#   ['del', ['participants', '123']]         -> remove a chave do caminho
+#   ['set', [], {...}]                       -> substitui o banco inteiro
+# As operações são idempotentes, então reaplicar um trecho do journal que já
+# está no snapshot não altera o resultado.
+
+
+def empty_data() -> Dict:
+    return {
+        'participants': {},  # Dicionário vazio
+        'blacklist': {},  # user_id -> registro (gravado em disco como lista)
+        'roles': {},  # role_key -> [nome, abreviação], referenciado pelas fichas
+        'config': {
+            'hashtag': None,
+            'hashtag_locked': False,
+            'bonus_roles': {},
+            'tag_enabled': False,
+            'server_tag': None,
+            'tag_quantity': 1,
+            'chat_lock_enabled': False,
+            'chat_lock_channel': None,
+            'inscricao_channel': None
+        }
+    }
+
+
+def normalize_data(data: Dict) -> Dict:
+    # Arquivos antigos guardam os participantes como lista
+    if isinstance(data.get('participants'), list):
+        data['participants'] = {str(p['user_id']): p for p in data['participants']}
+    if isinstance(data.get('blacklist'), list):
+        data['blacklist'] = {str(u['user_id']): u for u in data['blacklist']}
+    defaults = empty_data()
+    for key in ('participants', 'blacklist', 'roles'):
+        data.setdefault(key, defaults[key])
+    data['config'] = {**defaults['config'], **data.get('config', {})}
+    return data
+
+
+def apply_ops(data: Dict, ops: List) -> None:
+    for op in ops:
+        action, path = op[0], op[1]
+        if not path:
+            data.clear()
+            data.update(copy.deepcopy(op[2]))
+            continue
+        parent = data
+        for key in path[:-1]:
+            parent = parent.setdefault(key, {})
+        if action == 'set':
+            parent[path[-1]] = op[2]
+        elif action == 'del':
+            parent.pop(path[-1], None)
+
+
+def snapshot_data(data: Dict) -> Dict:
+    # Registros de participantes nunca são alterados no lugar (copy-on-write),
+    # então basta copiar os containers para congelar o estado atual.
+    snapshot = dict(data)
+    snapshot['participants'] = dict(data['participants'])
+    snapshot['blacklist'] = dict(data.get('blacklist', {}))
+    snapshot['roles'] = dict(data.get('roles', {}))
+    snapshot['config'] = copy.deepcopy(data.get('config', {}))
+    return snapshot
+
+
+def disk_format(data: Dict) -> Dict:
+    # Em memória a blacklist é indexada por user_id; no arquivo continua
+    # sendo a lista de sempre. Participantes vão como linhas compactas.
+    data = {**data, 'participants': encode_participants(data['participants'])}
+    blacklist = data.get('blacklist', {})
+    if isinstance(blacklist, dict):
+        data['blacklist'] = list(blacklist.values())
+    return data
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: str, data: Dict, indent: Optional[int] = None) -> None:
+    # Escreve num arquivo temporário, força para o disco e troca com rename
+    # atômico: um crash no meio nunca deixa o arquivo final pela metade.
+    tmp = f'{path}.tmp'
+    separators = None if indent else (',', ':')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent, separators=separators)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path)
+
+
+def data_version(data: Dict) -> int:
+    header = data.get('header')
+    if header:
+        return header.get('version', FORMAT_VERSION)
+    return 1 if isinstance(data.get('participants'), list) else 2
+
+
+def read_database_file(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data_version(data) > FORMAT_VERSION:
+        raise ValueError(f'{path} usa o formato {data_version(data)}, mais novo que este código')
+    return data
+
+
+def read_header(path: str) -> Optional[Dict]:
+    """Só a primeira linha (sem participantes); None se não for o formato atual"""
+    with open(path, 'r', encoding='utf-8') as f:
+        first = f.readline()
+    if not first.startswith('{"header":'):
+        return None
+    head = json.loads(first.rstrip().rstrip(',') + '}')
+    if head['header'].get('format') != FORMAT_NAME:
+        return None
+    if head['header'].get('version', 0) > FORMAT_VERSION:
+        raise ValueError(f'{path} usa o formato {head["header"]["version"]}, mais novo que este código')
+    return head
+
+
+def write_database_file(path: str, data: Dict, stats: Optional[Dict] = None) -> None:
+    """Gravação atômica no formato atual, um participante por linha"""
+    disk = disk_format(data)
+    participants = disk.pop('participants')
+    disk.pop('header', None)
+    header = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'saved_at': datetime.now().isoformat(),
+        'participants': len(participants)
+    }
+    if stats is not None:
+        header['stats'] = stats
+    separators = (',', ':')
+    head = json.dumps({'header': header, **disk}, ensure_ascii=False, separators=separators)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(head[:-1] + ',\n"participants":{')
+        separator = '\n'
+        for user_id, row in participants.items():
+            f.write(separator + json.dumps(user_id) + ':'
+                    + json.dumps(row, ensure_ascii=False, separators=separators))
+            separator = ',\n'
+        f.write('\n}}\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path)
+
+
+class PendingDeletes:
+    """Mensagens que /limpar ainda vai apagar, por servidor, fora dos bancos.
+
+    A lista de IDs é gravada uma vez; a cada lote só o contador (`.done`)
+    é regravado. Listar as limpezas pendentes não abre nenhum banco.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, guild_id, suffix: str) -> str:
+        return os.path.join(self.directory, f'{guild_id}{suffix}')
+
+    def save(self, guild_id, channel_id, message_ids: List[str]):
+        os.makedirs(self.directory, exist_ok=True)
+        self.advance(guild_id, 0)
+        atomic_write_json(self._path(guild_id, '.json'), {'channel': str(channel_id), 'messages': message_ids})
+
+    def advance(self, guild_id, done: int):
+        atomic_write_json(self._path(guild_id, '.done'), {'done': done})
+
+    def load(self, guild_id) -> Optional[Tuple[str, int, List[str]]]:
+        """(canal, quantas já apagadas, IDs), ou None sem limpeza pendente"""
+        try:
+            with open(self._path(guild_id, '.json'), encoding='utf-8') as f:
+                pending = json.load(f)
+        except FileNotFoundError:
+            return None
+        try:
+            with open(self._path(guild_id, '.done'), encoding='utf-8') as f:
+                done = json.load(f)['done']
+        except FileNotFoundError:
+            done = 0
+        return pending['channel'], done, pending['messages']
+
+    def clear(self, guild_id):
+        for suffix in ('.json', '.done'):
+            try:
+                os.remove(self._path(guild_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def guilds(self) -> List[int]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [int(name[:-len('.json')]) for name in names if name.endswith('.json')]
+
+
+class JournalStore:
+    """Armazenamento append-only: snapshot JSON + journal de operações."""
+
+    def __init__(self, snapshot_file: str, journal_file: Optional[str] = None,
+                 compact_every: int = 5000):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file or f'{snapshot_file}.journal'
+        self.old_journal_file = f'{self.journal_file}.old'
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._fh = None
+        self._records = 0
+        self._compaction: Optional[threading.Thread] = None
+
+    def load(self) -> Optional[Dict]:
+        data = None
+        if os.path.exists(self.snapshot_file):
+            data = normalize_data(read_database_file(self.snapshot_file))
+        # O journal antigo só existe se uma compactação foi interrompida
+        for path in (self.old_journal_file, self.journal_file):
+            if not os.path.exists(path):
+                continue
+            if data is None:
+                data = empty_data()
+            self._records += self._replay(path, data)
+        return data
+
+    def _replay(self, path: str, data: Dict) -> int:
+        count = 0
+        good_offset = 0
+        with open(path, 'rb') as f:
+            for raw in f:
+                try:
+                    ops = json.loads(raw)
+                except ValueError:
+                    # Linha cortada por um crash durante a escrita
+                    logging.warning(f'Journal {path}: registro incompleto descartado')
+                    break
+                apply_ops(data, ops)
+                good_offset += len(raw)
+                count += 1
+        if good_offset < os.path.getsize(path):
+            with open(path, 'r+b') as f:
+                f.truncate(good_offset)
+        return count
+
+    def has_pending(self) -> bool:
+        """Há operações no journal que ainda não estão no snapshot"""
+        return self._records > 0 or any(
+            os.path.exists(path) and os.path.getsize(path) > 0
+            for path in (self.journal_file, self.old_journal_file)
+        )
+
+    def _open(self):
+        if self._fh is None:
+            self._fh = open(self.journal_file, 'a', encoding='utf-8')
+        return self._fh
+
+    def write(self, batches: List[List]) -> bool:
+        # Pode rodar numa thread de I/O; retorna True quando vale compactar
+        lines = ''.join(
+            json.dumps(ops, ensure_ascii=False, separators=(',', ':')) + '\n' for ops in batches
+        )
+        with self._lock, timed('journal'):
+            fh = self._open()
+            fh.write(lines)
+            fh.flush()
+            DB_WRITE_BYTES.inc('journal', amount=len(lines.encode('utf-8')))
+            self._records += len(batches)
+            return self._records >= self.compact_every
+
+    def compact(self, data: Dict, wait: bool = False, stats: Optional[Dict] = None) -> None:
+        if self._compaction is not None and self._compaction.is_alive():
+            if not wait:
+                return
+            self._compaction.join()
+        snapshot = snapshot_data(data)
+        with self._lock:
+            self._rotate()
+            self._records = 0
+        self._compaction = threading.Thread(
+            target=self._write_snapshot, args=(snapshot, stats), name='db-compaction', daemon=True
+        )
+        self._compaction.start()
+        if wait:
+            self._compaction.join()
+
+    def _rotate(self) -> None:
+        # Chamado com o lock: tudo que já está no journal entra no snapshot
+        if self._fh is not None:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._fh.close()
+            self._fh = None
+        if not os.path.exists(self.journal_file):
+            return
+        if os.path.exists(self.old_journal_file):
+            # Compactação anterior falhou: junta os dois trechos
+            with open(self.journal_file, 'rb') as src, open(self.old_journal_file, 'ab') as dst:
+                dst.write(src.read())
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self.journal_file)
+        else:
+            os.replace(self.journal_file, self.old_journal_file)
+
+    def _write_snapshot(self, snapshot: Dict, stats: Optional[Dict]) -> None:
+        try:
+            with timed('snapshot'):
+                write_database_file(self.snapshot_file, snapshot, stats)
+            DB_WRITE_BYTES.inc('snapshot', amount=os.path.getsize(self.snapshot_file))
+            if os.path.exists(self.old_journal_file):
+                os.remove(self.old_journal_file)
+            logging.info('Snapshot do banco de dados compactado')
+        except Exception as e:
+            logging.error(f'Erro ao compactar banco de dados: {e}')
+
+    def close(self) -> None:
+        if self._compaction is not None:
+            self._compaction.join()
+        with self._lock:
+            if self._fh is not None:
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+                self._fh.close()
+                self._fh = None
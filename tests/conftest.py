@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def bot(request, tmp_path, monkeypatch):
+    """Módulo bot com bancos num diretório temporário, em cada backend"""
+    import bot
+    from database import GuildDatabases
+    from scheduler import SendScheduler
+    from signups import AdmissionControl
+    from workers import WorkerPool
+
+    databases = GuildDatabases(storage=request.param, directory=str(tmp_path), legacy_guild_id=None)
+    monkeypatch.setattr(bot, 'databases', databases)
+    # Agendador e pools novos: os do módulo ficam presos ao event loop de outro teste
+    monkeypatch.setattr(bot, 'sender', SendScheduler())
+    monkeypatch.setattr(bot, 'admission', AdmissionControl())
+    monkeypatch.setattr(bot, 'workers', WorkerPool(processes=0))
+    yield bot
+    bot.workers.shutdown()
+    databases.close()
@@ -0,0 +1,35 @@
+import asyncio
+
+from fakes import FakeDiscord, FakeGuild, FakeInteraction
+
+
+def test_atualizar_grava_fichas_alteradas(bot):
+    async def run():
+        api = FakeDiscord()
+        guild = FakeGuild(api, api.snowflake())
+        vip = guild.add_role('VIP')
+        admin = guild.add_member('admin')
+        db = bot.databases.get(guild.id)
+        db.add_bonus_role(str(vip.id), vip.name, 2, 'VIP')
+        members = [guild.add_member(f'membro{i}') for i in range(5)]
+        for i, member in enumerate(members):
+            db.add_participant(
+                str(member.id), f'Nome{i}', 'Sobrenome', f'Nome{i} Sobrenome', None,
+                db.ticket_policy().calculate(member), '2024-01-01T00:00:00'
+            )
+        # 3 dos 5 membros ganham o cargo depois de inscritos
+        for member in members[:3]:
+            member.roles.append(vip)
+
+        await bot.atualizar.callback(FakeInteraction(api, admin))
+        db = bot.databases.get(guild.id)
+        roles = {
+            i: sorted(db.get_participant(str(member.id))['tickets'].get('roles', {}))
+            for i, member in enumerate(members)
+        }
+        return db.get_statistics(), roles
+
+    stats, roles = asyncio.run(run())
+    assert stats['total_tickets'] == 11
+    assert stats['tickets_by_role'] == {'VIP': 3}
+    assert roles == {0: ['VIP'], 1: ['VIP'], 2: ['VIP'], 3: [], 4: []}
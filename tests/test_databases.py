@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+import pytest
+
+import database
+from database import GuildDatabases
+
+
+def test_banco_fixado_nao_e_descarregado(tmp_path):
+    async def run():
+        databases = GuildDatabases(storage='json', directory=str(tmp_path), idle_seconds=0)
+        db = databases.pin(1)
+        pinned = await databases.evict_idle()
+        same = databases.get(1) is db
+        databases.unpin(1)
+        evicted = await databases.evict_idle()
+        databases.close()
+        return pinned, same, evicted
+
+    assert asyncio.run(run()) == (0, True, 1)
+
+
+def test_banco_legado_sem_dono(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / database.DB_FILE).write_text('{}')
+    guilds = str(tmp_path / 'guilds')
+    # Um servidor só: o banco da raiz passa a ser dele
+    assert GuildDatabases(directory=guilds, legacy_guild_id=None).claim_legacy([42]) == '42'
+    assert GuildDatabases(directory=guilds, legacy_guild_id='1').claim_legacy([1, 2]) == '1'
+    # Vários servidores: não dá para saber o dono
+    with pytest.raises(RuntimeError, match='DB_LEGACY_GUILD_ID'):
+        GuildDatabases(directory=guilds, legacy_guild_id=None).claim_legacy([1, 2])
+
+
+def test_peek_nao_cria_banco(tmp_path):
+    databases = GuildDatabases(storage='json', directory=str(tmp_path / 'guilds'), legacy_guild_id=None)
+    assert databases.peek(1) is None
+    assert not (tmp_path / 'guilds').exists()
+    db = databases.get(1)
+    db.set_hashtag('#teste')
+    databases.close()
+    assert databases.peek(1) is not None
+    assert databases.loaded() == ['1']
+    databases.close()
+
+
+def test_participantes_carregados_numa_thread(tmp_path):
+    path = str(tmp_path / 'database.json')
+    db = database.Database(path, storage='json')
+    for i in range(3):
+        db.add_participant(str(i), f'Nome{i}', 'Sobrenome', None, None,
+                           {'base': 1, 'roles': {}, 'tag': 0}, '2024-01-01T00:00:00')
+    db.close()
+
+    async def run():
+        db = database.Database(path, storage='json')
+        threads = []
+        read = db._read_participants
+
+        def spy():
+            threads.append(threading.current_thread())
+            return read()
+
+        db._read_participants = spy
+        # Acessos simultâneos esperam a mesma leitura
+        await asyncio.gather(db.warm(), db.warm())
+        return threads, db.is_registered('2')
+
+    threads, registered = asyncio.run(run())
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+    assert registered
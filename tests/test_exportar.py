@@ -0,0 +1,67 @@
+import asyncio
+import csv
+import io
+
+from fakes import FakeDiscord, FakeGuild, FakeInteraction
+
+
+def test_exportar_csv(bot):
+    async def run():
+        api = FakeDiscord()
+        guild = FakeGuild(api, api.snowflake())
+        admin = guild.add_member('admin')
+        db = bot.databases.get(guild.id)
+        for i in range(12):
+            db.add_participant(
+                str(1000 + i), f'Nome{i}', 'Sobrenome', f'Nome{i} Sobrenome', None,
+                {'base': 1, 'roles': {}, 'tag': 0}, '2024-01-01T00:00:00'
+            )
+        interaction = FakeInteraction(api, admin)
+        sent = []
+        send = interaction.followup.send
+
+        async def capture(content=None, **kwargs):
+            sent.extend(kwargs.get('files', []))
+            return await send(content, **kwargs)
+
+        interaction.followup.send = capture
+        await bot.exportar.callback(interaction, 'csv', False)
+        return sent
+
+    files = asyncio.run(run())
+    assert [f.filename for f in files] == ['participantes.csv']
+    rows = list(csv.reader(io.StringIO(files[0].fp.read().decode('utf-8'))))
+    assert rows[0][:4] == ['user_id', 'first_name', 'last_name', 'full_name']
+    assert sorted(row[0] for row in rows[1:]) == [str(1000 + i) for i in range(12)]
+    assert all(row[-1] == '1' for row in rows[1:])
+
+
+def test_exportar_respeita_limite_por_mensagem(bot):
+    async def run():
+        api = FakeDiscord()
+        guild = FakeGuild(api, api.snowflake())
+        guild.filesize_limit = 2048
+        admin = guild.add_member('admin')
+        db = bot.databases.get(guild.id)
+        for i in range(300):
+            db.add_participant(
+                str(1000 + i), f'Nome{i}', 'Sobrenome', f'Nome{i} Sobrenome', None,
+                {'base': 1, 'roles': {}, 'tag': 0}, '2024-01-01T00:00:00'
+            )
+        interaction = FakeInteraction(api, admin)
+        messages = []
+        send = interaction.followup.send
+
+        async def capture(content=None, **kwargs):
+            if kwargs.get('files'):
+                messages.append([len(f.fp.read()) for f in kwargs['files']])
+            return await send(content, **kwargs)
+
+        interaction.followup.send = capture
+        await bot.exportar.callback(interaction, 'csv', False)
+        return guild.filesize_limit, messages
+
+    limit, messages = asyncio.run(run())
+    assert sum(len(sizes) for sizes in messages) > 1
+    # Partes pequenas viajam juntas, mas nenhuma mensagem passa do limite
+    assert all(sum(sizes) <= limit for sizes in messages)
@@ -0,0 +1,54 @@
+import random
+
+from indexes import NameIndex, edit_distance
+from utils import normalize_name
+
+
+def levenshtein(a, b):
+    """Referência sem atalhos: a tabela inteira"""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def _word(rng, alphabet='abcde'):
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 7)))
+
+
+def test_edit_distance_igual_a_forca_bruta():
+    rng = random.Random(1)
+    for _ in range(5000):
+        a, b = _word(rng), _word(rng)
+        max_distance = rng.randint(0, 3)
+        expected = levenshtein(a, b)
+        assert edit_distance(a, b, max_distance) == (expected if expected <= max_distance else None), (a, b)
+
+
+def test_similar_igual_a_forca_bruta():
+    rng = random.Random(2)
+    index = NameIndex()
+    names = {}
+    for user in range(400):
+        first, last = _word(rng, 'abc'), _word(rng, 'abc')
+        index.add(str(user), first, last)
+        names[str(user)] = normalize_name(f'{first} {last}')
+    candidates = set(names.values())
+    for _ in range(150):
+        first, last = _word(rng, 'abc'), _word(rng, 'abc')
+        name = normalize_name(f'{first} {last}')
+        distances = {candidate: levenshtein(name, candidate) for candidate in candidates}
+        for max_distance in (1, 2):
+            matches = sorted(
+                (distance, candidate) for candidate, distance in distances.items()
+                if 0 < distance <= max_distance
+            )
+            expected = [
+                (user_id, candidate, distance)
+                for distance, candidate in matches[:5]
+                for user_id in sorted(u for u, n in names.items() if n == candidate)
+            ][:5]
+            assert index.similar(first, last, max_distance) == expected, (name, max_distance)
@@ -0,0 +1,67 @@
+import asyncio
+
+from fakes import FakeDiscord, FakeGuild, FakeInteraction
+
+POST = 'POST /channels/{channel_id}/messages'
+
+
+def test_inscricoes_na_fila_do_canal_saem_numa_mensagem(bot):
+    async def run():
+        api = FakeDiscord()
+        guild = FakeGuild(api, api.snowflake())
+        channel = guild.add_channel()
+        db = bot.databases.get(guild.id)
+        db.set_hashtag('#Sorteio')
+        db.set_inscricao_channel(str(channel.id))
+        members = [guild.add_member(f'membro{i}') for i in range(10)]
+
+        async def submit(i, member):
+            modal = bot.InscricaoModal()
+            modal.nome._value, modal.sobrenome._value = f'Nome{i}', f'Sobrenome{i}'
+            modal.hashtag._value = '#Sorteio'
+            await modal.on_submit(FakeInteraction(api, member))
+
+        await asyncio.gather(*(submit(i, member) for i, member in enumerate(members)))
+        return api, channel, db, members
+
+    api, channel, db, members = asyncio.run(run())
+    # Posts ainda na fila do canal recebem as inscrições seguintes
+    assert api.calls[POST] < 10
+    assert db.get_statistics()['total_participants'] == 10
+    message_ids = {db.get_participant(str(member.id))['message_id'] for member in members}
+    assert message_ids == {str(message_id) for message_id in channel.messages}
+    text = '\n\n'.join(message.content for message in channel.messages.values())
+    assert all(f'Nome{i} Sobrenome{i}' in text for i in range(10))
+
+
+def test_anuncio_nao_entra_no_post_das_inscricoes(bot):
+    async def run():
+        api = FakeDiscord()
+        guild = FakeGuild(api, api.snowflake())
+        channel = guild.add_channel()
+        db = bot.databases.get(guild.id)
+        db.set_hashtag('#Sorteio')
+        db.set_inscricao_channel(str(channel.id))
+        members = [guild.add_member(f'membro{i}') for i in range(8)]
+        admin = guild.add_member('admin')
+
+        async def submit(i, member):
+            modal = bot.InscricaoModal()
+            modal.nome._value, modal.sobrenome._value = f'Nome{i}', f'Sobrenome{i}'
+            modal.hashtag._value = '#Sorteio'
+            await modal.on_submit(FakeInteraction(api, member))
+
+        async def anunciar():
+            await bot.anunciar.callback(FakeInteraction(api, admin), channel, 'Aviso', 'Sorteio amanhã')
+
+        calls = [submit(i, member) for i, member in enumerate(members)]
+        calls.insert(4, anunciar())
+        await asyncio.gather(*calls)
+        return channel, db, members
+
+    channel, db, members = asyncio.run(run())
+    announcements = [m for m in channel.messages.values() if '**Aviso**' in m.content]
+    assert len(announcements) == 1
+    assert '#Sorteio' not in announcements[0].content
+    message_ids = {db.get_participant(str(member.id))['message_id'] for member in members}
+    assert str(announcements[0].id) not in message_ids
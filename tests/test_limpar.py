@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from fakes import FakeDiscord, FakeGuild, FakeInteraction, FakeMessage
+
+
+def _setup(bot, monkeypatch, count):
+    api = FakeDiscord()
+    guild = FakeGuild(api, api.snowflake())
+    channel = guild.add_channel()
+    monkeypatch.setattr(bot.client, 'get_channel', lambda channel_id: guild.get_channel(channel_id))
+    old = datetime.now(timezone.utc) - timedelta(days=20)
+    db = bot.databases.get(guild.id)
+    for i in range(count):
+        # Uma em cada 50 com mais de 14 dias: fora do bulk delete
+        message = FakeMessage(api, channel, 'inscrição', id=api.snowflake(old if i % 50 == 0 else None))
+        channel.messages[message.id] = message
+        db.add_participant(
+            str(1000 + i), f'Nome{i}', 'Sobrenome', f'Nome{i} Sobrenome', str(message.id),
+            {'base': 1, 'roles': {}, 'tag': 0}, '2024-01-01T00:00:00'
+        )
+    return api, guild, channel
+
+
+def test_limpar_apaga_mensagens_em_lote(bot, monkeypatch):
+    async def run():
+        api, guild, channel = _setup(bot, monkeypatch, 250)
+        other = await channel.send('anúncio')
+        await bot.limpar.callback(FakeInteraction(api, guild.add_member('admin')), channel)
+        await bot._cleanups[guild.id]
+        return api, guild, channel, other
+
+    api, guild, channel, other = asyncio.run(run())
+    assert list(channel.messages) == [other.id]
+    assert api.calls['POST /channels/{channel_id}/messages/bulk-delete'] == 3
+    assert api.calls['DELETE /channels/{channel_id}/messages/{message_id}'] == 5
+    assert bot.databases.get(guild.id).get_statistics()['total_participants'] == 0
+    assert bot.databases.pending_deletes.guilds() == []
+
+
+def test_limpar_retoma_do_ultimo_lote(bot, monkeypatch):
+    async def run():
+        api, guild, channel = _setup(bot, monkeypatch, 250)
+        message_ids = [str(message_id) for message_id in channel.messages]
+        bot.databases.pending_deletes.save(guild.id, channel.id, message_ids)
+        bot.databases.pending_deletes.advance(guild.id, 200)
+        bot._start_cleanup(guild.id)
+        await bot._cleanups[guild.id]
+        return channel, message_ids
+
+    channel, message_ids = asyncio.run(run())
+    assert [str(message_id) for message_id in channel.messages] == message_ids[:200]
+    assert bot.databases.pending_deletes.guilds() == []
+
+
+def test_limpar_retomada_depois_de_erro(bot, monkeypatch):
+    delete_chunk = bot._delete_chunk
+    calls = []
+
+    async def flaky(chunk, channel):
+        calls.append(chunk[0])
+        if len(calls) == 2:
+            raise ConnectionResetError('conexão caiu')
+        return await delete_chunk(chunk, channel)
+
+    monkeypatch.setattr(bot, '_delete_chunk', flaky)
+
+    async def run():
+        api, guild, channel = _setup(bot, monkeypatch, 250)
+        admin = guild.add_member('admin')
+        first = FakeInteraction(api, admin)
+        sent = []
+        send = first.followup.send
+
+        async def capture(content=None, **kwargs):
+            message = await send(content, **kwargs)
+            sent.append(message)
+            return message
+
+        first.followup.send = capture
+        await bot.limpar.callback(first, channel)
+        await bot._cleanups[guild.id]
+        # O erro não descarta o que falta: o próximo /limpar retoma
+        pending = bot.databases.pending_deletes.load(guild.id)
+        second = FakeInteraction(api, admin)
+        await bot.limpar.callback(second, None)
+        await bot._cleanups[guild.id]
+        return channel, [message.content for message in sent], second, pending
+
+    channel, first, second, pending = asyncio.run(run())
+    assert pending is not None and pending[1] == 100
+    assert '/limpar de novo para retomar' in first[-1]
+    assert any('Retomando' in reply for reply in second.replies)
+    assert calls == [0, 100, 100, 200]
+    assert list(channel.messages) == []
+    assert bot.databases.pending_deletes.guilds() == []
@@ -0,0 +1,45 @@
+import asyncio
+
+from fakes import FakeDiscord, FakeGuild, FakeInteraction
+
+
+def test_lista_arquivo_ordenado(bot):
+    async def run():
+        api = FakeDiscord()
+        guild = FakeGuild(api, api.snowflake())
+        admin = guild.add_member('admin')
+        db = bot.databases.get(guild.id)
+        for i, name in enumerate(['Carla', 'Ana', 'Bruno']):
+            db.add_participant(
+                str(1000 + i), name, 'Silva', f'{name} Silva', None,
+                {'base': 1, 'roles': {}, 'tag': 0}, '2024-01-01T00:00:00'
+            )
+        interaction = FakeInteraction(api, admin)
+        sent = []
+        send = interaction.followup.send
+
+        async def capture(content=None, **kwargs):
+            if 'file' in kwargs:
+                sent.append(kwargs['file'])
+            return await send(content, **kwargs)
+
+        interaction.followup.send = capture
+        await bot.lista.callback(interaction, 'simples', 'arquivo')
+        return sent
+
+    files = asyncio.run(run())
+    assert files[0].filename == 'participantes_simples.txt'
+    assert files[0].fp.read().decode('utf-8') == 'Ana Silva\nBruno Silva\nCarla Silva\n'
+
+
+def test_lista_vazia_libera_o_banco(bot):
+    async def run():
+        api = FakeDiscord()
+        guild = FakeGuild(api, api.snowflake())
+        interaction = FakeInteraction(api, guild.add_member('admin'))
+        await bot.lista.callback(interaction, 'simples', 'auto')
+        return interaction.replies
+
+    assert asyncio.run(run()) == ['Nenhum participante inscrito ainda.']
+    # Sem pin pendurado: o banco pode ser descarregado quando ficar ocioso
+    assert bot.databases._pins == {}
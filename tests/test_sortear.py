@@ -0,0 +1,42 @@
+import asyncio
+
+from draw import run_draw, weights_snapshot
+from fakes import FakeDiscord, FakeGuild, FakeInteraction
+
+
+def _sortear(bot, recalcular):
+    async def run():
+        api = FakeDiscord()
+        guild = FakeGuild(api, api.snowflake())
+        vip = guild.add_role('VIP')
+        db = bot.databases.get(guild.id)
+        db.add_bonus_role(str(vip.id), vip.name, 3, 'VIP')
+        members = [guild.add_member(f'membro{i}') for i in range(6)]
+        for i, member in enumerate(members):
+            db.add_participant(
+                str(member.id), f'Nome{i}', 'Sobrenome', f'Nome{i} Sobrenome', None,
+                db.ticket_policy().calculate(member), '2024-01-01T00:00:00'
+            )
+        # Depois da inscrição: um ganha VIP, outro sai do servidor
+        members[0].roles.append(vip)
+        del guild.members[members[1].id]
+        interaction = FakeInteraction(api, guild.add_member('admin'))
+        await bot.sortear.callback(interaction, 6, '42', recalcular)
+        return interaction.replies[-1], members, {p['user_id']: p for p in db.iter_participants()}
+
+    return asyncio.run(run())
+
+
+def test_sortear_com_semente(bot, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    reply, members, participants = _sortear(bot, False)
+    expected = run_draw(weights_snapshot(participants), 6, 42, save_dir=None)
+    assert 'Participantes: 6 | Fichas: 6' in reply
+    assert [line.split('<@')[1].split('>')[0] for line in reply.splitlines() if '<@' in line] == expected['winners']
+
+
+def test_sortear_recalculando(bot, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    reply, members, _ = _sortear(bot, True)
+    assert 'Participantes: 5 | Fichas: 8' in reply
+    assert f'<@{members[1].id}>' not in reply
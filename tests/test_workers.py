@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+from workers import IO, Job, WorkerPool, chunk_count, iter_chunks
+
+
+def _slow_square(chunk):
+    # Pedaços do começo terminam por último
+    time.sleep(0.01 * (5 - chunk[0]))
+    return [x * x for x in chunk]
+
+
+def test_iter_chunks():
+    assert list(iter_chunks(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_chunks([], 2)) == []
+    assert chunk_count(5, 2) == 3
+    assert chunk_count(0, 2) == 0
+
+
+def test_map_chunks_consume_em_ordem():
+    async def run():
+        pool = WorkerPool(processes=0, threads=4)
+        consumed = []
+
+        async def consume(result):
+            consumed.append(result)
+
+        job = Job('teste')
+        results = await pool.map_chunks(
+            job, _slow_square, iter_chunks(iter(range(6)), 1), kind=IO, total=6, consume=consume
+        )
+        pool.shutdown()
+        return results, consumed, job
+
+    results, consumed, job = asyncio.run(run())
+    assert results == []
+    assert consumed == [[x * x] for x in range(6)]
+    assert job.done == job.total == 6
@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+from database import Database
+
+TICKETS = {'base': 1, 'roles': {}, 'tag': 0}
+
+
+def test_mudanca_durante_gravacao_e_gravada(tmp_path):
+    path = str(tmp_path / 'database.json')
+
+    async def run():
+        db = Database(path, storage='json', write_behind=True, flush_interval_ms=50)
+        write_file = db._write_file
+
+        def slow_write(*args):
+            time.sleep(0.2)
+            write_file(*args)
+
+        db._write_file = slow_write
+        db.add_participant('1', 'Ana', 'Silva', 'Ana Silva', None, TICKETS, '2024-01-01T00:00:00')
+        await asyncio.sleep(0.1)  # a gravação do primeiro já começou
+        db.add_participant('2', 'Bruno', 'Souza', 'Bruno Souza', None, TICKETS, '2024-01-01T00:00:00')
+        await asyncio.sleep(0.8)
+        return db.pending_writes
+
+    assert asyncio.run(run()) == 0
+    db = Database(path, storage='json')
+    assert db.get_participant('1') is not None
+    assert db.get_participant('2') is not None
@@ -1,5 +1,14 @@
+import csv
+import io
 import re
-from typing import Dict, List
+import unicodedata
+from typing import Dict, Iterable, List
+
+# Padrões compilados uma única vez
+_NAME_CHARS = re.compile(r'^[a-zA-ZÀ-ÿ\s]+$')
+_STARTS_WITH_DIGIT = re.compile(r'^\d')
+_REPEATED_CHARS = re.compile(r'(.)\1{3,}')
+_VOWELS = frozenset('aeiouáéíóúâêîôûãõAEIOUÁÉÍÓÚÂÊÎÔÛÃÕ')
 
 def is_valid_name(name: str) -> bool:
     """Validar se o nome é real e não contém padrões inválidos"""
@@ -14,12 +23,11 @@ def is_valid_name(name: str) -> bool:
         return False
 
     # Verifica se contém apenas letras e espaços (sem números ou símbolos)
-    import re
-    if not re.match(r'^[a-zA-ZÀ-ÿ\s]+$', name):
+    if not _NAME_CHARS.match(name):
         return False
 
     # Verifica se começa com número (ex: 3rafael)
-    if re.match(r'^\d', name):
+    if _STARTS_WITH_DIGIT.match(name):
         return False
 
     # Verifica se tem partes muito curtas (ex: "li souza" - "li" tem 2 letras)
@@ -30,45 +38,73 @@ def is_valid_name(name: str) -> bool:
             return False
 
     # Verifica se tem caracteres repetidos demais (ex: "aaaa", "xxxx")
-    if re.search(r'(.)\1{3,}', name.lower()):
+    if _REPEATED_CHARS.search(name.lower()):
         return False
 
     # Verifica se não é apenas consoantes ou vogais
-    vowels = set('aeiouáéíóúâêîôûãõAEIOUÁÉÍÓÚÂÊÎÔÛÃÕ')
-    has_vowel = any(c in vowels for c in name)
-    has_consonant = any(c.isalpha() and c not in vowels for c in name)
+    has_vowel = any(c in _VOWELS for c in name)
+    has_consonant = any(c.isalpha() and c not in _VOWELS for c in name)
 
     if not (has_vowel and has_consonant):
         return False
 
     return True
 
-def calculate_tickets(member, bonus_roles, tag_enabled, server_tag, tag_quantity):
-    tickets = {
-        'base': 1,
-        'roles': {},
-        'tag': 0
-    }
-
-    for role in member.roles:
-        role_id = str(role.id)
-        if role_id in bonus_roles:
-            role_data = bonus_roles[role_id]
-            tickets['roles'][role_data['name']] = {
-                'quantity': role_data['quantity'],
-                'abbreviation': role_data['abbreviation']
-            }
+def normalize_name(name: str) -> str:
+    """Normalizar nome para comparação (sem acentos, caixa ou espaços extras)"""
+    decomposed = unicodedata.normalize('NFKD', name.casefold())
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.split())
 
-    if tag_enabled and server_tag:
-        # Verifica tanto no nickname quanto no username global
-        display_name = member.display_name or ''
-        username = member.name or ''
+class TicketPolicy:
+    """Regras de fichas pré-compiladas a partir da configuração do sorteio"""
 
-        tag_lower = server_tag.lower().strip()
-        if tag_lower in display_name.lower() or tag_lower in username.lower():
-            tickets['tag'] = tag_quantity
+    __slots__ = ('bonus_roles', 'tag', 'tag_quantity')
 
-    return tickets
+    def __init__(self, bonus_roles, tag_enabled, server_tag, tag_quantity):
+        # role.id (int) -> (nome do cargo, registro compartilhado por todos)
+        self.bonus_roles = {
+            int(role_id): (role_data['name'], {
+                'quantity': role_data['quantity'],
+                'abbreviation': role_data['abbreviation']
+            })
+            for role_id, role_data in bonus_roles.items()
+        }
+        self.tag = server_tag.lower().strip() if tag_enabled and server_tag else None
+        self.tag_quantity = tag_quantity
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'TicketPolicy':
+        return cls(
+            config.get('bonus_roles', {}),
+            config.get('tag_enabled', False),
+            config.get('server_tag', ''),
+            config.get('tag_quantity', 0)
+        )
+
+    def calculate(self, member) -> Dict:
+        roles = {}
+        bonus_roles = self.bonus_roles
+        if bonus_roles:
+            for role in member.roles:
+                entry = bonus_roles.get(role.id)
+                if entry is not None:
+                    roles[entry[0]] = entry[1]
+
+        tag = 0
+        if self.tag is not None:
+            # Verifica tanto no nickname quanto no username global
+            if self.tag in (member.display_name or '').lower() or self.tag in (member.name or '').lower():
+                tag = self.tag_quantity
+
+        return {'base': 1, 'roles': roles, 'tag': tag}
+
+    def calculate_many(self, members: Iterable) -> List[Dict]:
+        calculate = self.calculate
+        return [calculate(member) for member in members]
+
+def calculate_tickets(member, bonus_roles, tag_enabled, server_tag, tag_quantity):
+    return TicketPolicy(bonus_roles, tag_enabled, server_tag, tag_quantity).calculate(member)
 
 def get_total_tickets(tickets: Dict) -> int:
     total = tickets.get('base', 1)
@@ -96,3 +132,24 @@ def abbreviate_name(first_name: str, last_name: str) -> str:
     first_initial = last_name[0].upper() if last_name else ''
     second_initial = last_name[1].lower() if len(last_name) > 1 else ''
     return f"{first_name} {first_initial}{second_initial}."
+
+def parse_blacklist_csv(text: str, default_reason: str) -> List[Dict]:
+    """Ler CSV de banimentos: user_id, motivo (opcional), username (opcional)"""
+    entries = []
+    for row in csv.reader(io.StringIO(text)):
+        if not row or not row[0].strip().isdigit():
+            continue  # cabeçalho, linha vazia ou id inválido
+        entries.append({
+            'user_id': row[0].strip(),
+            'reason': row[1].strip() if len(row) > 1 and row[1].strip() else default_reason,
+            'username': row[2].strip() if len(row) > 2 else None
+        })
+    return entries
+
+def format_blacklist_csv(entries: Iterable[Dict]) -> str:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['user_id', 'reason', 'username', 'added_at'])
+    for u in entries:
+        writer.writerow([u.get('user_id'), u.get('reason'), u.get('username'), u.get('added_at')])
+    return output.getvalue()
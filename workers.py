@@ -0,0 +1,188 @@
+import asyncio
+import inspect
+import itertools
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+# Tipos de pool: CPU em processos (não disputa o GIL com o event loop),
+# I/O em threads, INLINE no próprio loop entre awaits (objetos do discord.py;
+# aqui fn também pode ser assíncrona, para chamadas à API)
+CPU = 'cpu'
+IO = 'io'
+INLINE = 'inline'
+
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', '2'))
+WORKER_THREADS = int(os.getenv('WORKER_THREADS', '4'))
+# Registros por pedaço: cada pedaço é uma unidade de progresso e de cancelamento
+WORKER_CHUNK_SIZE = int(os.getenv('WORKER_CHUNK_SIZE', '5000'))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """Trabalho pesado em andamento, com progresso e cancelamento."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name: str, owner: Optional[int] = None,
+                 on_progress: Optional[Callable[['Job'], Awaitable]] = None):
+        self.id = next(self._ids)
+        self.name = name
+        self.owner = owner
+        self.on_progress = on_progress
+        self.done = 0
+        self.total = 0
+        self.cancelled = False
+        self.started_at = time.monotonic()
+
+    @property
+    def fraction(self) -> float:
+        return self.done / self.total if self.total else 0.0
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled(self.name)
+
+    async def advance(self, amount: int = 1):
+        self.done += amount
+        if self.on_progress is not None:
+            try:
+                await self.on_progress(self)
+            except Exception as e:
+                logging.warning(f'Erro ao atualizar progresso de {self.name}: {e}')
+
+
+def chunked(items: Sequence, size: int = WORKER_CHUNK_SIZE) -> List[Sequence]:
+    return [items[start:start + size] for start in range(0, len(items), size)] or [items[:0]]
+
+
+def iter_chunks(items: Iterable, size: int = WORKER_CHUNK_SIZE) -> Iterator[List]:
+    """Pedaços lidos sob demanda, sem materializar todos os itens"""
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def chunk_count(items: int, size: int = WORKER_CHUNK_SIZE) -> int:
+    return -(-items // size)
+
+
+class WorkerPool:
+    """Pools de processos e threads para os comandos que percorrem todos os inscritos."""
+
+    def __init__(self, processes: int = WORKER_PROCESSES, threads: int = WORKER_THREADS):
+        self.processes = processes
+        self.threads = threads
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self.jobs: Dict[int, Job] = {}
+        # Cancelamentos a partir daqui vêm do desligamento, não de um admin
+        self.closing = False
+
+    def _executor(self, kind: str):
+        if kind == CPU and self.processes > 0:
+            if self._process_pool is None:
+                # spawn: o processo filho não herda threads nem locks do bot
+                self._process_pool = ProcessPoolExecutor(
+                    self.processes, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(self.threads, thread_name_prefix='worker')
+        return self._thread_pool
+
+    async def run(self, fn: Callable, *args, kind: str = IO) -> Any:
+        """Uma chamada avulsa no pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor(kind), fn, *args)
+
+    async def map_chunks(self, job: Job, fn: Callable, chunks: Iterable, *args,
+                         kind: str = CPU, total: Optional[int] = None,
+                         consume: Optional[Callable[[Any], Awaitable]] = None) -> List:
+        """fn(chunk, *args) para cada pedaço, em ordem; para entre pedaços se cancelado
+
+        `chunks` pode ser um iterador lido sob demanda (`total` dá o número de
+        pedaços para o progresso). Com `consume`, cada resultado é entregue em
+        ordem assim que fica pronto e não é guardado: só os pedaços em voo
+        ficam na memória.
+        """
+        job.total += len(chunks) if total is None else total
+        self.jobs[job.id] = job
+        results: List = []
+        ready: Dict[int, Any] = {}
+        delivered = 0
+
+        async def deliver(index: int, result: Any):
+            nonlocal delivered
+            ready[index] = result
+            while delivered in ready:
+                result = ready.pop(delivered)
+                delivered += 1
+                if consume is None:
+                    results.append(result)
+                else:
+                    await consume(result)
+
+        try:
+            if kind == INLINE:
+                for index, chunk in enumerate(chunks):
+                    job.check()
+                    result = fn(chunk, *args)
+                    if inspect.isawaitable(result):
+                        result = await result
+                    await deliver(index, result)
+                    await job.advance()
+                    await asyncio.sleep(0)  # devolve o loop para o gateway
+                return results
+            loop = asyncio.get_running_loop()
+            executor = self._executor(kind)
+            # Poucos pedaços em voo para o cancelamento valer logo
+            limit = max(2, (self.processes if kind == CPU else self.threads) * 2)
+            pending = {}
+            queue = iter(enumerate(chunks))
+            try:
+                while True:
+                    job.check()
+                    for index, chunk in itertools.islice(queue, limit - len(pending)):
+                        pending[loop.run_in_executor(executor, fn, chunk, *args)] = index
+                    if not pending:
+                        break
+                    finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in finished:
+                        await deliver(pending.pop(future), future.result())
+                    await job.advance(len(finished))
+            finally:
+                for future in pending:
+                    future.cancel()
+            return results
+        finally:
+            self.jobs.pop(job.id, None)
+
+    def cancel_owned(self, owner: int) -> int:
+        """Cancelar os trabalhos de um servidor; devolve quantos"""
+        jobs = [job for job in self.jobs.values() if job.owner == owner]
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def shutdown(self):
+        self.closing = True
+        for job in list(self.jobs.values()):
+            job.cancel()
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+            self._thread_pool = None